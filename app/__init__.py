@@ -5,7 +5,9 @@
 # ==============================================================================
 
 import os
+import time
 import logging
+import click
 from flask import Flask
 from config import Config
 from flask_sqlalchemy import SQLAlchemy
@@ -61,6 +63,81 @@ def create_app(config_class=Config):
         seed_data()
         app.logger.info("Database has been seeded with default values.")
 
+    from app.calculator.engine import ENGINE_MODES, ENGINE_MODE_FAST
+
+    @app.cli.command("calc")
+    @click.argument("paths", nargs=-1, required=True)
+    @click.option("--workers", "-w", default=0, show_default=True, help="Worker processes (0 = one per CPU core).")
+    @click.option("--mode", type=click.Choice(ENGINE_MODES), default=ENGINE_MODE_FAST, show_default=True)
+    @click.option("--chunk-rows", default=0, show_default=True,
+                  help="Stream 'Sales data' this many rows at a time (0 = read whole sheets).")
+    def calc(paths, workers, mode, chunk_rows):
+        """Validates, calculates and saves every .xlsx workbook or .zip bundle in PATHS (directories or globs)."""
+        from app.calculator.batch import collect_workbooks, calculate_workbooks
+        from app.calculator.workbook_cache import cache_from_config
+        from app.cache import get_shared_cache
+        from app.calculator.config import get_engine_config
+        from app.runs import save_calculation_run
+
+        workbooks = collect_workbooks(paths)
+        if not workbooks:
+            raise click.ClickException("No .xlsx workbooks or .zip bundles found in the given paths.")
+        click.echo(f"Calculating {len(workbooks)} workbooks ({mode} mode)...")
+
+        engine_config = get_engine_config()
+        started = time.perf_counter()
+        failed, saved, total_rows = [], 0, 0
+        for outcome in calculate_workbooks(workbooks, engine_config, mode, workers, chunk_rows,
+                                           cache_from_config(app.config, get_shared_cache(app))):
+            name = os.path.basename(outcome['path'])
+            if not outcome['errors']:
+                try:
+                    run, stats = save_calculation_run(name, outcome['results'], outcome['summary'], outcome['targets_df'], mode)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    outcome['errors'] = [f"Could not save the run: {e}"]
+            if outcome['errors']:
+                failed.append((name, outcome['errors']))
+                click.echo(f"  FAILED {name} ({outcome['seconds']:.2f}s)")
+            else:
+                saved += 1
+                total_rows += outcome['rows']
+                click.echo(f"  OK     {name}: {outcome['rows']:,} rows in {outcome['seconds']:.2f}s -> run {run.public_id} "
+                           f"({stats.rows:,} db rows at {stats.rows_per_second:,.0f} rows/s)")
+
+        elapsed = time.perf_counter() - started
+        click.echo(
+            f"\nSaved {saved} of {len(workbooks)} workbooks in {elapsed:.2f}s "
+            f"({len(workbooks) / elapsed:.2f} workbooks/s, {total_rows / elapsed:,.0f} sales rows/s)."
+        )
+        for name, errors in failed:
+            click.echo(f"\nErrors in {name}:")
+            for error in errors:
+                click.echo(f"  - {error}")
+        if failed:
+            raise click.exceptions.Exit(1)
+
+    @app.cli.command("rebuild-views")
+    @click.option("--all", "rebuild_all", is_flag=True,
+                  help="Recompute every run's view, not only the runs saved without one.")
+    def rebuild_views(rebuild_all):
+        """Recomputes the materialized report views of saved runs from their stored results."""
+        from app.models import CalculationRun
+        from app.runs import refresh_frontend_view
+
+        query = CalculationRun.query.order_by(CalculationRun.id)
+        if not rebuild_all:
+            query = query.filter(CalculationRun.frontend_view_json.is_(None))
+        rebuilt = 0
+        for run in query:
+            if refresh_frontend_view(run):
+                db.session.commit()
+                rebuilt += 1
+            else:
+                click.echo(f"  Skipped run {run.public_id}: no detailed results.")
+        click.echo(f"Rebuilt {rebuilt} report views.")
+
     app.logger.info('Asanito Commission Calculator startup complete')
     
     return app
\ No newline at end of file
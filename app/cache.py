@@ -0,0 +1,434 @@
+# ==============================================================================
+# app/cache.py
+# ------------------------------------------------------------------------------
+# The application cache, shared between worker processes and nodes.
+# Values are pickled and stored under versioned keys
+# (`<prefix>:<format>:<namespace>:<version>:<key>`), so a new configuration
+# version, template or schema simply stops reading the old entries, which then
+# age out by TTL and least-recently-used eviction. Backends (CACHE_BACKEND):
+#   memory      this process only (the default for a single process)
+#   filesystem  a directory shared by the processes of a node (CACHE_URL)
+#   sqlite      a database file shared by the processes of a node (CACHE_URL)
+#   redis       a Redis-protocol server shared by every node (CACHE_URL,
+#               redis://[:password@]host[:port][/db]); eviction is the server's
+#   none        no caching
+# A failing backend never fails a request: errors are logged as cache misses.
+# Only point CACHE_URL at storage the application trusts (values are pickled).
+# ==============================================================================
+
+import hashlib
+import logging
+import os
+import pickle
+import socket
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, unquote
+from flask import current_app
+
+# Bump whenever a cached value's layout changes incompatibly.
+CACHE_FORMAT_VERSION = 1
+
+_EXPIRY = struct.Struct('>d')  # Filesystem entry header: expiry time (0 = never)
+
+
+class MemoryBackend:
+    """A thread-safe LRU of values in this process, bounded by their total size in bytes."""
+
+    shared = False
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (value, expires at)
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] and entry[1] <= time.time():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (value, time.time() + ttl if ttl else 0)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+    def _remove(self, key):
+        value, _ = self.entries.pop(key)
+        self.size -= len(value)
+
+
+class FileSystemBackend:
+    """
+    One file per key in a directory, written atomically. Reading an entry
+    marks it as recently used; beyond max_bytes the least recently used
+    entries are removed.
+    """
+
+    shared = True
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires, = _EXPIRY.unpack(f.read(_EXPIRY.size))
+                if expires and expires <= time.time():
+                    value = None
+                else:
+                    value = f.read()
+        except (FileNotFoundError, struct.error):
+            return None
+        if value is None:
+            self._unlink(path)
+            return None
+        try:
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            pass  # Evicted by another process meanwhile
+        return value
+
+    def set(self, key, value, ttl=None):
+        if len(value) > self.max_bytes:
+            return
+        fd, staging = tempfile.mkstemp(prefix='.staging-', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_EXPIRY.pack(time.time() + ttl if ttl else 0))
+                f.write(value)
+            os.replace(staging, self._path(key))
+        except Exception:
+            self._unlink(staging)
+            raise
+        self.evict()
+
+    def delete(self, key):
+        self._unlink(self._path(key))
+
+    def evict(self):
+        """Removes expired entries, then least recently used ones until the directory fits in max_bytes."""
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith('.'):
+                continue
+            try:
+                stat = entry.stat()
+                with open(entry.path, 'rb') as f:
+                    expires, = _EXPIRY.unpack(f.read(_EXPIRY.size))
+            except (FileNotFoundError, struct.error):
+                continue
+            if expires and expires <= now:
+                self._unlink(entry.path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._unlink(path)
+            total -= size
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+class SQLiteBackend:
+    """
+    A table of entries in an SQLite database file (WAL mode, so readers in
+    other processes are not blocked by a writer), evicted least recently used
+    first beyond max_bytes.
+    """
+
+    shared = True
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entry ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, '
+                'expires_at REAL NOT NULL, used_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_cache_entry_used_at ON cache_entry (used_at)')
+
+    def __getstate__(self):
+        # Picklable for worker processes, which open their own connections.
+        return {'path': self.path, 'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, local=threading.local())
+
+    def _connection(self):
+        # One connection per thread; sqlite3 connections are not shared between threads.
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self.local.connection = connection
+        return connection
+
+    def get(self, key):
+        connection = self._connection()
+        row = connection.execute('SELECT value, expires_at FROM cache_entry WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        with connection:
+            if row[1] and row[1] <= now:
+                connection.execute('DELETE FROM cache_entry WHERE key = ?', (key,))
+                return None
+            connection.execute('UPDATE cache_entry SET used_at = ? WHERE key = ?', (now, key))
+        return bytes(row[0])
+
+    def set(self, key, value, ttl=None):
+        if len(value) > self.max_bytes:
+            return
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO cache_entry (key, value, size, expires_at, used_at) VALUES (?, ?, ?, ?, ?)',
+                (key, sqlite3.Binary(value), len(value), now + ttl if ttl else 0, now)
+            )
+            connection.execute('DELETE FROM cache_entry WHERE expires_at > 0 AND expires_at <= ?', (now,))
+            total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM cache_entry').fetchone()[0]
+            if total > self.max_bytes:
+                evicted = []
+                for entry_key, size in connection.execute('SELECT key, size FROM cache_entry ORDER BY used_at'):
+                    if total <= self.max_bytes:
+                        break
+                    evicted.append((entry_key,))
+                    total -= size
+                connection.executemany('DELETE FROM cache_entry WHERE key = ?', evicted)
+
+    def delete(self, key):
+        with self._connection() as connection:
+            connection.execute('DELETE FROM cache_entry WHERE key = ?', (key,))
+
+
+class RedisError(Exception):
+    """An error reply from a Redis-protocol server."""
+
+
+class RedisBackend:
+    """
+    A minimal client for a Redis-protocol (RESP) server: GET, SET with an
+    expiry, DEL. Eviction is left to the server (maxmemory with an LRU policy).
+    One connection per thread, reopened after a network error.
+    """
+
+    shared = True
+
+    def __init__(self, url, timeout=2.0):
+        parsed = urlparse(url)
+        self.address = (parsed.hostname or 'localhost', parsed.port or 6379)
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def __getstate__(self):
+        # Picklable for worker processes, which open their own connections.
+        return {key: value for key, value in self.__dict__.items() if key != 'local'}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, local=threading.local())
+
+    def get(self, key):
+        return self._command(b'GET', key)
+
+    def set(self, key, value, ttl=None):
+        if ttl:
+            self._command(b'SET', key, value, b'PX', str(int(ttl * 1000)))
+        else:
+            self._command(b'SET', key, value)
+
+    def delete(self, key):
+        self._command(b'DEL', key)
+
+    def _command(self, *args):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self._connect()
+        try:
+            return self._send(connection, args)
+        except OSError:
+            # A dropped connection (e.g. the server restarted): retry once on a new one.
+            self._close()
+            return self._send(self._connect(), args)
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=self.timeout)
+        connection = (sock, sock.makefile('rb'))
+        self.local.connection = connection
+        try:
+            if self.password:
+                credentials = (self.username, self.password) if self.username else (self.password,)
+                self._send(connection, (b'AUTH',) + credentials)
+            if self.db:
+                self._send(connection, (b'SELECT', str(self.db)))
+        except Exception:
+            self._close()
+            raise
+        return connection
+
+    def _close(self):
+        connection = getattr(self.local, 'connection', None)
+        self.local.connection = None
+        if connection is not None:
+            connection[1].close()
+            connection[0].close()
+
+    def _send(self, connection, args):
+        sock, reader = connection
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        sock.sendall(b''.join(parts))
+        return _read_reply(reader)
+
+
+def _read_reply(reader):
+    line = reader.readline()
+    if not line.endswith(b'\r\n'):
+        raise ConnectionError("Connection closed by the cache server.")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b'+':
+        return payload
+    if kind == b'-':
+        raise RedisError(payload.decode('utf-8', 'replace'))
+    if kind == b':':
+        return int(payload)
+    if kind == b'$':
+        length = int(payload)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        if len(data) != length + 2:
+            raise ConnectionError("Connection closed by the cache server.")
+        return data[:-2]
+    if kind == b'*':
+        length = int(payload)
+        return None if length < 0 else [_read_reply(reader) for _ in range(length)]
+    raise RedisError(f"Unexpected reply from the cache server: {line!r}")
+
+
+class Cache:
+    """
+    Pickled values under versioned keys, on top of a backend:
+
+        config = cache.get('engine-config', key, version=stamp)
+        cache.set('engine-config', key, config, version=stamp)
+
+    `shared` tells whether other processes see the values (not so for memory).
+    """
+
+    def __init__(self, backend, prefix='asanito', default_ttl=None):
+        self.backend = backend
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+
+    @property
+    def shared(self):
+        return self.backend.shared
+
+    def make_key(self, namespace, key, version=None):
+        return f"{self.prefix}:{CACHE_FORMAT_VERSION}:{namespace}:{version if version is not None else ''}:{key}"
+
+    def get(self, namespace, key, version=None):
+        """The cached value, or None on a miss (or if the backend failed)."""
+        try:
+            value = self.backend.get(self.make_key(namespace, key, version))
+            return pickle.loads(value) if value is not None else None
+        except Exception as e:
+            logging.warning(f"Cache read of {namespace} entry failed; treating it as a miss: {e}")
+            return None
+
+    def set(self, namespace, key, value, version=None, ttl=None):
+        """Stores a value, expiring after `ttl` seconds (default: CACHE_DEFAULT_TTL, 0 = never)."""
+        try:
+            self.backend.set(self.make_key(namespace, key, version),
+                             pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL),
+                             ttl if ttl is not None else self.default_ttl)
+        except Exception as e:
+            logging.warning(f"Cache write of {namespace} entry failed: {e}")
+
+    def delete(self, namespace, key, version=None):
+        try:
+            self.backend.delete(self.make_key(namespace, key, version))
+        except Exception as e:
+            logging.warning(f"Cache delete of {namespace} entry failed: {e}")
+
+
+def cache_from_config(config):
+    """The cache configured in a Flask config, or None if CACHE_BACKEND is 'none'."""
+    backend_name = config['CACHE_BACKEND']
+    url, max_bytes = config['CACHE_URL'], config['CACHE_MAX_BYTES']
+    if backend_name == 'none':
+        return None
+    if backend_name == 'memory':
+        backend = MemoryBackend(max_bytes)
+    elif backend_name == 'filesystem':
+        backend = FileSystemBackend(url, max_bytes)
+    elif backend_name == 'sqlite':
+        backend = SQLiteBackend(url, max_bytes)
+    elif backend_name == 'redis':
+        backend = RedisBackend(url)
+    else:
+        raise ValueError(f"Unknown CACHE_BACKEND '{backend_name}'.")
+    return Cache(backend, config['CACHE_KEY_PREFIX'], config['CACHE_DEFAULT_TTL'] or None)
+
+def get_cache(app=None):
+    """The app's cache (None if caching is disabled), created on first use."""
+    app = app or current_app._get_current_object()
+    if 'cache' not in app.extensions:
+        app.extensions['cache'] = cache_from_config(app.config)
+    return app.extensions['cache']
+
+def get_shared_cache(app=None):
+    """
+    The app's cache if other processes share it, else None. Values each
+    process already keeps for itself (the engine configuration, the on-disk
+    workbook cache) only go through a shared cache.
+    """
+    cache = get_cache(app)
+    return cache if cache is not None and cache.shared else None
@@ -0,0 +1,91 @@
+# ==============================================================================
+# app/calculator/batch.py
+# ------------------------------------------------------------------------------
+# Batch processing of many workbooks (used by the `flask calc` command).
+# Each workbook is validated and calculated in its own worker process from
+# the same EngineConfig snapshot; persisting the results is left to the
+# caller, which owns the database session.
+# ==============================================================================
+
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .workbook_cache import validate_cached, hash_file
+from .engine import run_engine, summarize_results
+from .workers import resolve_worker_count
+from .streaming import run_engine_streaming
+from .bundle import is_bundle
+
+WORKBOOK_EXTENSIONS = ('.xlsx', '.zip')
+
+
+def collect_workbooks(patterns):
+    """
+    Expands directories (every .xlsx workbook and .zip bundle inside) and glob patterns into a
+    sorted, de-duplicated list of workbook paths. Excel lock files (~$...) are skipped.
+    """
+    paths = []
+    for pattern in patterns:
+        pattern = os.path.expanduser(pattern)
+        if os.path.isdir(pattern):
+            matches = [match for extension in WORKBOOK_EXTENSIONS
+                       for match in glob.glob(os.path.join(pattern, '*' + extension))]
+        else:
+            matches = glob.glob(pattern)
+        for path in sorted(matches):
+            path = os.path.abspath(path)
+            if os.path.isfile(path) and not os.path.basename(path).startswith('~$') and path not in paths:
+                paths.append(path)
+    return paths
+
+def calculate_workbook(path, config, mode, chunk_rows=0, cache=None):
+    """
+    Validates and calculates one workbook, reading it from the workbook cache
+    if possible, or else streaming 'Sales data' `chunk_rows` rows at a time if
+    given (see streaming.py; the streamed workbook is cached as it is read;
+    bundles are always read whole). Runs in a worker process, so it never raises:
+    failures are reported in the returned dict.
+
+    Returns:
+        dict: 'path', 'errors', 'seconds', 'rows' and, on success, the
+        'results', 'summary' and 'targets_df' to persist.
+    """
+    started = time.perf_counter()
+    outcome = {'path': path, 'errors': [], 'rows': 0}
+    try:
+        content_hash = hash_file(path) if cache is not None else None
+        if chunk_rows and (cache is None or content_hash not in cache) and not is_bundle(path):
+            results, dataframes, errors = run_engine_streaming(
+                path, config, chunk_rows=chunk_rows, mode=mode,
+                cache_entry=cache.writer(content_hash) if cache is not None else None)
+        else:
+            dataframes, errors = validate_cached(path, cache, content_hash)
+            results = None if errors else run_engine(dataframes, config, mode=mode)
+        if errors:
+            outcome['errors'] = errors
+        else:
+            outcome['rows'] = results.row_count
+            outcome['results'] = results
+            outcome['summary'] = summarize_results(results, dataframes.get('Commissions paid'), config)
+            outcome['targets_df'] = dataframes.get('Additional commissions')
+    except Exception as e:
+        outcome['errors'] = [f"{type(e).__name__}: {e}"]
+    outcome['seconds'] = time.perf_counter() - started
+    return outcome
+
+def calculate_workbooks(paths, config, mode, workers=0, chunk_rows=0, cache=None):
+    """
+    Calculates many workbooks in parallel worker processes, yielding each
+    outcome (see calculate_workbook) as soon as it is ready.
+    """
+    worker_count = min(resolve_worker_count(workers), len(paths))
+    if worker_count <= 1:
+        for path in paths:
+            yield calculate_workbook(path, config, mode, chunk_rows, cache)
+        return
+    with ProcessPoolExecutor(max_workers=worker_count) as executor:
+        futures = [executor.submit(calculate_workbook, path, config, mode, chunk_rows, cache) for path in paths]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,95 @@
+# ==============================================================================
+# app/calculator/bundle.py
+# ------------------------------------------------------------------------------
+# Reads workbook bundles: a .zip holding one file per sheet of the schema,
+# named after the sheet ('Sales data.csv', 'Renew.parquet', ...). ERP exports
+# are much faster to write and read this way than as .xlsx.
+# CSV files are read by pandas' C parser with every column as text, and
+# Parquet files with pyarrow (the schema columns only, located through the
+# file's footer); either way the columns then go through the
+# .xlsx loader's projection, number parsing and typing (see
+# loader.frame_from_columns), so the validator applies the same rules and the
+# engine sees identical DataFrames whatever the input format. CSV has no cell
+# types: numeric-looking text is read as a number, so the one difference is a
+# number stored as text in the workbook ('010'), which a CSV turns into 10.
+# ==============================================================================
+
+import io
+import os
+import zipfile
+import pandas as pd
+
+from .schema import EXPECTED_SHEETS
+from .loader import frame_from_columns
+
+SHEET_FORMATS = ('.csv', '.parquet')
+# Every .xlsx file is a zip too; this member tells them apart.
+XLSX_MARKER = '[Content_Types].xml'
+
+
+def is_bundle(source):
+    """True if a path or seekable binary stream is a zip bundle rather than an .xlsx workbook."""
+    try:
+        with zipfile.ZipFile(source) as archive:
+            return XLSX_MARKER not in archive.namelist()
+    except zipfile.BadZipFile:
+        return False
+    finally:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+
+
+class Bundle:
+    """An open bundle: its sheets by name, read on demand. The caller closes it."""
+
+    def __init__(self, source):
+        self.archive = zipfile.ZipFile(source)
+        self.parquet_files = {}
+        self.members = {}
+        for member in self.archive.namelist():
+            name, extension = os.path.splitext(os.path.basename(member))
+            if extension.lower() in SHEET_FORMATS and name and not name.startswith('.'):
+                self.members.setdefault(name, member)
+
+    @property
+    def sheetnames(self):
+        return list(self.members)
+
+    def read_header(self, sheet_name):
+        """The column names of a sheet."""
+        member = self.members[sheet_name]
+        if member.lower().endswith('.csv'):
+            with self.archive.open(member) as f:
+                return list(pd.read_csv(f, nrows=0, encoding='utf-8-sig').columns)
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(self._parquet_file(member)).names)
+
+    def read_sheet(self, sheet_name):
+        """
+        Reads the schema columns of a sheet, like loader.read_sheet_part.
+
+        Returns:
+            tuple: (pd.DataFrame, invalid cells as for loader.read_sheet_part)
+        """
+        member = self.members[sheet_name]
+        rules = EXPECTED_SHEETS[sheet_name]
+        wanted = set(rules['required_columns']) | set(rules.get('optional_columns', ()))
+        if member.lower().endswith('.csv'):
+            with self.archive.open(member) as f:
+                # Schema columns only, as text, blank lines kept: values and row numbers as in the sheet.
+                df = pd.read_csv(f, dtype=object, encoding='utf-8-sig', skip_blank_lines=False,
+                                 usecols=lambda name: name in wanted)
+            return frame_from_columns(sheet_name, {name: df[name].to_numpy() for name in df.columns}, text=True)
+        columns = [name for name in self.read_header(sheet_name) if name in wanted]
+        df = pd.read_parquet(self._parquet_file(member), columns=columns)
+        return frame_from_columns(sheet_name, {name: df[name].to_numpy() for name in df.columns})
+
+    def _parquet_file(self, member):
+        # Extracted once for the header and the data; Parquet needs a seekable file.
+        if member not in self.parquet_files:
+            with self.archive.open(member) as f:
+                self.parquet_files[member] = f.read()
+        return io.BytesIO(self.parquet_files[member])
+
+    def close(self):
+        self.archive.close()
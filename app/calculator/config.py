@@ -0,0 +1,114 @@
+# ==============================================================================
+# app/calculator/config.py
+# ------------------------------------------------------------------------------
+# The engine's configuration snapshot.
+# EngineConfig is a plain, picklable object holding every business setting
+# plus the compiled commission brackets. The engine only ever reads from it,
+# so it runs without a Flask app context (worker processes, CLI, tests).
+# Only `load_engine_config` touches the database, and it is called by the
+# Flask layer through `get_engine_config`, which caches one snapshot per
+# process and reloads it when the ConfigVersion stamp changes. With a shared
+# application cache (app/cache.py) the snapshot, compiled brackets included,
+# is built once per version and loaded from the cache by the other workers.
+# ==============================================================================
+
+import logging
+import threading
+from .rules import BracketRule, RuleIndex, compile_rule_index, rule_set_version
+
+# AppSetting key -> value used when the setting is missing from the database.
+SETTING_DEFAULTS = {
+    'CURRENCY_CONVERSION_FACTOR': 0.1,
+    'RENEWAL_COMMISSION_RATE': 0.05,
+    'BRACKET_QUALIFICATION_MIN_COLLECTION_PERCENT': 0.3,
+    'DEFAULT_COMMISSION_MODEL': 'پورسانت خالص',
+    'BONUS_PERCENTAGES': {'collective': 0.05, 'individual': 0.03, 'top_seller': 0.02},
+    'BRACKET_QUALIFICATION_MIN_VALUES': {'استاندارد': 12000000, 'حرفه‌ای': 40000000, 'VIP': 60000000, 'default': 12000000}
+}
+
+
+class EngineConfig:
+    """
+    An explicit snapshot of the settings and commission brackets a calculation
+    runs with. Settings are exposed as attributes (config.RENEWAL_COMMISSION_RATE,
+    ...), the brackets as `rules` and their compiled `rule_index`.
+    """
+
+    def __init__(self, settings, rules, setting_rows=(), rule_index=None, version=None):
+        """
+        Args:
+            settings (dict): AppSetting key -> parsed value; missing keys use SETTING_DEFAULTS.
+            rules (iterable): CommissionRuleSet rows or BracketRule tuples, in table order.
+            setting_rows (iterable): (key, raw value, value type) triples, only used for the forensic log.
+            rule_index (RuleIndex, optional): An already compiled index of `rules`.
+            version (tuple, optional): The ConfigVersion stamp the snapshot was loaded at.
+        """
+        for key, default in SETTING_DEFAULTS.items():
+            setattr(self, key, settings.get(key, default))
+        self.rules = tuple(
+            BracketRule(r.model_name, r.min_sales, r.max_sales, r.marketer_rate, r.negotiator_rate, r.coordinator_rate)
+            for r in rules
+        )
+        self.rule_index = rule_index if rule_index is not None else compile_rule_index(self.rules)
+        self.setting_rows = tuple(setting_rows)
+        self.version = version
+
+    def settings(self):
+        """The business settings as a plain dict (no rules)."""
+        return {key: getattr(self, key) for key in SETTING_DEFAULTS}
+
+    def replace(self, settings=None, rules=None):
+        """
+        A new snapshot with some settings overridden and/or the brackets replaced.
+        Replacement brackets are compiled on their own, leaving the cached live index alone.
+        """
+        merged_settings = {**self.settings(), **(settings or {})}
+        if rules is None:
+            return EngineConfig(merged_settings, self.rules, self.setting_rows, self.rule_index)
+        rules = [BracketRule(*rule) for rule in rules]
+        return EngineConfig(merged_settings, rules, self.setting_rows, RuleIndex(rules, rule_set_version(rules)))
+
+
+def load_engine_config(version=None):
+    """Reads the AppSetting and CommissionRuleSet tables into an EngineConfig snapshot."""
+    from app.models import AppSetting, CommissionRuleSet
+    try:
+        settings = AppSetting.query.all()
+        rules = CommissionRuleSet.query.order_by(CommissionRuleSet.id).all()
+    except Exception as e:
+        logging.error(f"FATAL: Could not load settings from database. Engine cannot run. Error: {e}", exc_info=True)
+        raise
+    logging.info(f"Loaded engine configuration: {len(settings)} settings, {len(rules)} commission rules.")
+    return EngineConfig(
+        {s.key: s.get_value() for s in settings}, rules,
+        setting_rows=[(s.key, s.value, s.value_type) for s in settings], version=version
+    )
+
+
+_cache_lock = threading.Lock()
+_cached_config = None
+
+def get_engine_config():
+    """
+    This process's cached EngineConfig, rebuilt only when the ConfigVersion
+    stamp changed (one primary-key read per call). Any worker process picks
+    up a settings or rules change on its next call.
+
+    Thread-safe: the check-and-rebuild runs under a lock, and callers hold an
+    immutable snapshot, so a rebuild never changes a calculation in progress.
+    """
+    global _cached_config
+    from app.models import ConfigVersion
+    from app.cache import get_shared_cache
+    version = ConfigVersion.current()
+    with _cache_lock:
+        if _cached_config is None or _cached_config.version != version:
+            logging.info(f"Engine configuration version {version[0]} is not cached in this process; loading it.")
+            shared = get_shared_cache()
+            config = shared.get('engine-config', 'snapshot', version=version) if shared is not None else None
+            if config is None:
+                config = load_engine_config(version)
+                if shared is not None:
+                    shared.set('engine-config', 'snapshot', config, version=version)
+            _cached_config = config
+        return _cached_config
@@ -4,317 +4,667 @@
 # ==============================================================================
 
 import pandas as pd
+import numpy as np
 import json
+import hashlib
 import logging
-from app.models import CommissionRuleSet, AppSetting
+from concurrent.futures import ProcessPoolExecutor
+from .config import get_engine_config
+from .store import TransactionStore, TransactionSlice, transaction_sum
+from .workers import resolve_worker_count
 
-# --- Configuration Loader Class ---
+ROLE_COLUMNS = ['بازاریاب', 'مذاکره کننده ارشد', 'هماهنگ کننده فروش']
+NEGOTIATOR_ROLE = 'مذاکره کننده ارشد'
 
-class CalculationConfig:
+# Engine modes: 'fast' skips all per-row and per-person trace formatting,
+# 'forensic' keeps the full audit trail (configuration dump, sheet contents,
+# per-row qualification logs) used for audits such as tests/test_real_data_audit.py.
+ENGINE_MODE_FAST = 'fast'
+ENGINE_MODE_FORENSIC = 'forensic'
+ENGINE_MODES = (ENGINE_MODE_FAST, ENGINE_MODE_FORENSIC)
+
+# Bump whenever the structure of the results changes, so month results stored
+# by older runs are never reused by the incremental recalculation.
+RESULTS_FORMAT_VERSION = 2
+
+# Cleaned Pass 1 columns that make up a sales row's fingerprint.
+FINGERPRINT_COLUMNS = [
+    'month_key', 'net_value', 'commission_base', 'paid_amount', 'is_renewal',
+    'plan_version', 'company', 'invoice_link'
+] + ROLE_COLUMNS
+
+
+class CalculationResults(dict):
     """
-    A singleton class to load and hold all business rules from the database.
+    The month-keyed engine results, plus metadata about the run that produced
+    them: the engine mode, the input fingerprints, the reused months and the
+    number of sales rows read.
+    """
+
+    def __init__(self, months=(), mode=ENGINE_MODE_FAST, fingerprints=None, reused_months=(), row_count=0):
+        super().__init__(months)
+        self.mode = mode
+        self.fingerprints = fingerprints or {}
+        self.reused_months = list(reused_months)
+        self.row_count = row_count
+
+
+class PreviousRun:
+    """
+    Fingerprints and month results of an earlier run, used for incremental
+    recalculation. The results are only loaded if some month can be reused.
     """
-    _instance = None
-
-    def __new__(cls):
-        if cls._instance is None:
-            logging.info("Creating and loading CalculationConfig instance...")
-            cls._instance = super(CalculationConfig, cls).__new__(cls)
-            try:
-                cls._instance.load_settings()
-                logging.info("CalculationConfig loaded successfully.")
-            except Exception as e:
-                logging.error(f"FATAL: Could not load settings from database. Engine cannot run. Error: {e}", exc_info=True)
-                raise
-        return cls._instance
-
-    def load_settings(self):
-        """Loads all settings from the AppSetting table into attributes."""
-        settings = AppSetting.query.all()
-        settings_dict = {s.key: s.get_value() for s in settings}
-        
-        self.CURRENCY_CONVERSION_FACTOR = settings_dict.get('CURRENCY_CONVERSION_FACTOR', 0.1)
-        self.RENEWAL_COMMISSION_RATE = settings_dict.get('RENEWAL_COMMISSION_RATE', 0.05)
-        self.BRACKET_QUALIFICATION_MIN_COLLECTION_PERCENT = settings_dict.get('BRACKET_QUALIFICATION_MIN_COLLECTION_PERCENT', 0.3)
-        self.DEFAULT_COMMISSION_MODEL = settings_dict.get('DEFAULT_COMMISSION_MODEL', 'پورسانت خالص')
-        
-        # REMOVED: AGENT_SALE_MULTIPLIER and AGENT_KEYWORDS
-        
-        self.BONUS_PERCENTAGES = settings_dict.get('BONUS_PERCENTAGES', {'collective': 0.05, 'individual': 0.03, 'top_seller': 0.02})
-        self.BRACKET_QUALIFICATION_MIN_VALUES = settings_dict.get('BRACKET_QUALIFICATION_MIN_VALUES', {'استاندارد': 12000000, 'حرفه‌ای': 40000000, 'VIP': 60000000, 'default': 12000000})
+
+    def __init__(self, fingerprints, load_results):
+        self.fingerprints = fingerprints or {}
+        self._load_results = load_results
+        self._results = None
+
+    @property
+    def results(self):
+        if self._results is None:
+            self._results = self._load_results()
+        return self._results
 
 # --- Helper Functions ---
 
-def _parse_monetary(value, config):
-    if pd.isna(value): return 0.0
-    return float(str(value).replace(',', '')) * config.CURRENCY_CONVERSION_FACTOR
+def _get_commission_rates_for_brackets(bracket_bases, commission_models, rule_index):
+    """
+    Resolves the role rates of many person-months in one vectorized lookup.
 
-def _get_commission_rates_for_bracket(bracket_base, commission_model, all_rules):
-    brackets_to_use = all_rules.get(commission_model, [])
-    for rule in brackets_to_use:
-        if rule.min_sales <= bracket_base < rule.max_sales:
-            return {'بازاریاب': rule.marketer_rate, 'مذاکره کننده ارشد': rule.negotiator_rate, 'هماهنگ کننده فروش': rule.coordinator_rate}
-    logging.warning(f"No matching commission bracket found for model '{commission_model}' with base {bracket_base:,.0f}.")
-    return {'بازاریاب': 0, 'مذاکره کننده ارشد': 0, 'هماهنگ کننده فروش': 0}
+    Returns:
+        list: One {role: rate} dict per input, in input order.
+    """
+    rate_arrays, matched = rule_index.rates_for_bases(bracket_bases, commission_models)
+    rate_lists = {role: rates.tolist() for role, rates in rate_arrays.items()}
+    all_rates = []
+    for i, (bracket_base, commission_model) in enumerate(zip(bracket_bases, commission_models)):
+        if matched[i]:
+            all_rates.append({role: rate_lists[role][i] for role in ROLE_COLUMNS})
+        else:
+            logging.warning(f"No matching commission bracket found for model '{commission_model}' with base {bracket_base:,.0f}.")
+            all_rates.append({role: 0 for role in ROLE_COLUMNS})
+    return all_rates
 
 
-# --- Main Calculation Orchestrator ---
+# --- Pass 1: Columnar Transaction Preparation ---
 
-def calculate_commissions(dataframes):
-    logging.info("="*80)
-    logging.info("STARTING COMMISSION CALCULATION PROCESS (FORENSIC MODE - NO AGENT LOGIC)")
-    logging.info("="*80)
-    
-    config = CalculationConfig()
+def _clean_monetary_column(sales_df, column, config):
+    """
+    Parses a monetary column in one go: strips thousands separators, converts
+    Rials to Toman and maps empty cells to 0.
+    """
+    if column not in sales_df.columns:
+        return np.zeros(len(sales_df))
+    series = sales_df[column]
+    if not pd.api.types.is_numeric_dtype(series):
+        series = series.where(series.isna(), series.astype(str).str.replace(',', '', regex=False))
+    return series.astype(float).fillna(0.0).to_numpy() * config.CURRENCY_CONVERSION_FACTOR
 
-    logging.info("\n" + "="*30 + " CURRENT CONFIGURATION STATE " + "="*30)
-    all_settings = AppSetting.query.all()
-    logging.info("--- App Settings from DB ---")
-    for s in all_settings: logging.info(f"  - {s.key}: {s.value} (Type: {s.value_type})")
+def _int_key_or_none(value):
+    try:
+        return str(int(value)).strip()
+    except (ValueError, TypeError, OverflowError):
+        return None
 
-    all_rules = CommissionRuleSet.query.all()
-    logging.info("\n--- Commission Rules from DB ---")
-    for r in all_rules: logging.info(f"  - Model: {r.model_name}, Range: {r.min_sales:,.0f}-{r.max_sales:,.0f}, Rates: M={r.marketer_rate:.2%}, N={r.negotiator_rate:.2%}, C={r.coordinator_rate:.2%}")
+def _clean_period_column(sales_df, column):
+    """Returns str(int(value)) for each row of a 'ماه'/'سال' column, or None where it is invalid."""
+    if column not in sales_df.columns:
+        return pd.Series(None, index=sales_df.index, dtype=object)
+    series = sales_df[column]
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        values = series.astype(float)
+        valid = np.isfinite(values)
+        keys = pd.Series(None, index=sales_df.index, dtype=object)
+        keys[valid] = values[valid].astype('int64').astype(str)
+        return keys
+    return series.map(_int_key_or_none)
 
-    additional_comm_df = dataframes.get('Additional commissions')
-    logging.info("\n--- Additional Commissions Sheet Content ---")
-    logging.info("\n" + additional_comm_df.to_string())
-    
-    employee_models_df = dataframes['Employee Models']
-    logging.info("\n--- Employee Models Sheet Content ---")
-    logging.info("\n" + employee_models_df.to_string())
-    logging.info("="*80 + "\n")
-    
-    sales_df = dataframes['Sales data']
-    employee_models = dict(zip(employee_models_df['نام'], employee_models_df['مدل همکاری']))
-    results = {}
+def _clean_text_column(sales_df, column):
+    """Mirrors str(row.get(column, '')).strip() for a whole column."""
+    if column not in sales_df.columns:
+        return pd.Series('', index=sales_df.index, dtype=object)
+    return sales_df[column].astype(str).str.strip()
 
-    all_rules_dict = {}
-    for rule in all_rules:
-        all_rules_dict.setdefault(rule.model_name, []).append(rule)
-    
-    logging.info("--- Starting Pass 1: Processing transactions and calculating bracket bases. ---")
-    for index, row in sales_df.iterrows():
+def _build_sales_frame(sales_df, config):
+    """
+    Cleans the 'Sales data' sheet column by column and evaluates the bracket
+    qualification checks for every row in one go.
+
+    Returns:
+        pd.DataFrame: One row per sales row (same index), with the cleaned
+        monetary values, the 'YYYY-M' month key (None for invalid rows) and
+        the qualification flags used by the audit log and by Pass 1.
+    """
+    frame = pd.DataFrame(index=sales_df.index)
+    frame['net_value'] = _clean_monetary_column(sales_df, 'مبلغ کل خالص فاکتور', config)
+    frame['commission_base'] = _clean_monetary_column(sales_df, 'کل مبلغ مبنای پورسانت', config)
+    frame['paid_amount'] = _clean_monetary_column(sales_df, 'وصول شده', config)
+
+    month = _clean_period_column(sales_df, 'ماه')
+    year = _clean_period_column(sales_df, 'سال')
+    valid_period = month.notna() & year.notna()
+    frame['month_key'] = pd.Series(None, index=sales_df.index, dtype=object)
+    frame.loc[valid_period, 'month_key'] = year[valid_period] + '-' + month[valid_period]
+
+    if 'تمدید اشتراک' in sales_df.columns:
+        frame['is_renewal'] = (sales_df['تمدید اشتراک'].astype(str).str.strip() == 'بله').to_numpy()
+    else:
+        frame['is_renewal'] = False
+
+    if 'نسخه پلن' in sales_df.columns:
+        plan_column = sales_df['نسخه پلن']
+        frame['plan_version'] = plan_column.astype(str).str.strip().where(plan_column.notna(), 'default')
+    else:
+        frame['plan_version'] = 'default'
+
+    min_values = config.BRACKET_QUALIFICATION_MIN_VALUES
+    default_min_value = min_values.get('default', 0)
+    frame['min_collection_value'] = frame['plan_version'].map(min_values).fillna(default_min_value)
+
+    net_value = frame['net_value'].to_numpy()
+    paid_amount = frame['paid_amount'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frame['collection_ratio'] = np.where(net_value > 0, paid_amount / net_value, 0)
+
+    frame['is_renewal_check'] = ~frame['is_renewal']
+    frame['collection_ratio_check'] = frame['collection_ratio'] >= config.BRACKET_QUALIFICATION_MIN_COLLECTION_PERCENT
+    frame['min_value_check'] = frame['paid_amount'] >= frame['min_collection_value']
+    frame['qualifies_for_bracket'] = frame['is_renewal_check'] & frame['collection_ratio_check'] & frame['min_value_check']
+
+    frame['company'] = _clean_text_column(sales_df, 'شرکت خریدار')
+    frame['invoice_link'] = _clean_text_column(sales_df, 'لینک فاکتور')
+    for role in ROLE_COLUMNS:
+        frame[role] = _clean_text_column(sales_df, role)
+    return frame
+
+def _log_pass1_audit(sales_df, sales_frame, config):
+    """Emits the per-row forensic audit log of Pass 1 from the prepared columns."""
+    if not logging.getLogger().isEnabledFor(logging.DEBUG):
+        return
+    def raw(column, default):
+        return sales_df[column].tolist() if column in sales_df.columns else [default] * len(sales_df)
+
+    min_collection_percent = config.BRACKET_QUALIFICATION_MIN_COLLECTION_PERCENT
+    rows = zip(
+        sales_df.index, raw('شرکت خریدار', 'N/A'), raw('مبلغ کل خالص فاکتور', 0), raw('وصول شده', 0),
+        raw(NEGOTIATOR_ROLE, 'N/A'), raw('نسخه پلن', 'N/A'), sales_frame.itertuples(index=False)
+    )
+    for index, company, raw_net, raw_paid, raw_negotiator, raw_plan, row in rows:
         excel_row_num = index + 2
-        
         row_summary = (
             f"Processing Excel Row: {excel_row_num} | "
-            f"Company: '{row.get('شرکت خریدار', 'N/A')}' | "
-            f"Net Value: {row.get('مبلغ کل خالص فاکتور', 0)} | "
-            f"Paid: {row.get('وصول شده', 0)} | "
-            f"SN: '{row.get('مذاکره کننده ارشد', 'N/A')}' | "
-            f"Plan: '{row.get('نسخه پلن', 'N/A')}'"
+            f"Company: '{company}' | "
+            f"Net Value: {raw_net} | "
+            f"Paid: {raw_paid} | "
+            f"SN: '{raw_negotiator}' | "
+            f"Plan: '{raw_plan}'"
         )
         logging.debug(f"\n{row_summary}")
-        
-        if 'مذاکره کننده ارشد' not in row.index:
-            logging.error(f"FATAL FLAW in Excel file: Column 'مذاکره کننده ارشد' not found!")
-            continue
 
-        try:
-            month = str(int(row.get('ماه'))).strip()
-            year = str(int(row.get('سال'))).strip()
-        except (ValueError, TypeError):
-            logging.warning(f"SKIPPING Row {excel_row_num}: Invalid or missing 'ماه'/'سال'.")
+        if row.month_key is None:
             continue
-        
-        month_key = f"{year}-{month}"
 
-        net_value = _parse_monetary(row.get('مبلغ کل خالص فاکتور', 0), config)
-        commission_base = _parse_monetary(row.get('کل مبلغ مبنای پورسانت', 0), config)
-        paid_amount = _parse_monetary(row.get('وصول شده', 0), config)
-        is_renewal = str(row.get('تمدید اشتراک', 'خیر')).strip() == 'بله'
-        
-        if 'نسخه پلن' in row and not pd.isna(row.get('نسخه پلن')):
-            plan_version = str(row['نسخه پلن']).strip()
-        else:
-            plan_version = 'default'
-        
-        # REMOVED: Agent Detection Logic
-
-        min_collection_value = config.BRACKET_QUALIFICATION_MIN_VALUES.get(plan_version, config.BRACKET_QUALIFICATION_MIN_VALUES.get('default', 0))
-        collection_ratio = (paid_amount / net_value) if net_value > 0 else 0
-        
-        is_renewal_check = not is_renewal
-        collection_ratio_check = collection_ratio >= config.BRACKET_QUALIFICATION_MIN_COLLECTION_PERCENT
-        min_value_check = paid_amount >= min_collection_value
-        qualifies_for_bracket = is_renewal_check and collection_ratio_check and min_value_check
-        
         log_story = [
-            f"\n--- Audit Log for Row {excel_row_num} ({row.get('شرکت خریدار', 'N/A')}) ---",
-            f"  - Net Value  : {net_value:,.0f} Toman",
-            f"  - Paid Amount: {paid_amount:,.0f} Toman",
-            f"  - Is Renewal : {is_renewal}",
-            f"  - Plan Version: '{plan_version}'",
+            f"\n--- Audit Log for Row {excel_row_num} ({company}) ---",
+            f"  - Net Value  : {row.net_value:,.0f} Toman",
+            f"  - Paid Amount: {row.paid_amount:,.0f} Toman",
+            f"  - Is Renewal : {row.is_renewal}",
+            f"  - Plan Version: '{row.plan_version}'",
             "  --- Qualification Checks ---",
-            f"  1. Is NOT Renewal? ({not is_renewal}) -> {'PASS' if is_renewal_check else 'FAIL'}",
-            f"  2. Collection Ratio Check: {collection_ratio:.2%} >= {config.BRACKET_QUALIFICATION_MIN_COLLECTION_PERCENT:.2%} -> {'PASS' if collection_ratio_check else 'FAIL'}",
-            f"  3. Min Value Check: {paid_amount:,.0f} >= {min_collection_value:,.0f} (for plan '{plan_version}') -> {'PASS' if min_value_check else 'FAIL'}",
-            f"  => FINAL QUALIFICATION: {'QUALIFIES' if qualifies_for_bracket else 'DOES NOT QUALIFY'}",
+            f"  1. Is NOT Renewal? ({not row.is_renewal}) -> {'PASS' if row.is_renewal_check else 'FAIL'}",
+            f"  2. Collection Ratio Check: {row.collection_ratio:.2%} >= {min_collection_percent:.2%} -> {'PASS' if row.collection_ratio_check else 'FAIL'}",
+            f"  3. Min Value Check: {row.paid_amount:,.0f} >= {row.min_collection_value:,.0f} (for plan '{row.plan_version}') -> {'PASS' if row.min_value_check else 'FAIL'}",
+            f"  => FINAL QUALIFICATION: {'QUALIFIES' if row.qualifies_for_bracket else 'DOES NOT QUALIFY'}",
             "  ------------------------------------"
         ]
         logging.debug("\n".join(log_story))
-        
-        person_assigned_in_row = False
-        for role in ['بازاریاب', 'مذاکره کننده ارشد', 'هماهنگ کننده فروش']:
-            person_name = str(row.get(role, '')).strip()
-            
-            if not person_name or person_name.lower() == 'nan':
-                continue
-            
-            person_assigned_in_row = True
-            results.setdefault(month_key, {'persons': {}})
-            person_data = results[month_key]['persons'].setdefault(person_name, {
-                'model': employee_models.get(person_name, config.DEFAULT_COMMISSION_MODEL),
-                'bracket_base': 0, 'transactions': []
-            })
-            
-            if role == 'مذاکره کننده ارشد' and qualifies_for_bracket:
-                # UPDATED: Always add the full commission base, no multiplier
-                person_data['bracket_base'] += commission_base
-                logging.debug(f"  > QUALIFIED: Adding {commission_base:,.0f} to bracket_base for {person_name}.")
-
-            person_data['transactions'].append({
-                'role': role, 'net_value': net_value, 'commission_base': commission_base, 
-                'paid_amount': paid_amount, 'is_renewal': is_renewal, 
-                'company': str(row.get('شرکت خریدار', '')).strip(), 
-                'invoice_link': str(row.get('لینک فاکتور', '')).strip()
-            })
 
-        if not person_assigned_in_row:
+def _warn_skipped_rows(sales_frame, forensic):
+    """Warns about sales rows without a valid 'ماه'/'سال' (one line per row only in forensic mode)."""
+    skipped_rows = sales_frame.index[sales_frame['month_key'].isna()] + 2
+    if forensic:
+        for excel_row_num in skipped_rows:
+            logging.warning(f"SKIPPING Row {excel_row_num}: Invalid or missing 'ماه'/'سال'.")
+    elif len(skipped_rows):
+        logging.warning(f"SKIPPING {len(skipped_rows)} rows with invalid or missing 'ماه'/'سال'.")
+
+def _melt_roles(frame, forensic=False):
+    """
+    Melts the three role columns of the dated sales rows into one long frame
+    with one (row_pos, role, person, month_key) row per assigned role, in
+    (sheet row, role column) order. 'row_pos' is the position in `frame`.
+    Warns about rows that have no person in any role.
+    """
+    frame = frame.assign(row_pos=np.arange(len(frame)))
+    long_df = frame[['row_pos'] + ROLE_COLUMNS].melt(
+        id_vars='row_pos', value_vars=ROLE_COLUMNS, var_name='role', value_name='person'
+    )
+    long_df = long_df[(long_df['person'] != '') & (long_df['person'].str.lower() != 'nan')]
+
+    unassigned = np.setdiff1d(frame['row_pos'].to_numpy(), long_df['row_pos'].to_numpy())
+    if forensic:
+        for excel_row_num in frame.index[unassigned] + 2:
             logging.warning(f"WARNING: No person was assigned any role in Excel Row {excel_row_num}.")
+    elif len(unassigned):
+        logging.warning(f"WARNING: No person was assigned any role in {len(unassigned)} rows.")
 
-    logging.info(f"--- Pass 1 Finished. ---")
-    
-    logging.info("--- Starting Pass 2: Calculating base commissions... ---")
-    for month_key, month_data in results.items():
-        for person_name, person_data in month_data['persons'].items():
-            rates = _get_commission_rates_for_bracket(person_data['bracket_base'], person_data['model'], all_rules_dict)
-            person_data['total_commission'] = 0
-            for txn in person_data['transactions']:
-                original_rate = config.RENEWAL_COMMISSION_RATE if txn['is_renewal'] else rates.get(txn['role'], 0)
-                
-                # UPDATED: No Agent Multiplier applied here
-                current_rate = original_rate 
-                
-                collection_ratio = (txn['paid_amount'] / txn['net_value']) if txn['net_value'] > 0 else 1.0
-                full_commission = txn['commission_base'] * current_rate
-                payable_commission = full_commission * collection_ratio
-                commission_remaining = full_commission - payable_commission
-                
-                txn['rate_used'] = current_rate
-                txn['payable_commission'] = payable_commission
-                txn['full_commission'] = full_commission
-                txn['commission_remaining'] = commission_remaining
-                person_data['total_commission'] += payable_commission
-
-                details = [
-                    f"مبلغ مبنای پورسانت: {txn['commission_base']:,.0f} تومان",
-                    f"نرخ پورسانت (نقش {txn['role']}): {current_rate:.2%}",
-                    f"محاسبه پورسانت کامل: {txn['commission_base']:,.0f} * {current_rate:.2%} = {full_commission:,.0f} تومان",
-                    "-" * 20,
-                    f"نسبت وصول: {collection_ratio:.2%} ({txn['paid_amount']:,.0f} / {txn['net_value']:,.0f})",
-                    f"پورسانت قابل پرداخت: {full_commission:,.0f} * {collection_ratio:.2%} = {payable_commission:,.0f} تومان",
-                    f"پورسانت باقی مانده: {full_commission:,.0f} - {payable_commission:,.0f} = {commission_remaining:,.0f} تومان"
-                ]
-                txn['calculation_details'] = "\n".join(details)
-    logging.info("--- Pass 2 Finished. ---")
-
-    logging.info("--- Starting Pass 3: Calculating additional bonuses... ---")
+    # melt() stacks role by role, so a stable sort on the row restores (row, role) order.
+    long_df = long_df.sort_values('row_pos', kind='stable')
+    return long_df.assign(month_key=frame['month_key'].to_numpy()[long_df['row_pos'].to_numpy()])
+
+def _assemble_pass1_results(sales_frame, employee_models, config, forensic=False):
+    """
+    Melts the three role columns into one long (month, person, role) frame and
+    builds the Pass 1 'results' structure from it: one TransactionStore per
+    month, and one TransactionSlice of it per person-month.
+
+    A person's transactions keep their original order (sheet row, then role
+    column), and months/persons appear in the order they are first met,
+    exactly like the original row-by-row loop.
+    """
+    results = {}
+    frame = sales_frame[sales_frame['month_key'].notna()]
+    if frame.empty:
+        return results
+
+    long_df = _melt_roles(frame, forensic)
+    if long_df.empty:
+        return results
+    row_pos = long_df['row_pos'].to_numpy()
+    group_codes = long_df.groupby(['month_key', 'person'], sort=False).ngroup().to_numpy()
+    group_count = group_codes.max() + 1
+
+    # Bracket base: sum of the qualifying negotiator rows per (month, person).
+    # np.add.at accumulates in row order, matching the original running total.
+    qualifying = (long_df['role'].to_numpy() == NEGOTIATOR_ROLE) & frame['qualifies_for_bracket'].to_numpy()[row_pos]
+    bracket_bases = np.zeros(group_count)
+    np.add.at(bracket_bases, group_codes[qualifying], frame['commission_base'].to_numpy()[row_pos][qualifying])
+    has_bracket_base = np.bincount(group_codes[qualifying], minlength=group_count) > 0
+
+    # Lay the transactions out month by month, and person by person inside a
+    # month, so each month gets one columnar store and each person-month a
+    # contiguous slice of it. lexsort is stable, so (row, role) order is kept.
+    month_codes = pd.factorize(long_df['month_key'])[0]
+    order = np.lexsort((group_codes, month_codes))
+    sorted_rows = row_pos[order]
+    sorted_groups = group_codes[order]
+    sorted_months = month_codes[order]
+    group_starts = np.zeros(group_count, dtype=np.int64)
+    group_firsts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    group_starts[sorted_groups[group_firsts]] = group_firsts
+    group_stops = group_starts + np.bincount(group_codes, minlength=group_count)
+    month_firsts = np.flatnonzero(np.r_[True, sorted_months[1:] != sorted_months[:-1]])
+    month_bounds = dict(zip(sorted_months[month_firsts].tolist(), zip(month_firsts, np.r_[month_firsts[1:], len(order)])))
+
+    numeric_columns = {field: frame[field].to_numpy()[sorted_rows] for field in ('net_value', 'commission_base', 'paid_amount')}
+    is_renewal = frame['is_renewal'].to_numpy()[sorted_rows]
+    coded_columns = {
+        'role': long_df['role'].to_numpy()[order],
+        'company': frame['company'].to_numpy()[sorted_rows],
+        'person': long_df['person'].to_numpy()[order],
+        'invoice_link': frame['invoice_link'].to_numpy()[sorted_rows]
+    }
+
+    group_heads = long_df.drop_duplicates(['month_key', 'person'])
+    for code, (month_key, person_name) in enumerate(zip(group_heads['month_key'], group_heads['person'])):
+        month_first, month_stop = month_bounds[int(sorted_months[group_starts[code]])]
+        month_data = results.get(month_key)
+        if month_data is None:
+            store = TransactionStore.from_arrays(
+                is_renewal[month_first:month_stop],
+                {field: values[month_first:month_stop] for field, values in numeric_columns.items()},
+                {field: values[month_first:month_stop] for field, values in coded_columns.items()}
+            )
+            month_data = results[month_key] = {'persons': {}, 'transaction_store': store}
+        month_data['persons'][person_name] = {
+            'model': employee_models.get(person_name, config.DEFAULT_COMMISSION_MODEL),
+            'bracket_base': float(bracket_bases[code]) if has_bracket_base[code] else 0,
+            'transactions': TransactionSlice(
+                month_data['transaction_store'],
+                int(group_starts[code] - month_first), int(group_stops[code] - month_first)
+            )
+        }
+
+    return results
+
+
+# --- Incremental Recalculation Helpers ---
+
+def _active_month_keys(sales_frame):
+    """Month keys that will appear in the results (at least one assigned person), in first-seen order."""
+    assigned = np.zeros(len(sales_frame), dtype=bool)
+    for role in ROLE_COLUMNS:
+        names = sales_frame[role]
+        assigned |= ((names != '') & (names.str.lower() != 'nan')).to_numpy()
+    month_keys = sales_frame['month_key'][assigned & sales_frame['month_key'].notna().to_numpy()]
+    return list(pd.unique(month_keys))
+
+def _resolve_target_timeline(additional_comm_df, month_keys):
+    """
+    Resolves the raw (Rial) collective/individual targets of every month up
+    front, carrying the last valid value forward over months with empty cells
+    or no row in the 'Additional commissions' sheet.
+
+    Returns:
+        dict: month_key -> {'start', 'raw', 'collective', 'individual'}, where
+        'start' is the carried-over pair and 'raw' the sheet cells (or None).
+    """
     targets_lookup = additional_comm_df.set_index(['سال', 'ماه'])
-    
     last_valid_targets = {'collective': 0, 'individual': 0}
-    for month_key in sorted(results.keys()):
-        month_data = results[month_key]
+    timeline = {}
+    for month_key in sorted(month_keys):
         year, month = map(int, month_key.split('-'))
-        
-        logging.info(f"\n----- BONUS CALC FOR MONTH: {month_key} -----")
-        
-        # This is a snapshot of the memory from the PREVIOUS month's loop
-        logging.info(f"  [START] Initial raw targets (from prev month): C={last_valid_targets['collective']:,.0f}, I={last_valid_targets['individual']:,.0f}")
-
+        start = dict(last_valid_targets)
+        raw = None
         if (year, month) in targets_lookup.index:
             target_data = targets_lookup.loc[(year, month)]
-            logging.info(f"  Found targets in Excel for {month_key}: C_raw={target_data.get('تارگت جمعی')}, I_raw={target_data.get('تارگت فرعی')}")
-            
-            # ** THE FIX IS HERE **
-            # Only update the 'last_valid_targets' dictionary with new, valid numbers.
-            current_collective = target_data.get('تارگت جمعی')
-            if not pd.isna(current_collective):
-                last_valid_targets['collective'] = current_collective
-            current_individual = target_data.get('تارگت فرعی')
-            if not pd.isna(current_individual):
-                last_valid_targets['individual'] = current_individual
-        else:
-            logging.info(f"  No targets found in Excel for {month_key}. Using carried-over values.")
-        
-        collective_target_toman = last_valid_targets['collective'] * config.CURRENCY_CONVERSION_FACTOR
-        individual_target_toman = last_valid_targets['individual'] * config.CURRENCY_CONVERSION_FACTOR
-        logging.info(f"  [FINAL] Using Toman targets for {month_key}: Collective={collective_target_toman:,.0f}, Individual={individual_target_toman:,.0f}")
+            raw = (target_data.get('تارگت جمعی'), target_data.get('تارگت فرعی'))
+            # Only update the carried-over targets with new, valid numbers.
+            if not pd.isna(raw[0]):
+                last_valid_targets['collective'] = raw[0]
+            if not pd.isna(raw[1]):
+                last_valid_targets['individual'] = raw[1]
+        timeline[month_key] = {'start': start, 'raw': raw, **last_valid_targets}
+    return timeline
 
-        if collective_target_toman == 0 and individual_target_toman == 0:
-            logging.warning(f"Skipping bonus calculation for {month_key} due to zero targets.")
-            for p_data in month_data.get('persons', {}).values(): p_data['additional_bonus'] = 0
-            continue
+def _fingerprint_inputs(sales_frame, month_keys, employee_models, config, target_timeline):
+    """
+    Fingerprints the calculation inputs.
 
-        total_monthly_bracket_base = sum(p.get('bracket_base', 0) for p in month_data.get('persons', {}).values())
-        top_seller_name, top_seller_sales = None, 0
-        for name, p_data in month_data.get('persons', {}).items():
-            if p_data.get('bracket_base', 0) > top_seller_sales:
-                top_seller_sales = p_data['bracket_base']; top_seller_name = name
-        logging.info(f"  Monthly Bracket Base Total: {total_monthly_bracket_base:,.0f}. Top Seller: {top_seller_name}")
-
-        month_data['bonus_summary'] = {
-            'collective_target': collective_target_toman, 'individual_target': individual_target_toman,
-            'collective_amount': 0, 'individual_amount': 0, 'top_seller_amount': 0,
-            'top_seller_name': top_seller_name, 'top_seller_sales': top_seller_sales,
-            'bonus_percentages': config.BONUS_PERCENTAGES
-        }
-        
-        for name, p_data in month_data.get('persons', {}).items():
-            bonus_amount, bracket_base = 0, p_data.get('bracket_base', 0)
-            bonus_details_list = []
-            
-            coll_check = total_monthly_bracket_base >= collective_target_toman and collective_target_toman > 0
-            ind_check = bracket_base >= individual_target_toman and individual_target_toman > 0
-            top_check = name == top_seller_name and bracket_base > 0
+    The 'global' fingerprint covers everything every month depends on (settings,
+    bracket rules, employee models, results format). Each month's fingerprint
+    covers the global one, the month's resolved targets (so carry-over changes
+    are detected) and the hashes of its sales rows, in sheet order.
+    """
+    global_fingerprint = _global_fingerprint(employee_models, config)
+    row_hashes = _row_hashes(sales_frame)
+    month_positions = sales_frame.groupby('month_key', sort=False).indices
+    month_fingerprints = {
+        month_key: _month_fingerprint(global_fingerprint, target_timeline[month_key], row_hashes[month_positions[month_key]])
+        for month_key in month_keys
+    }
+    return {'global': global_fingerprint, 'months': month_fingerprints}
+
+def _global_fingerprint(employee_models, config):
+    global_inputs = [
+        RESULTS_FORMAT_VERSION,
+        {key: value for key, value in sorted(config.settings().items())},
+        config.rule_index.version,
+        sorted([str(name), str(model)] for name, model in employee_models.items())
+    ]
+    return hashlib.sha1(
+        json.dumps(global_inputs, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()
+
+def _row_hashes(sales_frame):
+    """One 64-bit hash per cleaned sales row."""
+    return pd.util.hash_pandas_object(sales_frame[FINGERPRINT_COLUMNS], index=False).to_numpy()
+
+def _month_fingerprint(global_fingerprint, targets, row_hashes):
+    """Fingerprint of one month from the global one, its resolved targets and its row hashes in sheet order."""
+    digest = hashlib.sha1(global_fingerprint.encode('utf-8'))
+    digest.update(f"{float(targets['collective'])!r}|{float(targets['individual'])!r}".encode('utf-8'))
+    digest.update(np.ascontiguousarray(row_hashes).tobytes())
+    return digest.hexdigest()
+
+def _reusable_months(fingerprints, previous_run):
+    """Month results of the previous run whose input fingerprints are unchanged."""
+    previous = previous_run.fingerprints
+    if previous.get('global') != fingerprints['global']:
+        return {}
+    unchanged = [m for m, fp in fingerprints['months'].items() if previous.get('months', {}).get(m) == fp]
+    if not unchanged:
+        return {}
+    previous_results = previous_run.results
+    return {m: previous_results[m] for m in unchanged if m in previous_results}
+
+
+# --- Pass 2 and 3: Per-Month Calculation ---
+
+def _calculate_base_commissions(month_data, config):
+    """
+    Pass 2: resolves the bracket rates of every person-month, then computes the
+    base commission of all the month's transactions at once over its store.
+    """
+    person_months = list(month_data['persons'].values())
+    all_rates = _get_commission_rates_for_brackets(
+        [p['bracket_base'] for p in person_months], [p['model'] for p in person_months], config.rule_index
+    )
+    store = month_data['transaction_store']
+    columns = store.columns
+    role_names = store.dictionaries['role']
+    rate_matrix = np.array([[rates.get(role, 0) for role in role_names] for rates in all_rates], dtype=float)
+    person_slots = np.empty(len(store), dtype=np.int64)
+    for slot, person_data in enumerate(person_months):
+        txns = person_data['transactions']
+        person_slots[txns.start:txns.stop] = slot
+
+    # UPDATED: No Agent Multiplier applied here
+    rate_used = np.where(
+        columns['is_renewal'], config.RENEWAL_COMMISSION_RATE,
+        rate_matrix.reshape(len(person_months), len(role_names))[person_slots, columns['role_code']]
+    )
+    net_value = columns['net_value']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        collection_ratio = np.where(net_value > 0, columns['paid_amount'] / net_value, 1.0)
+    full_commission = columns['commission_base'] * rate_used
+    payable_commission = full_commission * collection_ratio
+
+    # Only the numeric inputs are kept; the explanation text is rendered on demand (see explain.py).
+    columns['rate_used'] = rate_used
+    columns['full_commission'] = full_commission
+    columns['payable_commission'] = payable_commission
+    columns['commission_remaining'] = full_commission - payable_commission
+    columns['collection_ratio'] = collection_ratio
+
+    # np.add.at accumulates in transaction order, like the original running total.
+    totals = np.zeros(len(person_months))
+    np.add.at(totals, person_slots, payable_commission)
+    for person_data, total in zip(person_months, totals.tolist()):
+        person_data['total_commission'] = total
+
+def _calculate_bonuses(month_key, month_data, targets, config, forensic=False):
+    """Pass 3: the collective, individual and top-seller bonuses of one month."""
+    logging.info(f"\n----- BONUS CALC FOR MONTH: {month_key} -----")
+
+    # The targets carried over from the PREVIOUS month
+    logging.info(f"  [START] Initial raw targets (from prev month): C={targets['start']['collective']:,.0f}, I={targets['start']['individual']:,.0f}")
+
+    if targets['raw'] is not None:
+        logging.info(f"  Found targets in Excel for {month_key}: C_raw={targets['raw'][0]}, I_raw={targets['raw'][1]}")
+    else:
+        logging.info(f"  No targets found in Excel for {month_key}. Using carried-over values.")
+
+    collective_target_toman = targets['collective'] * config.CURRENCY_CONVERSION_FACTOR
+    individual_target_toman = targets['individual'] * config.CURRENCY_CONVERSION_FACTOR
+    logging.info(f"  [FINAL] Using Toman targets for {month_key}: Collective={collective_target_toman:,.0f}, Individual={individual_target_toman:,.0f}")
+
+    if collective_target_toman == 0 and individual_target_toman == 0:
+        logging.warning(f"Skipping bonus calculation for {month_key} due to zero targets.")
+        for p_data in month_data.get('persons', {}).values(): p_data['additional_bonus'] = 0
+        return
+
+    total_monthly_bracket_base = sum(p.get('bracket_base', 0) for p in month_data.get('persons', {}).values())
+    top_seller_name, top_seller_sales = None, 0
+    for name, p_data in month_data.get('persons', {}).items():
+        if p_data.get('bracket_base', 0) > top_seller_sales:
+            top_seller_sales = p_data['bracket_base']; top_seller_name = name
+    logging.info(f"  Monthly Bracket Base Total: {total_monthly_bracket_base:,.0f}. Top Seller: {top_seller_name}")
+
+    month_data['bonus_summary'] = {
+        'collective_target': collective_target_toman, 'individual_target': individual_target_toman,
+        'collective_amount': 0, 'individual_amount': 0, 'top_seller_amount': 0,
+        'top_seller_name': top_seller_name, 'top_seller_sales': top_seller_sales,
+        'bonus_percentages': config.BONUS_PERCENTAGES
+    }
+
+    for name, p_data in month_data.get('persons', {}).items():
+        bonus_amount, bracket_base = 0, p_data.get('bracket_base', 0)
+        bonus_breakdown = {}
+
+        coll_check = total_monthly_bracket_base >= collective_target_toman and collective_target_toman > 0
+        ind_check = bracket_base >= individual_target_toman and individual_target_toman > 0
+        top_check = name == top_seller_name and bracket_base > 0
+        if forensic:
             logging.info(f"    Checking bonuses for {name} (base={bracket_base:,.0f}):")
             logging.info(f"      Collective Check: {total_monthly_bracket_base:,.0f} >= {collective_target_toman:,.0f} -> {coll_check}")
             logging.info(f"      Individual Check: {bracket_base:,.0f} >= {individual_target_toman:,.0f} -> {ind_check}")
             logging.info(f"      Top Seller Check: {name} == {top_seller_name} -> {top_check}")
-            
-            if coll_check: 
-                coll_bonus = bracket_base * config.BONUS_PERCENTAGES['collective']
-                bonus_details_list.append(f"پاداش جمعی: {coll_bonus:,.0f} تومان")
-                bonus_amount += coll_bonus
-            if ind_check: 
-                ind_bonus = bracket_base * config.BONUS_PERCENTAGES['individual']
-                bonus_details_list.append(f"پاداش فردی: {ind_bonus:,.0f} تومان")
-                bonus_amount += ind_bonus
-            if top_check: 
-                top_bonus = bracket_base * config.BONUS_PERCENTAGES['top_seller']
-                bonus_details_list.append(f"پاداش تاپ سلر: {top_bonus:,.0f} تومان")
-                bonus_amount += top_bonus
-                
-            p_data['additional_bonus'] = bonus_amount
-            p_data['total_commission'] += bonus_amount
-            
-            if bonus_amount > 0:
-                bonus_details_header = "\n" + ("-"*10) + " جزئیات پاداش " + ("-"*10)
-                bonus_details_list.insert(0, bonus_details_header)
-                bonus_details_list.append(f"مجموع پاداش: {bonus_amount:,.0f} تومان")
-                bonus_details_str = "\n".join(bonus_details_list)
-                for txn in p_data['transactions']:
-                    txn['calculation_details'] += bonus_details_str
-                    
-    logging.info("--- Pass 3 Finished. ---")
-    return results, config
+
+        if coll_check: 
+            coll_bonus = bracket_base * config.BONUS_PERCENTAGES['collective']
+            bonus_breakdown['collective'] = coll_bonus
+            bonus_amount += coll_bonus
+        if ind_check: 
+            ind_bonus = bracket_base * config.BONUS_PERCENTAGES['individual']
+            bonus_breakdown['individual'] = ind_bonus
+            bonus_amount += ind_bonus
+        if top_check: 
+            top_bonus = bracket_base * config.BONUS_PERCENTAGES['top_seller']
+            bonus_breakdown['top_seller'] = top_bonus
+            bonus_amount += top_bonus
+
+        p_data['additional_bonus'] = bonus_amount
+        p_data['total_commission'] += bonus_amount
+        # Kept once per person-month; the report renders it on demand.
+        p_data['bonus_breakdown'] = bonus_breakdown
+
+def _calculate_month(month_key, month_data, targets, config, forensic=False):
+    """
+    Runs Pass 2 and Pass 3 for a single month. Months are independent once
+    the target timeline is resolved, so this is also the unit of parallel work.
+    """
+    _calculate_base_commissions(month_data, config)
+    _calculate_bonuses(month_key, month_data, targets, config, forensic)
+    return month_data
+
+def _calculate_month_worker(task):
+    """ProcessPoolExecutor entry point: unpacks a task tuple and returns (month_key, month_data)."""
+    month_key = task[0]
+    return month_key, _calculate_month(*task)
+
+def _calculate_months(results, target_timeline, config, forensic=False, workers=1):
+    """Runs Pass 2 & 3 for every month of the Pass 1 results, in place (serially or in worker processes)."""
+    logging.info("--- Starting Pass 2 & 3: Calculating base commissions and bonuses per month... ---")
+    tasks = [
+        (month_key, results[month_key], target_timeline[month_key], config, forensic)
+        for month_key in sorted(results.keys())
+    ]
+    worker_count = min(resolve_worker_count(workers), len(tasks))
+    if worker_count > 1:
+        logging.info(f"Calculating {len(tasks)} months in {worker_count} worker processes.")
+        with ProcessPoolExecutor(max_workers=worker_count) as executor:
+            for month_key, month_data in executor.map(_calculate_month_worker, tasks):
+                results[month_key] = month_data
+    else:
+        for task in tasks:
+            _calculate_month(*task)
+    logging.info("--- Pass 2 & 3 Finished. ---")
+
+# --- Main Calculation Orchestrator ---
+
+def _log_configuration(config, additional_comm_df, employee_models_df):
+    """Forensic mode: dumps the configuration snapshot and the small input sheets."""
+    logging.info("\n" + "="*30 + " CURRENT CONFIGURATION STATE " + "="*30)
+    logging.info("--- App Settings from DB ---")
+    for key, value, value_type in config.setting_rows: logging.info(f"  - {key}: {value} (Type: {value_type})")
+
+    logging.info("\n--- Commission Rules from DB ---")
+    for r in config.rules: logging.info(f"  - Model: {r.model_name}, Range: {r.min_sales:,.0f}-{r.max_sales:,.0f}, Rates: M={r.marketer_rate:.2%}, N={r.negotiator_rate:.2%}, C={r.coordinator_rate:.2%}")
+
+    logging.info("\n--- Additional Commissions Sheet Content ---")
+    logging.info("\n" + additional_comm_df.to_string())
+
+    logging.info("\n--- Employee Models Sheet Content ---")
+    logging.info("\n" + employee_models_df.to_string())
+    logging.info("="*80 + "\n")
+
+def calculate_commissions(dataframes, mode=ENGINE_MODE_FAST, previous_run=None, workers=1):
+    """
+    Convenience wrapper for the Flask layer: fetches the (cached) configuration
+    snapshot and runs the engine with it.
+
+    Returns:
+        tuple: (CalculationResults, EngineConfig)
+    """
+    engine_config = get_engine_config()
+    return run_engine(dataframes, engine_config, mode=mode, previous_run=previous_run, workers=workers), engine_config
+
+def run_engine(dataframes, config, mode=ENGINE_MODE_FAST, previous_run=None, workers=1):
+    """
+    Runs the three calculation passes over the validated workbook. Needs no
+    app context or database: everything comes from the DataFrames and the
+    configuration snapshot.
+
+    Args:
+        dataframes (dict): The validated sheets, keyed by sheet name.
+        config (EngineConfig): The settings and compiled brackets to calculate with.
+        mode (str): ENGINE_MODE_FAST (default) or ENGINE_MODE_FORENSIC.
+        previous_run (PreviousRun, optional): An earlier run to reuse unchanged
+            months from. Ignored in forensic mode, which always traces every row.
+        workers (int): Worker processes for Pass 2 & 3 (1 = serial, None/0 = all cores).
+
+    Returns:
+        CalculationResults: The month-keyed results.
+    """
+    if mode not in ENGINE_MODES:
+        raise ValueError(f"Unknown engine mode '{mode}'. Expected one of: {', '.join(ENGINE_MODES)}")
+    forensic = mode == ENGINE_MODE_FORENSIC
+
+    logging.info("="*80)
+    logging.info(f"STARTING COMMISSION CALCULATION PROCESS ({mode.upper()} MODE - NO AGENT LOGIC)")
+    logging.info("="*80)
+    
+    additional_comm_df = dataframes.get('Additional commissions')
+    employee_models_df = dataframes['Employee Models']
+
+    if forensic:
+        _log_configuration(config, additional_comm_df, employee_models_df)
+    
+    sales_df = dataframes['Sales data']
+    employee_models = dict(zip(employee_models_df['نام'], employee_models_df['مدل همکاری']))
+    results = {}
+    month_keys, fingerprints, reused = [], None, {}
+    
+    logging.info("--- Starting Pass 1: Processing transactions and calculating bracket bases. ---")
+    if NEGOTIATOR_ROLE not in sales_df.columns:
+        logging.error(f"FATAL FLAW in Excel file: Column '{NEGOTIATOR_ROLE}' not found!")
+        target_timeline = {}
+    else:
+        sales_frame = _build_sales_frame(sales_df, config)
+        if forensic:
+            _log_pass1_audit(sales_df, sales_frame, config)
+        _warn_skipped_rows(sales_frame, forensic)
+
+        month_keys = _active_month_keys(sales_frame)
+        target_timeline = _resolve_target_timeline(additional_comm_df, month_keys)
+        fingerprints = _fingerprint_inputs(sales_frame, month_keys, employee_models, config, target_timeline)
+        if previous_run is not None and not forensic:
+            reused = _reusable_months(fingerprints, previous_run)
+            logging.info(f"Incremental run: reusing {len(reused)} of {len(month_keys)} months from the previous run.")
+        if reused:
+            sales_frame = sales_frame[~sales_frame['month_key'].isin(list(reused))]
+        results = _assemble_pass1_results(sales_frame, employee_models, config, forensic)
+
+    logging.info(f"--- Pass 1 Finished. ---")
+    
+    _calculate_months(results, target_timeline, config, forensic, workers)
+
+    # Months keep the order in which they first appear in the sheet.
+    return CalculationResults(
+        ((m, results[m] if m in results else reused[m]) for m in month_keys),
+        mode=mode, fingerprints=fingerprints, reused_months=reused, row_count=len(sales_df)
+    )
 
 def summarize_results(results, commissions_paid_df, config):
     summary = {}
     paid_summary = {}
     if commissions_paid_df is not None and not commissions_paid_df.empty:
-        paid_summary = (pd.to_numeric(commissions_paid_df['مبلغ پرداخت شده'].astype(str).str.replace(',', ''), errors='coerce').fillna(0).groupby(commissions_paid_df['نام']).sum() * config.CURRENCY_CONVERSION_FACTOR).to_dict()
+        paid = commissions_paid_df['مبلغ پرداخت شده']
+        if not pd.api.types.is_numeric_dtype(paid):  # Already parsed by the loader otherwise
+            paid = pd.to_numeric(paid.astype(str).str.replace(',', ''), errors='coerce')
+        paid_summary = (paid.fillna(0).groupby(commissions_paid_df['نام']).sum() * config.CURRENCY_CONVERSION_FACTOR).to_dict()
     
     for month_data in results.values():
         for person_name, person_data in month_data.get('persons', {}).items():
@@ -331,8 +681,8 @@ def summarize_results(results, commissions_paid_df, config):
             person_summary['total_original_commission'] += original_commission
             person_summary['total_additional_bonus'] += person_data.get('additional_bonus', 0)
 
-            full_commission_monthly = sum(txn.get('full_commission', 0) for txn in person_data['transactions'])
-            pending_commission_monthly = sum(txn.get('commission_remaining', 0) for txn in person_data['transactions'])
+            full_commission_monthly = transaction_sum(person_data['transactions'], 'full_commission')
+            pending_commission_monthly = transaction_sum(person_data['transactions'], 'commission_remaining')
             person_summary['total_full_commission'] += full_commission_monthly
             person_summary['total_pending_commission'] += pending_commission_monthly
 
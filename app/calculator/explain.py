@@ -0,0 +1,63 @@
+# ==============================================================================
+# app/calculator/explain.py
+# ------------------------------------------------------------------------------
+# Renders the human-readable (Persian) calculation explanations on demand.
+# The engine only stores the numeric inputs of each calculation; the text is
+# produced here when a transaction is displayed or exported.
+# ==============================================================================
+
+BONUS_LABELS = {
+    'collective': 'پاداش جمعی',
+    'individual': 'پاداش فردی',
+    'top_seller': 'پاداش تاپ سلر'
+}
+
+def render_transaction_details(txn):
+    """
+    Builds the step-by-step commission explanation of one transaction.
+
+    Args:
+        txn: A transaction from the engine results.
+
+    Returns:
+        list: The explanation lines. A separator line contains '---'.
+    """
+    # Runs saved before the explanations became lazy carry the text itself.
+    if txn.get('calculation_details'):
+        return txn['calculation_details'].split('\n')
+
+    commission_base = txn['commission_base']
+    rate = txn['rate_used']
+    full_commission = txn['full_commission']
+    payable_commission = txn['payable_commission']
+    collection_ratio = txn.get('collection_ratio')
+    if collection_ratio is None:
+        collection_ratio = (txn['paid_amount'] / txn['net_value']) if txn['net_value'] > 0 else 1.0
+
+    return [
+        f"مبلغ مبنای پورسانت: {commission_base:,.0f} تومان",
+        f"نرخ پورسانت (نقش {txn['role']}): {rate:.2%}",
+        f"محاسبه پورسانت کامل: {commission_base:,.0f} * {rate:.2%} = {full_commission:,.0f} تومان",
+        "-" * 20,
+        f"نسبت وصول: {collection_ratio:.2%} ({txn['paid_amount']:,.0f} / {txn['net_value']:,.0f})",
+        f"پورسانت قابل پرداخت: {full_commission:,.0f} * {collection_ratio:.2%} = {payable_commission:,.0f} تومان",
+        f"پورسانت باقی مانده: {full_commission:,.0f} - {payable_commission:,.0f} = {txn['commission_remaining']:,.0f} تومان"
+    ]
+
+def render_bonus_details(person_data):
+    """
+    Builds the bonus explanation of one person in one month.
+
+    Returns:
+        list: The explanation lines, or an empty list if no bonus was earned.
+    """
+    bonus_breakdown = person_data.get('bonus_breakdown') or {}
+    bonus_amount = person_data.get('additional_bonus', 0)
+    if not bonus_breakdown or bonus_amount <= 0:
+        return []
+
+    lines = [("-" * 10) + " جزئیات پاداش " + ("-" * 10)]
+    for key, amount in bonus_breakdown.items():
+        lines.append(f"{BONUS_LABELS.get(key, key)}: {amount:,.0f} تومان")
+    lines.append(f"مجموع پاداش: {bonus_amount:,.0f} تومان")
+    return lines
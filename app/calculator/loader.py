@@ -0,0 +1,363 @@
+# ==============================================================================
+# app/calculator/loader.py
+# ------------------------------------------------------------------------------
+# Fast, schema-driven workbook loading.
+# Workbooks are opened in openpyxl's read-only (streaming) mode and only the
+# columns listed in schema.py are read. Numeric columns are parsed to floats
+# while reading (thousands separators stripped, empty cells as NaN), so the
+# validator and the engine share one parse instead of each re-coercing
+# strings, and non-numeric cells are returned for the quality report (see
+# quality.py). Other columns come out as pd.read_excel would return them.
+#
+# A large sheet can also be read in parts: part i of n only parses the
+# <row> elements that start in the i-th of n equal byte ranges of the sheet
+# XML, so n processes can read one sheet together (see validator.py). Each
+# part still inflates the compressed XML before its range (a deflate stream
+# cannot be entered midway), but only parses its own rows.
+# Split reads use openpyxl internals (WorkSheetParser, the worksheet's XML
+# member and shared strings), which is why openpyxl is pinned in
+# requirements.txt; _sheet_xml checks for them, and without them every
+# sheet is read in one part.
+# ==============================================================================
+
+import io
+import logging
+import math
+import re
+import numpy as np
+import pandas as pd
+import openpyxl
+try:
+    from openpyxl.worksheet._reader import WorkSheetParser
+except ImportError:  # Another openpyxl layout: sheets are read in one part
+    WorkSheetParser = None
+from pandas._libs.parsers import STR_NA_VALUES
+
+from .schema import EXPECTED_SHEETS
+
+XML_BLOCK_SIZE = 1024 * 1024
+# Sheets with less XML than this are always read in one part.
+MIN_SPLIT_XML_BYTES = 8 * 1024 * 1024
+
+# The <sheetData> start tag, with the namespace prefix the sheet uses (if any),
+# e.g. <x:sheetData> in sheets written by some .NET libraries.
+SHEET_DATA_START = re.compile(rb'<(?:(\w+):)?sheetData[\s/>]')
+
+
+def open_workbook(filepath):
+    """Opens a workbook (a path or a seekable binary stream) in read-only mode. The caller closes it."""
+    return openpyxl.load_workbook(filepath, read_only=True, data_only=True, keep_links=False)
+
+def read_header(worksheet):
+    """The column names of a sheet (its first row)."""
+    header = next(worksheet.iter_rows(max_row=1, values_only=True), ())
+    return [f'Unnamed: {i}' if name is None else name for i, name in enumerate(header)]
+
+def read_sheet_part(worksheet, sheet_name, part=0, parts=1):
+    """
+    Reads the schema columns of one part of a sheet (see the module header).
+    The index is the Excel row - 2, and trailing empty rows are dropped.
+
+    Returns:
+        tuple: (pd.DataFrame, list of (column position, column name, Excel
+        rows, values) of the non-numeric cells of numeric columns, in column order)
+    """
+    layout = _SheetLayout(read_header(worksheet), sheet_name)
+    if parts == 1:
+        rows = _numbered_rows(worksheet.iter_rows(min_row=2, max_col=layout.max_col, values_only=True), 2)
+    else:
+        rows = _part_rows(worksheet, part, parts)
+    (frame, invalid_cells), = _iter_chunks(layout, rows, None)
+    return frame, invalid_cells
+
+def merge_sheet_parts(frames):
+    """Joins the parts of a sheet in order, restoring empty rows between them."""
+    frames = [frame for frame in frames if len(frame)] or frames[:1]
+    if len(frames) == 1:
+        return frames[0]
+    merged = pd.concat(frames)
+    merged = merged.reindex(pd.RangeIndex(0, merged.index[-1] + 1))
+    # Text columns are typed per part; type them again over the whole sheet, as one read would.
+    for name in merged.columns[merged.dtypes == object]:
+        merged[name] = pd.to_numeric(merged[name], errors='ignore').infer_objects().fillna(np.nan)
+    return merged
+
+def split_count(worksheet, parts):
+    """How many parts a sheet is worth reading in: 1 unless its XML is large and its rows are numbered."""
+    if parts <= 1:
+        return 1
+    sheet_xml = _sheet_xml(worksheet)
+    if sheet_xml is None or sheet_xml[1] < MIN_SPLIT_XML_BYTES:
+        return 1
+    # Parts rely on the r="..." row numbers that Excel and openpyxl always write.
+    with sheet_xml[0]() as source:
+        head = source.read(XML_BLOCK_SIZE)
+    tags = _sheet_tags(head)
+    at = head.find(tags.row_start) if tags is not None else -1
+    return parts if at >= 0 and b' r="' in head[at:head.find(b'>', at)] else 1
+
+def iter_sheet_chunks(worksheet, sheet_name, chunk_rows=None):
+    """
+    Reads the schema columns of a sheet in chunks of `chunk_rows` rows (or in
+    one chunk), in sheet column order. Trailing empty rows are dropped and the
+    index counts data rows from 0 across chunks, so index + 2 is the Excel row.
+
+    Yields:
+        tuple: (pd.DataFrame, the chunk's invalid cells as for read_sheet_part)
+    """
+    layout = _SheetLayout(read_header(worksheet), sheet_name)
+    rows = _numbered_rows(worksheet.iter_rows(min_row=2, max_col=layout.max_col, values_only=True), 2)
+    return _iter_chunks(layout, rows, chunk_rows)
+
+
+def frame_from_columns(sheet_name, columns, text=False):
+    """
+    Builds a sheet from columns that were read some other way (e.g. from a CSV
+    or Parquet file, see bundle.py), with the same column projection, number
+    parsing and typing as an .xlsx sheet, so the engine sees identical
+    DataFrames. Value i of each column is Excel row i + 2.
+
+    Args:
+        sheet_name (str): The schema sheet.
+        columns (dict): Every column of the sheet, by header name, in order.
+        text (bool): The cells are all strings (a CSV file). Numeric-looking
+            cells of the text columns are then read as the numbers an .xlsx
+            cell would hold, so a column mixing numbers and text types as in
+            the workbook. A number stored as text in Excel ('010') cannot be
+            told apart and becomes a number too.
+
+    Returns:
+        tuple: (pd.DataFrame, invalid cells as for read_sheet_part)
+    """
+    layout = _SheetLayout(list(columns), sheet_name)
+    values = [pd.Series(columns[name], dtype=object).to_numpy() for name in layout.columns]
+    if text:
+        # Numeric columns parse their text in _parse_numbers.
+        values = [column if is_numeric else _numbers_from_text(column)
+                  for column, is_numeric in zip(values, layout.numeric)]
+    # Like the .xlsx reader, drop the trailing rows that are empty in every schema column.
+    present = np.zeros(len(values[0]) if values else 0, dtype=bool)
+    for column in values:
+        present |= pd.notna(column)
+    row_count = int(np.flatnonzero(present)[-1]) + 1 if present.any() else 0
+    return _columns_frame(layout, [column[:row_count] for column in values], 2, row_count)
+
+
+class _SheetLayout:
+    """Which columns of a sheet are read, where they are, and which are numeric."""
+
+    def __init__(self, header, sheet_name):
+        rules = EXPECTED_SHEETS[sheet_name]
+        wanted = set(rules['required_columns']) | set(rules.get('optional_columns', ()))
+        self.sheet_name = sheet_name
+        self.positions = {}
+        for position, name in enumerate(header):
+            if name in wanted and name not in self.positions:
+                self.positions[name] = position
+        self.columns = list(self.positions)
+        self.numeric = [name in rules['numeric_columns'] for name in self.columns]
+        self.max_col = max(self.positions.values()) + 1 if self.positions else 1
+
+    def project(self, row):
+        return tuple(_cell(row[position]) if position < len(row) else None for position in self.positions.values())
+
+
+def _numbered_rows(rows, first_row):
+    """Pairs each row of values with its Excel row number."""
+    return enumerate(rows, first_row)
+
+def _iter_chunks(layout, rows, chunk_rows):
+    """Builds frames from (Excel row, values) pairs, filling skipped rows and dropping trailing empty ones."""
+    buffer, empty_rows, start, next_row = [], [], None, None
+    for row_number, row in rows:
+        values = layout.project(row)
+        if start is None:
+            start = next_row = row_number
+        # Rows missing from the XML are empty rows.
+        empty_rows.extend([(None,) * len(values)] * (row_number - next_row))
+        next_row = row_number + 1
+        if all(value is None for value in values):
+            # Kept only if a non-empty row follows (pd.read_excel drops trailing empty rows).
+            empty_rows.append(values)
+            continue
+        buffer.extend(empty_rows)
+        empty_rows = []
+        buffer.append(values)
+        if chunk_rows and len(buffer) >= chunk_rows:
+            yield _chunk_frame(layout, buffer, start)
+            start += len(buffer)
+            buffer = []
+    if buffer or start is None or not chunk_rows:
+        yield _chunk_frame(layout, buffer, 2 if start is None else start)
+
+_warned_unsplittable = False
+
+def _sheet_xml(worksheet):
+    """
+    (a function opening the sheet's XML, its uncompressed size), from the
+    openpyxl internals split reads rely on; None if this openpyxl lacks them.
+    """
+    global _warned_unsplittable
+    try:
+        workbook = worksheet.parent
+        if WorkSheetParser is None or not all(hasattr(obj, name) for obj, name in (
+                (worksheet, '_shared_strings'), (workbook, '_date_formats'), (workbook, 'epoch'))):
+            raise AttributeError('WorkSheetParser, _shared_strings, _date_formats or epoch')
+        return worksheet._get_source, workbook._archive.getinfo(worksheet._worksheet_path).file_size
+    except AttributeError as e:
+        if not _warned_unsplittable:
+            logging.warning(f"This openpyxl version lacks what split sheet reads use ({e}); reading sheets in one part.")
+            _warned_unsplittable = True
+        return None
+
+class _SheetTags:
+    """The sheet XML's tags that bound row ranges, with the namespace prefix the sheet uses (if any)."""
+
+    def __init__(self, prefix):
+        self.row_start = b'<' + prefix + b'row '
+        self.sheet_data_end = b'</' + prefix + b'sheetData>'
+        self.worksheet_end = b'</' + prefix + b'worksheet>'
+
+def _sheet_tags(xml):
+    """The _SheetTags of a sheet, from its XML up to <sheetData>; None if that is not in `xml`."""
+    match = SHEET_DATA_START.search(xml)
+    if match is None:
+        return None
+    return _SheetTags(match.group(1) + b':' if match.group(1) else b'')
+
+def _part_rows(worksheet, part, parts):
+    """The (Excel row, values) pairs of one part of a sheet, parsed from its slice of the XML."""
+    open_source, size = _sheet_xml(worksheet)
+    with open_source() as source:
+        xml = _row_range_xml(source, size, part, parts)
+    workbook = worksheet.parent
+    parser = WorkSheetParser(io.BytesIO(xml), worksheet._shared_strings, data_only=workbook.data_only,
+                             epoch=workbook.epoch, date_formats=workbook._date_formats)
+    for row_number, cells in parser.parse():
+        if row_number < 2:
+            continue  # The header
+        values = [None] * (max((cell['column'] for cell in cells), default=0))
+        for cell in cells:
+            values[cell['column'] - 1] = cell['value']
+        yield row_number, values
+
+def _row_range_xml(source, size, part, parts):
+    """
+    A well-formed copy of the sheet XML holding only the <row> elements that
+    start in the part-th of `parts` equal byte ranges: the document head up to
+    <sheetData>, those rows, and the closing tags. The XML is scanned block by
+    block, so only that byte range is ever held in memory.
+    """
+    start = size * part // parts
+    stop = size * (part + 1) // parts if part + 1 < parts else None
+    head, body, tags = None, [], _SheetTags(b'')
+    window, window_offset = b'', 0  # window[0] is at byte window_offset of the XML
+    collecting = False
+    for block in iter(lambda: source.read(XML_BLOCK_SIZE), b''):
+        window += block
+        if head is None:
+            match = SHEET_DATA_START.search(window)
+            end = window.find(b'>', match.start()) if match is not None else -1
+            if end < 0:
+                continue
+            head, tags = window[:end + 1], _sheet_tags(window)
+            keep = len(tags.sheet_data_end)  # Overlap between blocks, so no tag is split unseen
+            if head.endswith(b'/>'):
+                return head[:-2] + b'>' + tags.sheet_data_end + tags.worksheet_end
+            window_offset += end + 1
+            window = window[end + 1:]
+        if not collecting:
+            at = window.find(tags.row_start, max(0, start - window_offset))
+            data_end = window.find(tags.sheet_data_end)
+            if data_end >= 0 and (at < 0 or data_end < at):
+                break  # No row starts in this part
+            if at < 0:
+                window_offset += max(0, len(window) - keep)
+                window = window[-keep:]
+                continue
+            window_offset += at
+            window = window[at:]
+            collecting = True
+            if stop is not None and window_offset >= stop:
+                break  # The first row after `start` already belongs to the next part
+        search_from = 1 if stop is None else max(1, stop - window_offset)
+        ends = [found for found in (window.find(tags.sheet_data_end),
+                                    window.find(tags.row_start, search_from) if stop is not None else -1)
+                if found >= 0]
+        if ends:
+            body.append(window[:min(ends)])
+            break
+        body.append(window[:-keep])
+        window_offset += len(window) - keep
+        window = window[-keep:]
+    return (head or b'<worksheet><sheetData>') + b''.join(body) + tags.sheet_data_end + tags.worksheet_end
+
+def _cell(value):
+    """Normalizes a cell like pd.read_excel: NA strings become None, integral floats become ints."""
+    if isinstance(value, str):
+        return None if value in STR_NA_VALUES else value
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        if value.is_integer():
+            return int(value)
+    return value
+
+def _numbers_from_text(cells):
+    """Text cells that look like numbers, as the ints or floats an .xlsx cell holds (see _cell)."""
+    series = pd.Series(cells, dtype=object)
+    numbers = pd.to_numeric(series, errors='coerce').to_numpy(dtype=float)
+    parsed = np.isfinite(numbers) & series.map(type).eq(str).to_numpy()
+    if not parsed.any():
+        return cells
+    converted = series.to_numpy(copy=True)
+    converted[parsed] = [_cell(number) for number in numbers[parsed].tolist()]
+    return converted
+
+def _parse_numbers(cells):
+    """
+    A numeric column as floats (NaN if empty) plus a mask of its non-numeric
+    cells, parsed in a few column operations (thousands separators stripped).
+    """
+    series = pd.Series(cells, dtype=object)
+    kind = pd.api.types.infer_dtype(series, skipna=True)
+    if kind in ('integer', 'floating', 'mixed-integer-float', 'empty'):
+        return series.to_numpy(dtype=float, na_value=np.nan), np.zeros(len(series), dtype=bool)
+    text = series.str.replace(',', '', regex=False)  # NaN for the cells that are not strings
+    numbers = pd.to_numeric(series.where(text.isna(), text), errors='coerce').to_numpy(dtype=float)
+    invalid = np.isnan(numbers) & series.notna().to_numpy()
+    if kind in ('boolean', 'mixed'):
+        is_bool = series.map(type).eq(bool).to_numpy()  # pd.to_numeric reads True as 1
+        invalid |= is_bool
+        numbers[is_bool] = np.nan
+    return numbers, invalid
+
+def _chunk_frame(layout, rows, first_row):
+    """
+    A DataFrame of projected rows starting at Excel row `first_row`, plus its
+    invalid cells as (column position, column name, Excel rows, values).
+    """
+    cells_by_column = list(zip(*rows)) if rows else [()] * len(layout.columns)
+    return _columns_frame(layout, cells_by_column, first_row, len(rows))
+
+def _columns_frame(layout, cells_by_column, first_row, row_count):
+    """_chunk_frame for projected columns instead of rows."""
+    invalid_cells = []
+    data = {}
+    excel_rows = np.arange(first_row, first_row + row_count)
+    for column_position, (name, is_numeric, cells) in enumerate(zip(layout.columns, layout.numeric, cells_by_column)):
+        if is_numeric:
+            data[name], invalid = _parse_numbers(cells)
+            if invalid.any():
+                invalid_cells.append((column_position, name, excel_rows[invalid], np.array(cells, dtype=object)[invalid]))
+        else:
+            series = pd.Series(cells, dtype=object)
+            # Like pd.read_excel, a column of numbers (or numeric strings) becomes numeric,
+            # and whole numbers stored as floats become integers.
+            values = pd.to_numeric(series, errors='ignore').infer_objects()
+            if values.dtype.kind == 'f' and values.notna().all() and (values % 1 == 0).all():
+                values = values.astype(np.int64)
+            data[name] = values.fillna(np.nan)
+    frame = pd.DataFrame(data, columns=layout.columns)
+    frame.index = pd.RangeIndex(first_row - 2, first_row - 2 + row_count)
+    return frame, invalid_cells
@@ -0,0 +1,153 @@
+# ==============================================================================
+# app/calculator/quality.py
+# ------------------------------------------------------------------------------
+# Data-quality pass over parsed workbooks.
+# Problems are found with whole-column operations and collected in a
+# QualityReport as one table (sheet, column, Excel row, value, problem).
+# Users see a capped summary, one line per sheet, column and problem; the
+# full table is offered as a downloadable CSV report.
+# Non-numeric cells in numeric columns block the calculation (see loader.py);
+# the other problems are warnings, as the engine already tolerates them.
+# ==============================================================================
+
+import numpy as np
+import pandas as pd
+
+from .schema import EXPECTED_SHEETS
+from .engine import ROLE_COLUMNS
+
+ISSUE_COLUMNS = ['sheet', 'column', 'excel_row', 'value', 'problem', 'blocking']
+CSV_HEADERS = {
+    'sheet': 'شیت', 'column': 'ستون', 'excel_row': 'ردیف اکسل',
+    'value': 'مقدار', 'problem': 'مشکل', 'blocking': 'مانع محاسبه'
+}
+# Excel rows quoted per summary line; the CSV report lists them all.
+MAX_EXAMPLE_ROWS = 5
+
+PROBLEM_NOT_NUMERIC = 'مقدار غیرعددی در ستون عددی'
+PROBLEM_PAID_EXCEEDS_NET = 'مبلغ وصول شده بیشتر از مبلغ کل خالص فاکتور'
+PROBLEM_NEGATIVE = 'مقدار منفی'
+PROBLEM_MISSING_PERIOD = 'ماه یا سال خالی یا نامعتبر (ردیف در محاسبه نادیده گرفته می‌شود)'
+PROBLEM_DUPLICATE_INVOICE = 'لینک فاکتور تکراری'
+PROBLEM_UNKNOWN_PERSON = "نام در شیت 'Employee Models' تعریف نشده است"
+
+SALES_SHEET = 'Sales data'
+
+
+class QualityReport:
+    """The problems found in one workbook (see the module header)."""
+
+    def __init__(self):
+        self._parts = []
+
+    def add(self, sheet, column, excel_rows, values, problem, blocking=False):
+        """Records one problem for many cells of a column at once."""
+        excel_rows = np.asarray(excel_rows, dtype=np.int64)
+        if len(excel_rows):
+            self._parts.append(pd.DataFrame({
+                'sheet': sheet, 'column': column, 'excel_row': excel_rows,
+                'value': np.asarray(values, dtype=object), 'problem': problem, 'blocking': blocking
+            }, columns=ISSUE_COLUMNS))
+
+    def __len__(self):
+        return sum(len(part) for part in self._parts)
+
+    @property
+    def issues(self):
+        """Every recorded problem, in the order recorded."""
+        if not self._parts:
+            return pd.DataFrame(columns=ISSUE_COLUMNS)
+        return pd.concat(self._parts, ignore_index=True)
+
+    @property
+    def has_errors(self):
+        return any(part['blocking'].iat[0] for part in self._parts)
+
+    def messages(self, blocking=True, max_rows=MAX_EXAMPLE_ROWS):
+        """One summary message per sheet, column and problem (blocking problems or warnings)."""
+        issues = self.issues
+        issues = issues[issues['blocking'] == blocking]
+        messages = []
+        for (sheet, column, problem), group in issues.groupby(['sheet', 'column', 'problem'], sort=False):
+            rows = group['excel_row'].head(max_rows).astype(str).tolist()
+            more = '، ...' if len(group) > max_rows else ''
+            messages.append(
+                f"شیت '{sheet}'، ستون '{column}': {len(group):,} مورد {problem} "
+                f"(ردیف اکسل {'، '.join(rows)}{more})"
+            )
+        return messages
+
+    def to_csv(self):
+        """The full report as CSV text with Persian headers (UTF-8 with BOM, so Excel opens it correctly)."""
+        issues = self.issues
+        issues['blocking'] = issues['blocking'].map({True: 'بله', False: 'خیر'})
+        return '\ufeff' + issues.rename(columns=CSV_HEADERS).to_csv(index=False)
+
+
+class SalesChecker:
+    """
+    The warning checks of 'Sales data', applied to the whole sheet or chunk by
+    chunk (duplicate invoice links are tracked across chunks).
+    """
+
+    def __init__(self, employee_models_df):
+        self.known_names = set(employee_models_df['نام'].dropna()) if employee_models_df is not None else None
+        self.seen_links = set()
+
+    def check(self, sales_df, report):
+        excel_rows = sales_df.index.to_numpy() + 2
+        net = sales_df['مبلغ کل خالص فاکتور']
+        paid = sales_df['وصول شده']
+        _add_masked(report, SALES_SHEET, 'وصول شده', excel_rows, paid, (paid > net).to_numpy(), PROBLEM_PAID_EXCEEDS_NET)
+
+        blank = sales_df.isna().all(axis=1)  # Empty rows between sales rows are not problems
+        for column in ('ماه', 'سال'):
+            values = sales_df[column]
+            missing = pd.to_numeric(values, errors='coerce').isna() & ~blank
+            _add_masked(report, SALES_SHEET, column, excel_rows, values, missing.to_numpy(), PROBLEM_MISSING_PERIOD)
+
+        if 'لینک فاکتور' in sales_df.columns:
+            links = sales_df['لینک فاکتور']
+            present = links.notna()
+            duplicate = present & (links.duplicated() | links.isin(self.seen_links))
+            _add_masked(report, SALES_SHEET, 'لینک فاکتور', excel_rows, links, duplicate.to_numpy(), PROBLEM_DUPLICATE_INVOICE)
+            self.seen_links.update(links[present])
+
+        if self.known_names is not None:
+            for column in ROLE_COLUMNS:
+                names = sales_df[column]
+                unknown = names.notna() & ~names.isin(self.known_names)
+                _add_masked(report, SALES_SHEET, column, excel_rows, names, unknown.to_numpy(), PROBLEM_UNKNOWN_PERSON)
+
+        check_negative_values(SALES_SHEET, sales_df, report)
+
+
+def add_invalid_cells(report, sheet_name, invalid_cells):
+    """
+    Records the non-numeric cells found by the loader (see loader.read_sheet_part)
+    as blocking problems, column by column. Sorting is stable, so the cells of
+    a column stay in row order when they come from several chunks or parts.
+    """
+    for _, column, excel_rows, values in sorted(invalid_cells, key=lambda cells: cells[0]):
+        report.add(sheet_name, column, excel_rows, values, PROBLEM_NOT_NUMERIC, blocking=True)
+
+def check_negative_values(sheet_name, df, report):
+    """Warns about negative values in the schema's numeric columns of a sheet."""
+    excel_rows = df.index.to_numpy() + 2
+    for column in EXPECTED_SHEETS[sheet_name]['numeric_columns']:
+        values = df[column]
+        _add_masked(report, sheet_name, column, excel_rows, values, (values < 0).to_numpy(), PROBLEM_NEGATIVE)
+
+def check_dataframes(dataframes, report):
+    """Runs every warning check over a validated workbook's DataFrames."""
+    for sheet_name, df in dataframes.items():
+        if sheet_name == SALES_SHEET:
+            SalesChecker(dataframes.get('Employee Models')).check(df, report)
+        else:
+            check_negative_values(sheet_name, df, report)
+    return report
+
+
+def _add_masked(report, sheet, column, excel_rows, values, mask, problem):
+    if mask.any():
+        report.add(sheet, column, excel_rows[mask], values.to_numpy()[mask], problem)
@@ -1,2 +1,191 @@
-# This file is now a placeholder. All business rules are loaded dynamically
-# from the database via the AppSetting model.
\ No newline at end of file
+# ==============================================================================
+# app/calculator/rules.py
+# ------------------------------------------------------------------------------
+# Compiled commission bracket index.
+# The bracket rules themselves live in the CommissionRuleSet table; this module
+# turns them into sorted boundary arrays (one table per commission model) so a
+# bracket base, or a whole array of them, can be resolved without scanning the
+# rule list or querying the database again.
+# ==============================================================================
+
+import bisect
+import hashlib
+import logging
+from collections import namedtuple
+import numpy as np
+
+ROLE_RATE_FIELDS = {
+    'بازاریاب': 'marketer_rate',
+    'مذاکره کننده ارشد': 'negotiator_rate',
+    'هماهنگ کننده فروش': 'coordinator_rate'
+}
+OPEN_ENDED_MAX_SALES = 999999999999
+UNKNOWN_BRACKET_LABEL = "پله: نامشخص"
+
+BracketRule = namedtuple('BracketRule', [
+    'model_name', 'min_sales', 'max_sales', 'marketer_rate', 'negotiator_rate', 'coordinator_rate'
+])
+
+def _bracket_label(rule):
+    """Human-readable range of a bracket, in millions of Toman."""
+    min_str = f"{rule.min_sales / 1_000_000:,.0f}"
+    max_str = "∞" if rule.max_sales >= OPEN_ENDED_MAX_SALES else f"{rule.max_sales / 1_000_000:,.0f}"
+    return f"پله: {min_str} - {max_str} میلیون"
+
+
+class CompiledBrackets:
+    """
+    The brackets of a single commission model, compiled into elementary
+    intervals between consecutive boundaries.
+
+    Every interval is owned by the first rule (in table order) that covers it,
+    which is exactly the rule the old linear `min <= base < max` scan returned,
+    so overlapping rules resolve the same way they always did.
+    """
+
+    def __init__(self, model_name, rules):
+        self.model_name = model_name
+        self.rules = list(rules)
+        self.issues = []
+
+        boundaries = sorted({r.min_sales for r in self.rules} | {r.max_sales for r in self.rules})
+        owners = []
+        for start, end in zip(boundaries[:-1], boundaries[1:]):
+            covering = [i for i, r in enumerate(self.rules) if r.min_sales <= start and end <= r.max_sales]
+            owners.append(covering[0] if covering else -1)
+            if not covering:
+                self.issues.append({'kind': 'gap', 'model': model_name, 'start': start, 'end': end})
+            elif len(covering) > 1:
+                self.issues.append({'kind': 'overlap', 'model': model_name, 'start': start, 'end': end})
+        if boundaries and boundaries[0] > 0:
+            self.issues.insert(0, {'kind': 'gap', 'model': model_name, 'start': 0, 'end': boundaries[0]})
+
+        self.boundaries = np.array(boundaries, dtype=float)
+        self.owners = np.array(owners, dtype=np.int64)
+        # The extra trailing entry serves the "no matching rule" position (-1).
+        self.rates = {
+            role: np.array([getattr(r, field) for r in self.rules] + [0.0], dtype=float)
+            for role, field in ROLE_RATE_FIELDS.items()
+        }
+        self.labels = [_bracket_label(r) for r in self.rules] + [UNKNOWN_BRACKET_LABEL]
+
+    def find(self, bracket_base):
+        """Returns the position of the rule matching a single base, or -1."""
+        slot = bisect.bisect_right(self.boundaries, bracket_base) - 1
+        if 0 <= slot < len(self.owners):
+            return int(self.owners[slot])
+        return -1
+
+    def resolve(self, bracket_bases):
+        """Vectorized `find`: maps an array of bases to rule positions (-1 for no match)."""
+        bases = np.asarray(bracket_bases, dtype=float)
+        slots = np.searchsorted(self.boundaries, bases, side='right') - 1
+        inside = (slots >= 0) & (slots < len(self.owners))
+        positions = np.full(bases.shape, -1, dtype=np.int64)
+        positions[inside] = self.owners[slots[inside]]
+        return positions
+
+
+class RuleIndex:
+    """
+    All commission models compiled from one version of the rule set.
+    Build it through `compile_rule_index` so it is only compiled once per version.
+    """
+
+    def __init__(self, rules, version):
+        self.version = version
+        by_model = {}
+        for rule in rules:
+            by_model.setdefault(rule.model_name, []).append(rule)
+        self.models = {name: CompiledBrackets(name, model_rules) for name, model_rules in by_model.items()}
+        self.issues = [issue for compiled in self.models.values() for issue in compiled.issues]
+        for issue in self.issues:
+            logging.warning(
+                f"Commission bracket {issue['kind']} in model '{issue['model']}': "
+                f"{issue['start']:,.0f} - {issue['end']:,.0f}"
+            )
+
+    def _resolve_many(self, bracket_bases, commission_models):
+        """Groups the inputs by model and resolves each group with one searchsorted call."""
+        bases = np.asarray(bracket_bases, dtype=float)
+        models = np.asarray(commission_models, dtype=object)
+        positions = np.full(bases.shape, -1, dtype=np.int64)
+        for model_name in set(models.tolist()):
+            compiled = self.models.get(model_name)
+            if compiled is None:
+                continue
+            mask = models == model_name
+            positions[mask] = compiled.resolve(bases[mask])
+        return models, positions
+
+    def rates_for_bases(self, bracket_bases, commission_models):
+        """
+        Resolves many (base, model) pairs at once.
+
+        Returns:
+            tuple: ({role: np.ndarray of rates}, np.ndarray of bool "a rule matched").
+        """
+        models, positions = self._resolve_many(bracket_bases, commission_models)
+        rates = {role: np.zeros(positions.shape) for role in ROLE_RATE_FIELDS}
+        for model_name, compiled in self.models.items():
+            mask = models == model_name
+            if not mask.any():
+                continue
+            for role in ROLE_RATE_FIELDS:
+                rates[role][mask] = compiled.rates[role][positions[mask]]
+        return rates, positions >= 0
+
+    def labels_for_bases(self, bracket_bases, commission_models):
+        """
+        Resolves many (base, model) pairs to their bracket range labels.
+
+        Returns:
+            list: The labels, in input order.
+        """
+        models, positions = self._resolve_many(bracket_bases, commission_models)
+        labels = np.full(positions.shape, UNKNOWN_BRACKET_LABEL, dtype=object)
+        for model_name, compiled in self.models.items():
+            mask = models == model_name
+            if mask.any():
+                labels[mask] = np.array(compiled.labels, dtype=object)[positions[mask]]
+        return labels.tolist()
+
+    def label_for(self, bracket_base, commission_model):
+        """Bracket range label for a single base."""
+        compiled = self.models.get(commission_model)
+        if compiled is None:
+            return UNKNOWN_BRACKET_LABEL
+        return compiled.labels[compiled.find(bracket_base)]
+
+
+_compiled_indexes = {}
+
+def rule_set_version(rules):
+    """A stable fingerprint of the rule rows, used as the rule-set version."""
+    digest = hashlib.sha1()
+    for rule in rules:
+        digest.update(repr(tuple(rule)).encode('utf-8'))
+    return digest.hexdigest()
+
+def compile_rule_index(rule_rows):
+    """
+    Returns the compiled RuleIndex for the given CommissionRuleSet rows (ORM
+    objects or BracketRule tuples). Indexes are cached by rule-set version.
+    """
+    rules = [
+        BracketRule(r.model_name, r.min_sales, r.max_sales, r.marketer_rate, r.negotiator_rate, r.coordinator_rate)
+        for r in rule_rows
+    ]
+    version = rule_set_version(rules)
+    index = _compiled_indexes.get(version)
+    if index is None:
+        logging.info(f"Compiling commission bracket index for rule-set version {version[:10]}...")
+        index = RuleIndex(rules, version)
+        _compiled_indexes.clear()
+        _compiled_indexes[version] = index
+    return index
+
+def load_rule_index():
+    """The compiled index of the CommissionRuleSet table, from the cached engine configuration."""
+    from .config import get_engine_config
+    return get_engine_config().rule_index
@@ -0,0 +1,230 @@
+# ==============================================================================
+# app/calculator/scenarios.py
+# ------------------------------------------------------------------------------
+# What-if evaluation of candidate rule sets and settings.
+# Pass 1 runs once over the parsed workbook (once per distinct set of Pass 1
+# settings); every scenario is then a handful of vectorized array operations
+# over the flattened person-months and transactions. Nothing is persisted.
+# ==============================================================================
+
+import json
+import logging
+import numpy as np
+
+from .config import SETTING_DEFAULTS
+from .engine import _build_sales_frame, _assemble_pass1_results, _resolve_target_timeline
+from .rules import BracketRule, ROLE_RATE_FIELDS
+
+# Settings that change the outcome of Pass 1 (bracket bases, models, cleaned values).
+PASS1_SETTING_KEYS = (
+    'CURRENCY_CONVERSION_FACTOR', 'BRACKET_QUALIFICATION_MIN_COLLECTION_PERCENT',
+    'BRACKET_QUALIFICATION_MIN_VALUES', 'DEFAULT_COMMISSION_MODEL'
+)
+RULE_FIELDS = ('model_name',) + BracketRule._fields[1:]
+
+
+def parse_scenarios(text):
+    """
+    Parses the scenario definitions entered by the admin.
+
+    The expected JSON is a list of objects with a 'name', an optional 'settings'
+    object (overrides of the live AppSetting values) and an optional 'rules'
+    list (a complete replacement of the commission brackets).
+
+    Returns:
+        tuple: (list of scenario dicts, list of human-readable error messages)
+    """
+    try:
+        raw_scenarios = json.loads(text)
+    except json.JSONDecodeError as e:
+        return [], [f"تعریف سناریوها یک JSON معتبر نیست: {e}"]
+    if not isinstance(raw_scenarios, list) or not raw_scenarios:
+        return [], ["تعریف سناریوها باید یک لیست JSON غیرخالی باشد."]
+
+    scenarios, errors = [], []
+    for position, raw in enumerate(raw_scenarios, start=1):
+        if not isinstance(raw, dict):
+            errors.append(f"سناریو شماره {position} باید یک شیء JSON باشد.")
+            continue
+        name = str(raw.get('name') or f"سناریو {position}")
+        settings = raw.get('settings') or {}
+        if not isinstance(settings, dict):
+            errors.append(f"در سناریو «{name}»، 'settings' باید یک شیء JSON باشد.")
+            settings = {}
+        unknown_keys = [key for key in settings if key not in SETTING_DEFAULTS]
+        if unknown_keys:
+            errors.append(f"در سناریو «{name}»، تنظیمات ناشناخته: {', '.join(unknown_keys)}")
+        invalid_keys = [key for key in settings if key in SETTING_DEFAULTS and not _valid_setting(key, settings[key])]
+        if invalid_keys:
+            errors.append(f"در سناریو «{name}»، مقدار این تنظیمات نامعتبر است: {', '.join(invalid_keys)}")
+
+        rules = None
+        if raw.get('rules') is not None:
+            rules = []
+            if not isinstance(raw['rules'], list):
+                errors.append(f"در سناریو «{name}»، 'rules' باید یک لیست JSON از قوانین باشد.")
+            else:
+                for rule_position, rule in enumerate(raw['rules'], start=1):
+                    try:
+                        if not isinstance(rule, dict):
+                            raise TypeError(rule)
+                        rules.append(BracketRule(str(rule['model_name']), *(float(rule[f]) for f in RULE_FIELDS[1:])))
+                    except (KeyError, TypeError, ValueError):
+                        errors.append(f"در سناریو «{name}»، قانون شماره {rule_position} ناقص یا نامعتبر است. فیلدهای لازم: {', '.join(RULE_FIELDS)}")
+        scenarios.append({'name': name, 'settings': settings, 'rules': rules})
+    return scenarios, errors
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _valid_setting(key, value):
+    """
+    True if a scenario override has the live setting's shape. Object-valued
+    settings may override some of their keys (see _merge_settings).
+    """
+    default = SETTING_DEFAULTS[key]
+    if isinstance(default, dict):
+        return isinstance(value, dict) and all(_is_number(v) for v in value.values())
+    if isinstance(default, str):
+        return isinstance(value, str)
+    return _is_number(value)
+
+def _merge_settings(live_config, settings):
+    """Scenario overrides over the live settings; object-valued settings are merged key by key."""
+    merged = dict(settings)
+    for key, value in settings.items():
+        if isinstance(SETTING_DEFAULTS[key], dict):
+            merged[key] = {**getattr(live_config, key), **value}
+    return merged
+
+
+class _FlattenedPass1:
+    """Pass 1 results as flat arrays: one entry per person-month and per transaction."""
+
+    def __init__(self, pass1_results):
+        months, persons, models, bases = [], [], [], []
+        txn_slots, txn_roles, txn_renewal, txn_base, txn_ratio = [], [], [], [], []
+        for month_key, month_data in pass1_results.items():
+            store = month_data['transaction_store']
+            slots = np.empty(len(store), dtype=np.int64)
+            for person_name, person_data in month_data['persons'].items():
+                txns = person_data['transactions']
+                slots[txns.start:txns.stop] = len(persons)
+                months.append(month_key)
+                persons.append(person_name)
+                models.append(person_data['model'])
+                bases.append(person_data['bracket_base'])
+            columns = store.columns
+            with np.errstate(divide='ignore', invalid='ignore'):
+                txn_ratio.append(np.where(columns['net_value'] > 0, columns['paid_amount'] / columns['net_value'], 1.0))
+            txn_slots.append(slots)
+            txn_roles.append(np.asarray(store.dictionaries['role'], dtype=object)[columns['role_code']])
+            txn_renewal.append(columns['is_renewal'])
+            txn_base.append(columns['commission_base'])
+
+        self.month_keys = list(pass1_results.keys())
+        self.months = np.asarray(months, dtype=object)
+        self.persons = np.asarray(persons, dtype=object)
+        self.models = np.asarray(models, dtype=object)
+        self.bases = np.asarray(bases, dtype=float)
+        concat = lambda parts, dtype: np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+        self.txn_slots = concat(txn_slots, np.int64)
+        self.txn_roles = concat(txn_roles, object)
+        self.txn_renewal = concat(txn_renewal, bool)
+        self.txn_base = concat(txn_base, float)
+        self.txn_ratio = concat(txn_ratio, float)
+
+
+def _person_month_commissions(flat, config):
+    """Pass 2 over all months at once: the payable base commission of every person-month."""
+    rates, _ = config.rule_index.rates_for_bases(flat.bases, flat.models)
+    txn_rates = np.zeros(len(flat.txn_slots))
+    for role in ROLE_RATE_FIELDS:
+        mask = flat.txn_roles == role
+        txn_rates[mask] = rates[role][flat.txn_slots[mask]]
+    txn_rates[flat.txn_renewal] = config.RENEWAL_COMMISSION_RATE
+    payable = flat.txn_base * txn_rates * flat.txn_ratio
+    return np.bincount(flat.txn_slots, weights=payable, minlength=len(flat.bases))
+
+def _person_month_bonuses(flat, config, target_timeline):
+    """Pass 3 over every month: the same collective/individual/top-seller rules as the engine."""
+    bonuses = np.zeros(len(flat.bases))
+    for month_key in flat.month_keys:
+        collective_target = target_timeline[month_key]['collective'] * config.CURRENCY_CONVERSION_FACTOR
+        individual_target = target_timeline[month_key]['individual'] * config.CURRENCY_CONVERSION_FACTOR
+        if collective_target == 0 and individual_target == 0:
+            continue
+        slots = np.flatnonzero(flat.months == month_key)
+        bases = flat.bases[slots]
+        percentages = np.zeros(len(slots))
+        if bases.sum() >= collective_target and collective_target > 0:
+            percentages += config.BONUS_PERCENTAGES['collective']
+        if individual_target > 0:
+            percentages += np.where(bases >= individual_target, config.BONUS_PERCENTAGES['individual'], 0)
+        if bases.max() > 0:
+            percentages[np.argmax(bases)] += config.BONUS_PERCENTAGES['top_seller']
+        bonuses[slots] = bases * percentages
+    return bonuses
+
+def _person_totals(flat, config, target_timeline):
+    """Total payable commission (base commission + bonuses) per person."""
+    person_months = _person_month_commissions(flat, config) + _person_month_bonuses(flat, config, target_timeline)
+    totals = {}
+    for person_name, amount in zip(flat.persons.tolist(), person_months.tolist()):
+        totals[person_name] = totals.get(person_name, 0) + amount
+    return totals
+
+
+def evaluate_scenarios(dataframes, scenarios, live_config):
+    """
+    Evaluates candidate rule/setting bundles against the live configuration
+    on the same workbook.
+
+    Args:
+        dataframes (dict): The validated sheets, keyed by sheet name.
+        scenarios (list): Scenario dicts as returned by parse_scenarios.
+        live_config (EngineConfig): The live configuration snapshot.
+
+    Returns:
+        dict: {'persons', 'baseline': {'per_person', 'total'}, 'scenarios': [...]},
+        where each scenario carries its per-person totals and deltas.
+    """
+    sales_df = dataframes['Sales data']
+    employee_models_df = dataframes['Employee Models']
+    employee_models = dict(zip(employee_models_df['نام'], employee_models_df['مدل همکاری']))
+
+    flattened = {}
+    def flattened_pass1(config):
+        signature = json.dumps([getattr(config, key) for key in PASS1_SETTING_KEYS], ensure_ascii=False, sort_keys=True, default=str)
+        if signature not in flattened:
+            logging.info(f"Scenario evaluation: running Pass 1 for settings {signature}")
+            sales_frame = _build_sales_frame(sales_df, config)
+            flat = _FlattenedPass1(_assemble_pass1_results(sales_frame, employee_models, config))
+            flattened[signature] = (flat, _resolve_target_timeline(dataframes['Additional commissions'], flat.month_keys))
+        return flattened[signature]
+
+    def evaluate(config):
+        flat, target_timeline = flattened_pass1(config)
+        return _person_totals(flat, config, target_timeline)
+
+    baseline = evaluate(live_config)
+    evaluated = []
+    for scenario in scenarios:
+        config = live_config.replace(settings=_merge_settings(live_config, scenario['settings']), rules=scenario['rules'])
+        totals = evaluate(config)
+        per_person = {}
+        for person_name in sorted(set(baseline) | set(totals)):
+            total = totals.get(person_name, 0)
+            per_person[person_name] = {'total': total, 'delta': total - baseline.get(person_name, 0)}
+        total = sum(totals.values())
+        evaluated.append({
+            'name': scenario['name'], 'per_person': per_person, 'bracket_issues': config.rule_index.issues,
+            'total': total, 'total_delta': total - sum(baseline.values())
+        })
+
+    persons = sorted(set(baseline).union(*(s['per_person'] for s in evaluated)))
+    return {
+        'persons': persons,
+        'baseline': {'per_person': baseline, 'total': sum(baseline.values())},
+        'scenarios': evaluated
+    }
@@ -2,7 +2,9 @@
 # app/calculator/schema.py
 # ------------------------------------------------------------------------------
 # Defines the expected structure of the uploaded Excel file.
-# This schema is the single source of truth for the validator.
+# This schema is the single source of truth for the validator and the loader:
+# only the required and optional columns of a sheet are read, and its
+# numeric columns are parsed to floats while reading.
 # ==============================================================================
 
 EXPECTED_SHEETS = {
@@ -12,7 +14,8 @@ EXPECTED_SHEETS = {
             'مبلغ کل خالص فاکتور', 'وصول شده', 'کل مبلغ مبنای پورسانت',
             'ماه', 'سال', 'تمدید اشتراک', 'نسخه پلن'
         ],
-        'numeric_columns': ['مبلغ کل خالص فاکتور', 'وصول شده', 'کل مبلغ مبنای پورسانت']
+        'numeric_columns': ['مبلغ کل خالص فاکتور', 'وصول شده', 'کل مبلغ مبنای پورسانت'],
+        'optional_columns': ['لینک فاکتور']
     },
     'Commissions paid': {
         'required_columns': ['نام', 'مبلغ پرداخت شده'],
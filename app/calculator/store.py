@@ -0,0 +1,210 @@
+# ==============================================================================
+# app/calculator/store.py
+# ------------------------------------------------------------------------------
+# Columnar (struct-of-arrays) storage for the engine's transactions.
+# Each month of the results owns one TransactionStore: typed NumPy arrays for
+# the numeric fields and dictionary-encoded codes for the repeated strings
+# (role, company, person, invoice link). A person's transactions in that month
+# are a contiguous TransactionSlice of the store, and templates read single
+# transactions through lightweight TransactionRecord views.
+# ==============================================================================
+
+import json
+import numpy as np
+import pandas as pd
+
+NUMERIC_FIELDS = (
+    'net_value', 'commission_base', 'paid_amount', 'rate_used',
+    'full_commission', 'payable_commission', 'commission_remaining', 'collection_ratio'
+)
+CODED_FIELDS = ('role', 'company', 'person', 'invoice_link')
+# Field order of a transaction in the older list-of-dicts layout.
+RECORD_FIELDS = (
+    'role', 'net_value', 'commission_base', 'paid_amount', 'is_renewal', 'company', 'invoice_link',
+    'rate_used', 'payable_commission', 'full_commission', 'commission_remaining', 'collection_ratio'
+)
+
+
+class TransactionStore:
+    """The transactions of one month, stored column by column."""
+
+    def __init__(self, columns, dictionaries):
+        """
+        Args:
+            columns (dict): Field name -> np.ndarray. Numeric fields are float64,
+                'is_renewal' is bool and coded fields are stored as '<field>_code'.
+            dictionaries (dict): Coded field -> list of its distinct values.
+        """
+        self.columns = columns
+        self.dictionaries = dictionaries
+
+    @classmethod
+    def from_arrays(cls, is_renewal, numeric, coded):
+        """Builds a store from plain arrays, dictionary-encoding the coded fields."""
+        columns = {field: np.asarray(values, dtype=float) for field, values in numeric.items()}
+        columns['is_renewal'] = np.asarray(is_renewal, dtype=bool)
+        dictionaries = {}
+        for field, values in coded.items():
+            codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+            columns[f'{field}_code'] = codes.astype(np.int32)
+            dictionaries[field] = list(uniques)
+        return cls(columns, dictionaries)
+
+    def __len__(self):
+        return len(self.columns['is_renewal'])
+
+    def value(self, field, index):
+        """A single cell as a plain Python value."""
+        if field in self.dictionaries:
+            return self.dictionaries[field][self.columns[f'{field}_code'][index]]
+        if field in self.columns:
+            return self.columns[field][index].item()
+        raise KeyError(field)
+
+    def has_field(self, field):
+        return field in self.dictionaries or field in self.columns
+
+    def to_dict(self):
+        return {
+            'columns': {field: values.tolist() for field, values in self.columns.items()},
+            'dictionaries': self.dictionaries
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        columns = {}
+        for field, values in data['columns'].items():
+            if field == 'is_renewal':
+                columns[field] = np.asarray(values, dtype=bool)
+            elif field.endswith('_code'):
+                columns[field] = np.asarray(values, dtype=np.int32)
+            else:
+                columns[field] = np.asarray(values, dtype=float)
+        return cls(columns, data['dictionaries'])
+
+
+class TransactionSlice:
+    """A person's transactions in one month: a contiguous [start, stop) range of a store."""
+    __slots__ = ('store', 'start', 'stop')
+
+    def __init__(self, store, start, stop):
+        self.store = store
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __iter__(self):
+        for index in range(self.start, self.stop):
+            yield TransactionRecord(self.store, index)
+
+    def __getitem__(self, position):
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return TransactionRecord(self.store, self.start + position)
+
+    def column(self, field):
+        return self.store.columns[field][self.start:self.stop]
+
+    def sum(self, field):
+        if not self.store.has_field(field):
+            return 0
+        return float(self.column(field).sum())
+
+    def role_summary(self):
+        """Per-role totals (commission base, payable commission, count) in first-seen role order."""
+        role_codes = self.column('role_code')
+        has_payable = 'payable_commission' in self.store.columns
+        summary = {}
+        for code in pd.unique(role_codes):
+            mask = role_codes == code
+            summary[self.store.dictionaries['role'][code]] = {
+                'total_sales': float(self.column('commission_base')[mask].sum()),
+                'total_commission': float(self.column('payable_commission')[mask].sum()) if has_payable else 0,
+                'transaction_count': int(mask.sum())
+            }
+        return summary
+
+    def to_dict(self):
+        return {'start': self.start, 'stop': self.stop}
+
+
+class TransactionRecord:
+    """Read-only view of one transaction; supports both txn.field and txn['field']."""
+    __slots__ = ('_store', '_index')
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
+
+    def __getitem__(self, field):
+        return self._store.value(field, self._index)
+
+    def __getattr__(self, field):
+        try:
+            return self._store.value(field, self._index)
+        except KeyError:
+            raise AttributeError(field) from None
+
+    def __contains__(self, field):
+        return self._store.has_field(field)
+
+    def get(self, field, default=None):
+        return self[field] if field in self else default
+
+    def to_dict(self):
+        return {field: self[field] for field in RECORD_FIELDS if field in self}
+
+
+# --- Helpers that work on both the columnar and the legacy (list of dicts) layout ---
+
+def transaction_sum(transactions, field):
+    """Sum of one numeric field over a person's transactions."""
+    if isinstance(transactions, TransactionSlice):
+        return transactions.sum(field)
+    return sum(txn.get(field, 0) for txn in transactions)
+
+def transaction_role_summary(transactions):
+    """Per-role totals of a person's transactions."""
+    if isinstance(transactions, TransactionSlice):
+        return transactions.role_summary()
+    summary = {}
+    for txn in transactions:
+        role_summary = summary.setdefault(txn.get('role'), {
+            'total_sales': 0, 'total_commission': 0, 'transaction_count': 0
+        })
+        role_summary['total_sales'] += txn.get('commission_base', 0)
+        role_summary['total_commission'] += txn.get('payable_commission', 0)
+        role_summary['transaction_count'] += 1
+    return summary
+
+
+# --- Persistence ---
+
+def _encode(obj):
+    if isinstance(obj, (TransactionStore, TransactionSlice, TransactionRecord)):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dump_results(results):
+    """Serializes engine results (columnar stores included) to a JSON string."""
+    return json.dumps(results, ensure_ascii=False, default=_encode)
+
+def load_results(text):
+    """
+    Parses a detailed_results_json string, re-attaching each person's
+    transaction slice to its month's store. Runs saved in the older
+    list-of-dicts layout are returned as they are.
+    """
+    results = json.loads(text)
+    for month_data in results.values():
+        store_data = month_data.get('transaction_store')
+        if store_data is None:
+            continue
+        store = TransactionStore.from_dict(store_data)
+        month_data['transaction_store'] = store
+        for person_data in month_data.get('persons', {}).values():
+            txn_range = person_data['transactions']
+            person_data['transactions'] = TransactionSlice(store, txn_range['start'], txn_range['stop'])
+    return results
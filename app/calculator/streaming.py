@@ -0,0 +1,261 @@
+# ==============================================================================
+# app/calculator/streaming.py
+# ------------------------------------------------------------------------------
+# Streaming mode for very large workbooks.
+# 'Sales data' is read in chunks of rows by the schema-driven loader.
+# Each chunk is validated, cleaned and melted exactly like the in-memory
+# Pass 1, its bracket bases are folded into per-(month, person) accumulators,
+# and its transaction detail is spilled to one temporary file per month.
+# Months are then assembled from their spill files one at a time, so the
+# sales sheet is never held in memory as a whole: memory while reading and
+# validating is bounded by the chunk size, not by the row count. The
+# assembled results still hold every month's transactions (as compact
+# column arrays, see store.py) until the run is saved, so peak memory does
+# grow with the row count, only far more slowly than with the sheet loaded
+# as a DataFrame.
+# The results (and their fingerprints) are identical to run_engine's.
+# ==============================================================================
+
+import logging
+import os
+import pickle
+import tempfile
+import numpy as np
+import pandas as pd
+
+from .schema import EXPECTED_SHEETS
+from .loader import open_workbook, read_header, iter_sheet_chunks
+from .validator import validate_excel_file, missing_column_errors
+from .quality import QualityReport, SalesChecker, add_invalid_cells, check_dataframes
+from .store import TransactionStore, TransactionSlice
+from .engine import (
+    CalculationResults, ENGINE_MODES, ENGINE_MODE_FAST, ENGINE_MODE_FORENSIC, NEGOTIATOR_ROLE,
+    _build_sales_frame, _log_pass1_audit, _warn_skipped_rows, _melt_roles, _active_month_keys,
+    _resolve_target_timeline, _global_fingerprint, _row_hashes, _month_fingerprint, _reusable_months,
+    _calculate_months, _log_configuration
+)
+
+SALES_SHEET = 'Sales data'
+DEFAULT_CHUNK_ROWS = 5000
+
+# Cleaned sales-row fields copied into each spilled transaction.
+SPILLED_ROW_FIELDS = ('net_value', 'commission_base', 'paid_amount', 'is_renewal', 'company', 'invoice_link')
+
+
+class _Pass1Accumulator:
+    """
+    Pass 1 state folded chunk by chunk: the first-seen order of the months and
+    person-months and their bracket bases. Each month spills its transaction
+    detail (pickled DataFrames, one per chunk) and the row hashes of its
+    fingerprint (raw uint64) to two files.
+    """
+
+    def __init__(self, spill_dir):
+        self.spill_dir = spill_dir
+        self.month_keys = []          # Active months, in first-seen order
+        self.spill_paths = {}         # month_key -> spill file prefix
+        self.group_codes = {}         # (month_key, person) -> person-month code, in first-seen order
+        self.bracket_bases = np.zeros(0)
+        self.has_bracket_base = np.zeros(0, dtype=bool)
+        self.row_count = 0
+        self.skipped_rows = 0
+
+    def add_chunk(self, sales_frame, forensic=False):
+        """Folds one cleaned chunk (see _build_sales_frame) into the accumulators."""
+        self.row_count += len(sales_frame)
+        self.skipped_rows += int(sales_frame['month_key'].isna().sum())
+        for month_key in _active_month_keys(sales_frame):
+            if month_key not in self.month_keys:
+                self.month_keys.append(month_key)
+
+        frame = sales_frame[sales_frame['month_key'].notna()]
+        if frame.empty:
+            return
+        row_hashes = _row_hashes(frame)
+        long_df = _melt_roles(frame, forensic)
+        row_pos = long_df['row_pos'].to_numpy()
+
+        # Person-month codes continue across chunks, so they keep the global first-seen order.
+        keys = list(zip(long_df['month_key'], long_df['person']))
+        for key in dict.fromkeys(keys):
+            self.group_codes.setdefault(key, len(self.group_codes))
+        codes = np.fromiter((self.group_codes[key] for key in keys), dtype=np.int64, count=len(keys))
+        if len(self.group_codes) > len(self.bracket_bases):
+            grow = len(self.group_codes) - len(self.bracket_bases)
+            self.bracket_bases = np.r_[self.bracket_bases, np.zeros(grow)]
+            self.has_bracket_base = np.r_[self.has_bracket_base, np.zeros(grow, dtype=bool)]
+
+        # Same running total as _assemble_pass1_results: np.add.at in (row, role) order.
+        qualifying = (long_df['role'].to_numpy() == NEGOTIATOR_ROLE) & frame['qualifies_for_bracket'].to_numpy()[row_pos]
+        np.add.at(self.bracket_bases, codes[qualifying], frame['commission_base'].to_numpy()[row_pos][qualifying])
+        self.has_bracket_base[codes[qualifying]] = True
+
+        transactions = pd.DataFrame({
+            'code': codes,
+            'month_key': long_df['month_key'].to_numpy(),
+            'role': long_df['role'].to_numpy(),
+            'person': long_df['person'].to_numpy(),
+            **{field: frame[field].to_numpy()[row_pos] for field in SPILLED_ROW_FIELDS}
+        })
+        for month_key, month_rows in frame.groupby('month_key', sort=False).indices.items():
+            month_transactions = transactions[transactions['month_key'].to_numpy() == month_key]
+            self._spill(month_key, month_transactions.drop(columns='month_key'), row_hashes[month_rows])
+
+    def _spill(self, month_key, transactions, row_hashes):
+        prefix = self.spill_paths.get(month_key)
+        if prefix is None:
+            prefix = self.spill_paths[month_key] = os.path.join(self.spill_dir, f'month-{len(self.spill_paths)}')
+        with open(prefix + '.hashes', 'ab') as hash_file:
+            hash_file.write(np.ascontiguousarray(row_hashes, dtype=np.uint64).tobytes())
+        if len(transactions):
+            with open(prefix + '.pkl', 'ab') as spill_file:
+                pickle.dump(transactions, spill_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def read_row_hashes(self, month_key):
+        """The row hashes of the month's sales rows, in sheet order."""
+        return np.fromfile(self.spill_paths[month_key] + '.hashes', dtype=np.uint64)
+
+    def read_transactions(self, month_key):
+        """The month's spilled transactions as one DataFrame, in sheet order."""
+        parts = []
+        with open(self.spill_paths[month_key] + '.pkl', 'rb') as spill_file:
+            while True:
+                try:
+                    parts.append(pickle.load(spill_file))
+                except EOFError:
+                    break
+        return pd.concat(parts, ignore_index=True)
+
+    def assemble_month(self, transactions, employee_models, config):
+        """Builds one month of the Pass 1 results (see _assemble_pass1_results) from its transactions."""
+        codes = transactions['code'].to_numpy()
+        # Stable, so each person keeps the (row, role) order of their transactions.
+        order = np.argsort(codes, kind='stable')
+        sorted_codes = codes[order]
+        store = TransactionStore.from_arrays(
+            transactions['is_renewal'].to_numpy()[order],
+            {field: transactions[field].to_numpy()[order] for field in ('net_value', 'commission_base', 'paid_amount')},
+            {field: transactions[field].to_numpy()[order] for field in ('role', 'company', 'person', 'invoice_link')}
+        )
+        persons = {}
+        firsts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+        for start, stop in zip(firsts.tolist(), np.r_[firsts[1:], len(order)].tolist()):
+            code = int(sorted_codes[start])
+            person_name = transactions['person'].iat[int(order[start])]
+            persons[person_name] = {
+                'model': employee_models.get(person_name, config.DEFAULT_COMMISSION_MODEL),
+                'bracket_base': float(self.bracket_bases[code]) if self.has_bracket_base[code] else 0,
+                'transactions': TransactionSlice(store, start, stop)
+            }
+        return {'persons': persons, 'transaction_store': store}
+
+
+def run_engine_streaming(source, config, chunk_rows=DEFAULT_CHUNK_ROWS, mode=ENGINE_MODE_FAST,
+                         previous_run=None, workers=1, spill_dir=None, report=None, cache_entry=None):
+    """
+    Validates and calculates a workbook without loading 'Sales data' as a
+    whole (see the module header). The other sheets are small and are read
+    normally.
+
+    Args:
+        source (str or file): The .xlsx workbook, as a path or a seekable binary stream.
+        config (EngineConfig): The settings and compiled brackets to calculate with.
+        chunk_rows (int): Sales rows read, validated and folded at a time.
+        mode, previous_run, workers: As for run_engine.
+        spill_dir (str, optional): Parent directory of the temporary spill files.
+        report (QualityReport, optional): Collects the data-quality problems of
+            the workbook, as validate_excel_file and quality.check_dataframes do.
+        cache_entry (CacheEntryWriter, optional): Receives the validated sheets
+            as they are read, so a repeat upload is not parsed again.
+
+    Returns:
+        tuple: (CalculationResults or None, dict of the other sheets' DataFrames
+        or None, list of validation error messages)
+    """
+    if mode not in ENGINE_MODES:
+        raise ValueError(f"Unknown engine mode '{mode}'. Expected one of: {', '.join(ENGINE_MODES)}")
+    forensic = mode == ENGINE_MODE_FORENSIC
+
+    report = QualityReport() if report is None else report
+    small_sheets = [name for name in EXPECTED_SHEETS if name != SALES_SHEET]
+    dataframes, errors = validate_excel_file(source, sheets=small_sheets, report=report)
+    if errors:
+        if cache_entry is not None:
+            cache_entry.discard()
+        return None, None, errors
+    check_dataframes(dataframes, report)
+    if cache_entry is not None:
+        for sheet_name, df in dataframes.items():
+            cache_entry.add_sheet(sheet_name, df)
+
+    logging.info("="*80)
+    logging.info(f"STARTING COMMISSION CALCULATION PROCESS ({mode.upper()} MODE, STREAMING {chunk_rows} ROWS AT A TIME)")
+    logging.info("="*80)
+
+    additional_comm_df = dataframes.get('Additional commissions')
+    employee_models_df = dataframes['Employee Models']
+    if forensic:
+        _log_configuration(config, additional_comm_df, employee_models_df)
+    employee_models = dict(zip(employee_models_df['نام'], employee_models_df['مدل همکاری']))
+
+    with tempfile.TemporaryDirectory(prefix='commission-spill-', dir=spill_dir) as spill_path:
+        accumulator = _Pass1Accumulator(spill_path)
+        sales_checker = SalesChecker(employee_models_df)
+        logging.info("--- Starting Pass 1: Streaming transactions and folding bracket bases. ---")
+        workbook = open_workbook(source)
+        try:
+            worksheet = workbook[SALES_SHEET]
+            errors.extend(missing_column_errors(SALES_SHEET, read_header(worksheet)))
+            chunks = iter_sheet_chunks(worksheet, SALES_SHEET, chunk_rows) if not errors else ()
+            for chunk, invalid_cells in chunks:
+                add_invalid_cells(report, SALES_SHEET, invalid_cells)
+                if errors or report.has_errors:
+                    continue  # Keep collecting validation errors, but stop calculating
+                if cache_entry is not None:
+                    cache_entry.add_chunk(SALES_SHEET, chunk)
+                sales_checker.check(chunk, report)
+                sales_frame = _build_sales_frame(chunk, config)
+                if forensic:
+                    _log_pass1_audit(chunk, sales_frame, config)
+                    _warn_skipped_rows(sales_frame, forensic)
+                accumulator.add_chunk(sales_frame, forensic)
+        except Exception as e:
+            errors.append(f"خطایی در هنگام خواندن شیت '{SALES_SHEET}' رخ داد. خطای فنی: {e}")
+        finally:
+            workbook.close()
+        errors.extend(report.messages())
+        if cache_entry is not None and errors:
+            cache_entry.discard()
+        elif cache_entry is not None:
+            cache_entry.commit()
+        if errors:
+            return None, None, errors
+        if not forensic and accumulator.skipped_rows:
+            logging.warning(f"SKIPPING {accumulator.skipped_rows} rows with invalid or missing 'ماه'/'سال'.")
+
+        month_keys = accumulator.month_keys
+        target_timeline = _resolve_target_timeline(additional_comm_df, month_keys)
+        global_fingerprint = _global_fingerprint(employee_models, config)
+        fingerprints = {'global': global_fingerprint, 'months': {
+            month_key: _month_fingerprint(global_fingerprint, target_timeline[month_key], accumulator.read_row_hashes(month_key))
+            for month_key in month_keys
+        }}
+
+        reused = {}
+        if previous_run is not None and not forensic:
+            reused = _reusable_months(fingerprints, previous_run)
+            logging.info(f"Incremental run: reusing {len(reused)} of {len(month_keys)} months from the previous run.")
+
+        results = {}
+        for month_key in month_keys:
+            if month_key not in reused:
+                results[month_key] = accumulator.assemble_month(
+                    accumulator.read_transactions(month_key), employee_models, config
+                )
+        logging.info(f"--- Pass 1 Finished. ---")
+
+    _calculate_months(results, target_timeline, config, forensic, workers)
+    return CalculationResults(
+        ((m, results[m] if m in results else reused[m]) for m in month_keys),
+        mode=mode, fingerprints=fingerprints, reused_months=reused, row_count=accumulator.row_count
+    ), dataframes, []
@@ -2,73 +2,153 @@
 # app/calculator/validator.py
 # ------------------------------------------------------------------------------
 # Handles the validation of the uploaded Excel file's structure and data types.
+#
+# With several workers the sheets are read concurrently in a process pool,
+# and a large 'Sales data' sheet is split into row ranges read in parallel
+# (see loader.py), so validation takes about as long as the largest sheet.
+# Results are merged in schema order, sheet part by sheet part, so the error
+# messages come out in the same order as in a serial read.
+# Non-numeric cells are collected in a QualityReport (see quality.py) and
+# reported as one capped message per sheet and column.
 # ==============================================================================
 
-import pandas as pd
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
 from .schema import EXPECTED_SHEETS
+from .loader import open_workbook, read_header, read_sheet_part, merge_sheet_parts, split_count
+from .workers import resolve_worker_count
+from .quality import QualityReport, add_invalid_cells
+from .bundle import Bundle, is_bundle
+
+SPLIT_SHEET = 'Sales data'
 
-def validate_excel_file(filepath):
+def validate_excel_file(source, sheets=None, workers=1, report=None):
     """
     Validates the structure and basic data types of the uploaded Excel file.
+    Sheets are read with the schema-driven loader (see loader.py), so numeric
+    columns are already parsed to floats.
 
     Args:
-        filepath (str): The path to the uploaded .xlsx file.
+        source (str or file): The uploaded .xlsx file or .zip bundle of per-sheet
+            CSV/Parquet files (see bundle.py), as a path or a seekable binary
+            stream (e.g. the request's upload stream).
+        sheets (iterable, optional): Only load these sheets (default: every sheet
+            of the schema). The presence of every sheet is always checked.
+        workers (int): Worker processes reading sheets concurrently. 1 reads
+            them in this process; 0 uses every CPU core. Worker processes
+            open the workbook themselves, so they need a path.
+        report (QualityReport, optional): Collects every non-numeric cell, for
+            the downloadable quality report.
 
     Returns:
         tuple: A tuple containing:
             - dict: A dictionary of pandas DataFrames if validation is successful.
             - list: A list of human-readable error messages if validation fails.
     """
+    report = QualityReport() if report is None else report
     errors = []
     dataframes = {}
 
     try:
-        xls = pd.ExcelFile(filepath)
-        sheet_names = xls.sheet_names
+        workbook = Bundle(source) if is_bundle(source) else open_workbook(source)
     except Exception as e:
         errors.append(f"فایل اکسل نامعتبر است یا قابل خواندن نیست. خطای فنی: {e}")
         return None, errors
 
-    # 1. Check for presence of all required sheets
-    for sheet_name in EXPECTED_SHEETS:
-        if sheet_name not in sheet_names:
-            errors.append(f"شیت ضروری '{sheet_name}' در فایل اکسل یافت نشد.")
+    try:
+        # 1. Check for presence of all required sheets
+        for sheet_name in EXPECTED_SHEETS:
+            if sheet_name not in workbook.sheetnames:
+                errors.append(f"شیت ضروری '{sheet_name}' در فایل اکسل یافت نشد.")
 
-    if errors:
-        return None, errors  # Stop validation if sheets are missing
-
-    # 2. Check each sheet for required columns and data types
-    for sheet_name, rules in EXPECTED_SHEETS.items():
-        try:
-            df = pd.read_excel(xls, sheet_name=sheet_name)
-
-            # 2a. Check for required columns
-            missing_columns = [col for col in rules['required_columns'] if col not in df.columns]
-            if missing_columns:
-                errors.append(f"در شیت '{sheet_name}'، ستون‌های ضروری زیر یافت نشدند: {', '.join(missing_columns)}")
-                continue  # Move to the next sheet
-
-            # 2b. Check numeric columns for non-numeric values
-            for col in rules['numeric_columns']:
-                # Coerce to numeric, making non-numbers NaN
-                numeric_series = pd.to_numeric(df[col].astype(str).str.replace(',', ''), errors='coerce')
-                # Find rows where the original value was not empty but the numeric version is NaN
-                invalid_rows = df[numeric_series.isna() & df[col].notna()]
-
-                if not invalid_rows.empty:
-                    for index in invalid_rows.index:
-                        value = invalid_rows.loc[index, col]
-                        errors.append(
-                            f"خطا در شیت '{sheet_name}'، ردیف اکسل {index + 2}: "
-                            f"مقدار '{value}' در ستون '{col}' باید یک عدد باشد."
-                        )
-
-            dataframes[sheet_name] = df
-
-        except Exception as e:
-            errors.append(f"خطایی در هنگام خواندن شیت '{sheet_name}' رخ داد. خطای فنی: {e}")
+        if errors:
+            return None, errors  # Stop validation if sheets are missing
+
+        # 2. Check each sheet for required columns and data types
+        sheet_names = [name for name in EXPECTED_SHEETS if sheets is None or name in sheets]
+        worker_count = resolve_worker_count(workers)
+        if worker_count > 1 and isinstance(workbook, Bundle):
+            worker_count = 1  # CSV and Parquet sheets are read fast enough in one process
+        if worker_count > 1 and hasattr(source, 'read'):
+            logging.info("Reading the sheets of an in-memory workbook in this process.")
+            worker_count = 1
+        if worker_count > 1:
+            tasks = []
+            for sheet_name in sheet_names:
+                try:
+                    parts = split_count(workbook[sheet_name], worker_count) if sheet_name == SPLIT_SHEET else 1
+                except Exception:
+                    parts = 1  # The worker reports the problem
+                tasks.extend((source, sheet_name, part, parts) for part in range(parts))
+        else:
+            results = [_read_sheet_part(workbook, sheet_name, 0, 1) for sheet_name in sheet_names]
+    finally:
+        workbook.close()
+
+    if worker_count > 1:
+        worker_count = min(worker_count, len(tasks))
+        logging.info(f"Reading {len(tasks)} sheet parts in {worker_count} worker processes.")
+        with ProcessPoolExecutor(max_workers=worker_count) as executor:
+            # map() returns results in task order, so the merge below is deterministic.
+            results = list(executor.map(_read_sheet_part_worker, tasks))
+
+    # 3. Merge the parts of each sheet; its invalid cells are ordered by
+    # column (part by part, i.e. by row, within a column), like a serial read.
+    for sheet_name in sheet_names:
+        sheet_results = [result for result in results if result[0] == sheet_name]
+        errors.extend(dict.fromkeys(message for result in sheet_results for message in result[2]))
+        add_invalid_cells(report, sheet_name, [cells for result in sheet_results for cells in result[3]])
+        frames = [result[1] for result in sheet_results]
+        if all(frame is not None for frame in frames):
+            dataframes[sheet_name] = merge_sheet_parts(frames)
+    errors.extend(report.messages())
 
     if errors:
         return None, errors
 
-    return dataframes, []
\ No newline at end of file
+    return dataframes, []
+
+def missing_column_errors(sheet_name, columns):
+    """An error message listing the schema columns missing from a sheet (or no messages)."""
+    missing_columns = [col for col in EXPECTED_SHEETS[sheet_name]['required_columns'] if col not in columns]
+    if missing_columns:
+        return [f"در شیت '{sheet_name}'، ستون‌های ضروری زیر یافت نشدند: {', '.join(missing_columns)}"]
+    return []
+
+def _read_sheet_part(workbook, sheet_name, part, parts):
+    """
+    Checks and reads one part of a sheet.
+
+    Returns:
+        tuple: (sheet name, DataFrame or None, list of error messages, invalid
+        cells as returned by loader.read_sheet_part)
+    """
+    try:
+        bundle = isinstance(workbook, Bundle)
+        worksheet = None if bundle else workbook[sheet_name]
+
+        # 2a. Check for required columns (reported once, by the first part)
+        header = workbook.read_header(sheet_name) if bundle else read_header(worksheet)
+        column_errors = missing_column_errors(sheet_name, header)
+        if column_errors:
+            return sheet_name, None, column_errors if part == 0 else [], []
+
+        # 2b. Numeric columns are parsed while reading; non-numeric cells are reported
+        if bundle:
+            df, invalid_cells = workbook.read_sheet(sheet_name)
+        else:
+            df, invalid_cells = read_sheet_part(worksheet, sheet_name, part, parts)
+        return sheet_name, df, [], invalid_cells
+
+    except Exception as e:
+        return sheet_name, None, [f"خطایی در هنگام خواندن شیت '{sheet_name}' رخ داد. خطای فنی: {e}"], []
+
+def _read_sheet_part_worker(task):
+    """ProcessPoolExecutor entry point: reads one (filepath, sheet name, part, parts) task in its own workbook."""
+    filepath, sheet_name, part, parts = task
+    workbook = open_workbook(filepath)
+    try:
+        return _read_sheet_part(workbook, sheet_name, part, parts)
+    finally:
+        workbook.close()
@@ -0,0 +1,335 @@
+# ==============================================================================
+# app/calculator/workbook_cache.py
+# ------------------------------------------------------------------------------
+# On-disk cache of validated workbooks, keyed by the SHA-256 of the uploaded
+# file and the schema version, so re-uploading a workbook (e.g. after a rule
+# tweak) skips the Excel parse entirely.
+# Each entry is a directory of uncompressed Arrow IPC files, one per column,
+# read through pyarrow.memory_map: numeric and boolean columns come back as
+# NumPy views of the mapped file (one block per column, so pandas does not
+# copy them into consolidated blocks). Text columns, which may mix in numbers
+# as a sheet's cells do, are dictionary-encoded as int32 codes plus a pickle
+# of their distinct values, and are decoded into object arrays on read.
+# Entries are written atomically and evicted least-recently-used first once
+# the cache exceeds its size bound.
+# A workbook calculated in streaming mode is stored chunk by chunk as it is
+# read (see CacheEntryWriter), so large uploads are cached too.
+# With a shared application cache (app/cache.py), entries are also published
+# there as a bundle of their files, so a workbook parsed by one worker or node
+# is copied into the local directory of the others instead of parsed again.
+# ==============================================================================
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .schema import EXPECTED_SHEETS
+from .validator import validate_excel_file
+from .workspace import hash_stream
+
+# Bump whenever the entry layout or the loader's output changes.
+CACHE_FORMAT_VERSION = 2
+SCHEMA_VERSION = hashlib.sha1(
+    json.dumps([CACHE_FORMAT_VERSION, EXPECTED_SHEETS], ensure_ascii=False, sort_keys=True).encode('utf-8')
+).hexdigest()[:12]
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    """The SHA-256 hex digest of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class WorkbookCache:
+    """A size-bounded LRU directory of validated workbooks (see the module header)."""
+
+    def __init__(self, directory, max_bytes, shared=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.shared = shared
+
+    def _entry_path(self, content_hash):
+        return os.path.join(self.directory, f"{content_hash}-{SCHEMA_VERSION}")
+
+    def __contains__(self, content_hash):
+        return os.path.isdir(self._entry_path(content_hash)) or self._fetch_shared(content_hash)
+
+    def get(self, content_hash):
+        """The cached DataFrames of a workbook, or None on a miss."""
+        path = self._entry_path(content_hash)
+        if not os.path.isdir(path) and not self._fetch_shared(content_hash):
+            return None
+        try:
+            with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+                manifest = json.load(f)
+            dataframes = {sheet['name']: _read_sheet(path, sheet) for sheet in manifest['sheets']}
+            os.utime(path)  # Mark as recently used
+        except Exception as e:
+            # Another process may be evicting the entry; treat it as a miss.
+            logging.warning(f"Could not read workbook cache entry {path}: {e}")
+            return None
+        logging.info(f"Workbook cache hit for {content_hash[:12]}.")
+        return dataframes
+
+    def put(self, content_hash, dataframes):
+        """Stores a workbook's validated DataFrames, then evicts old entries if needed."""
+        if os.path.isdir(self._entry_path(content_hash)):
+            return
+        entry = self.writer(content_hash)
+        for name, df in dataframes.items():
+            entry.add_sheet(name, df)
+        entry.commit()
+
+    def writer(self, content_hash):
+        """A CacheEntryWriter storing a workbook as it is read (see run_engine_streaming)."""
+        return CacheEntryWriter(self, content_hash)
+
+    def _fetch_shared(self, content_hash):
+        """Copies an entry published in the shared cache into the local directory. True if found."""
+        if self.shared is None:
+            return False
+        files = self.shared.get('workbook', content_hash, version=SCHEMA_VERSION)
+        if files is None:
+            return False
+        os.makedirs(self.directory, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=self.directory)
+        try:
+            for name, data in files.items():
+                with open(os.path.join(staging, name), 'wb') as f:
+                    f.write(data)
+            os.rename(staging, self._entry_path(content_hash))
+        except OSError:
+            # Most likely another process copied it first.
+            shutil.rmtree(staging, ignore_errors=True)
+            return os.path.isdir(self._entry_path(content_hash))
+        logging.info(f"Copied workbook {content_hash[:12]} from the shared cache.")
+        self.evict()
+        return True
+
+    def evict(self):
+        """Removes least-recently-used entries until the cache fits in max_bytes."""
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith('.') or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(path))
+                entries.append((os.stat(path).st_mtime, size, path))
+            except FileNotFoundError:
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            logging.info(f"Evicted workbook cache entry {os.path.basename(path)}.")
+
+
+class CacheEntryWriter:
+    """
+    Writes one cache entry while its workbook is read: whole sheets with
+    add_sheet, a streamed sheet chunk by chunk with add_chunk. Each chunk's
+    columns are spilled to the staging directory; commit() then types and
+    stores the streamed sheet one column at a time, as merge_sheet_parts
+    joins the parts of a parallel read, so the sheet is never held in memory.
+    Failures are logged and only cost the entry, never the run reading it.
+    """
+
+    def __init__(self, cache, content_hash):
+        self.cache = cache
+        self.content_hash = content_hash
+        self.sheets = {}    # sheet name -> manifest entry
+        self.streamed = {}  # sheet name -> columns, spilled chunks and position of a streamed sheet
+        self.failed = False
+        os.makedirs(cache.directory, exist_ok=True)
+        self.staging = tempfile.mkdtemp(prefix='.staging-', dir=cache.directory)
+
+    def add_sheet(self, name, df):
+        """Stores a whole sheet."""
+        self._guarded(lambda: self.sheets.__setitem__(name, _write_sheet(self.staging, self._position(), name, df)))
+
+    def add_chunk(self, name, df):
+        """Appends the next chunk of rows of a streamed sheet."""
+        def spill():
+            if name not in self.streamed:
+                self.streamed[name] = {'columns': list(df.columns), 'position': self._position(), 'chunks': 0,
+                                       'index_start': int(df.index[0]) if len(df) else 0, 'rows': 0}
+            state = self.streamed[name]
+            for index, column in enumerate(state['columns']):
+                with open(os.path.join(self.staging, f"{state['position']}-{index}.spill"), 'ab') as f:
+                    pickle.dump(df[column].to_numpy(), f, protocol=pickle.HIGHEST_PROTOCOL)
+            state['chunks'] += 1
+            state['rows'] += len(df)
+        self._guarded(spill)
+
+    def commit(self):
+        """Completes the entry, publishes it to the shared cache, and evicts old entries if needed."""
+        self._guarded(self._commit)
+
+    def discard(self):
+        shutil.rmtree(self.staging, ignore_errors=True)
+        self.failed = True
+
+    def _position(self):
+        return len(self.sheets) + len(self.streamed)
+
+    def _guarded(self, step):
+        if self.failed:
+            return
+        try:
+            step()
+        except Exception as e:
+            logging.warning(f"Could not store workbook {self.content_hash[:12]} in the workbook cache: {e}")
+            self.discard()
+
+    def _commit(self):
+        for name, state in self.streamed.items():
+            columns = []
+            for index, column in enumerate(state['columns']):
+                spill_path = os.path.join(self.staging, f"{state['position']}-{index}.spill")
+                values = _merged_column(_read_spilled(spill_path, state['chunks']))
+                os.unlink(spill_path)
+                columns.append(_write_column(self.staging, f"{state['position']}-{index}", column, values))
+            self.sheets[name] = {'name': name, 'columns': columns, 'index_start': state['index_start'], 'rows': state['rows']}
+        # Schema sheets in schema order, as validate_excel_file returns them.
+        order = [name for name in EXPECTED_SHEETS if name in self.sheets]
+        order += [name for name in self.sheets if name not in EXPECTED_SHEETS]
+        with open(os.path.join(self.staging, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump({'sheets': [self.sheets[name] for name in order]}, f, ensure_ascii=False)
+
+        path = self.cache._entry_path(self.content_hash)
+        if self.cache.shared is not None:
+            self.cache.shared.set('workbook', self.content_hash, _pack_entry(self.staging), version=SCHEMA_VERSION)
+        try:
+            os.rename(self.staging, path)
+        except OSError:
+            # Most likely another process stored the same workbook first.
+            shutil.rmtree(self.staging, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+        self.failed = True  # Committed: nothing more to write
+        self.cache.evict()
+
+
+def cache_from_config(config, shared=None):
+    """
+    The workbook cache configured in a Flask config, or None if it is disabled.
+    `shared` is the application cache to publish entries to, if it is shared.
+    """
+    if config['WORKBOOK_CACHE_MAX_BYTES'] <= 0:
+        return None
+    return WorkbookCache(config['WORKBOOK_CACHE_DIR'], config['WORKBOOK_CACHE_MAX_BYTES'], shared)
+
+def validate_cached(source, cache, content_hash=None, workers=1, report=None):
+    """
+    validate_excel_file with the workbook cache in front of it: a workbook seen
+    before is not parsed again, and a newly validated one is stored.
+
+    Args:
+        source (str or file): The .xlsx workbook, as a path or a seekable binary stream.
+        cache (WorkbookCache or None): The cache (None validates directly).
+        content_hash (str, optional): The file's SHA-256, if already known.
+        workers (int): Worker processes for validate_excel_file on a miss.
+        report (QualityReport, optional): As for validate_excel_file.
+
+    Returns:
+        tuple: (dict of DataFrames or None, list of error messages)
+    """
+    if cache is None:
+        return validate_excel_file(source, workers=workers, report=report)
+    if content_hash is None:
+        content_hash = hash_stream(source) if hasattr(source, 'read') else hash_file(source)
+    dataframes = cache.get(content_hash)
+    if dataframes is not None:
+        return dataframes, []
+    dataframes, errors = validate_excel_file(source, workers=workers, report=report)
+    if not errors:
+        try:
+            cache.put(content_hash, dataframes)
+        except Exception as e:
+            logging.warning(f"Could not store workbook {content_hash[:12]} in the workbook cache: {e}")
+    return dataframes, errors
+
+
+def _pack_entry(directory):
+    """An entry's files as {name: bytes}, for the shared cache."""
+    files = {}
+    for name in os.listdir(directory):
+        with open(os.path.join(directory, name), 'rb') as f:
+            files[name] = f.read()
+    return files
+
+def _write_sheet(directory, position, name, df):
+    columns = [_write_column(directory, f"{position}-{index}", column, df[column]) for index, column in enumerate(df.columns)]
+    return {'name': name, 'columns': columns, 'index_start': int(df.index[0]) if len(df) else 0, 'rows': len(df)}
+
+def _write_column(directory, stem, name, values):
+    if pd.api.types.is_bool_dtype(values):
+        # Arrow packs booleans into bits; bytes map back to a NumPy bool view.
+        _write_array(directory, stem, values.to_numpy().view(np.uint8))
+        return {'name': name, 'kind': 'bool', 'file': stem}
+    if pd.api.types.is_numeric_dtype(values):
+        _write_array(directory, stem, values.to_numpy())
+        return {'name': name, 'kind': 'array', 'file': stem}
+    codes, uniques = pd.factorize(values.to_numpy(dtype=object))
+    _write_array(directory, stem, codes.astype(np.int32))
+    with open(os.path.join(directory, stem + '.pkl'), 'wb') as f:
+        pickle.dump(list(uniques), f, protocol=pickle.HIGHEST_PROTOCOL)
+    return {'name': name, 'kind': 'coded', 'file': stem}
+
+def _write_array(directory, stem, array):
+    """One NumPy array as a single-column Arrow IPC file (NaN kept as a value, not as a null)."""
+    table = pa.table({'values': pa.array(np.ascontiguousarray(array))})
+    with pa.OSFile(os.path.join(directory, stem + '.arrow'), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+def _read_array(directory, stem):
+    """A column written by _write_array, as a read-only NumPy view of the memory-mapped file."""
+    source = pa.memory_map(os.path.join(directory, stem + '.arrow'), 'r')
+    column = pa.ipc.open_file(source).read_all().column(0)
+    if column.num_chunks == 1:
+        return column.chunk(0).to_numpy(zero_copy_only=True)
+    return column.to_numpy()  # Empty sheets have no chunk to map
+
+def _read_spilled(path, count):
+    with open(path, 'rb') as f:
+        return [pickle.load(f) for _ in range(count)]
+
+def _merged_column(pieces):
+    """One column of a sheet read in chunks, joined and typed as loader.merge_sheet_parts does it."""
+    pieces = [piece for piece in pieces if len(piece)] or pieces[:1]
+    values = pd.concat([pd.Series(piece) for piece in pieces], ignore_index=True)
+    if len(pieces) > 1 and values.dtype == object:
+        values = pd.to_numeric(values, errors='ignore').infer_objects().fillna(np.nan)
+    return values
+
+def _read_sheet(directory, sheet):
+    data = {}
+    for column in sheet['columns']:
+        values = _read_array(directory, column['file'])
+        if column['kind'] == 'bool':
+            values = values.view(np.bool_)
+        elif column['kind'] == 'coded':
+            with open(os.path.join(directory, column['file'] + '.pkl'), 'rb') as f:
+                uniques = np.array(pickle.load(f) + [np.nan], dtype=object)
+            values = uniques[values]  # Code -1 (a missing value) picks the trailing NaN
+        data[column['name']] = values
+    # copy=False keeps one block per column, so the mapped columns are not copied.
+    df = pd.DataFrame(data, columns=[column['name'] for column in sheet['columns']], copy=False)
+    df.index = pd.RangeIndex(sheet['index_start'], sheet['index_start'] + sheet['rows'])
+    return df
@@ -0,0 +1,16 @@
+# ==============================================================================
+# app/calculator/workers.py
+# ------------------------------------------------------------------------------
+# Worker-process settings shared by the engine, the validator and batch runs.
+# ==============================================================================
+
+import os
+
+def resolve_worker_count(workers):
+    """
+    The number of worker processes for an ENGINE_WORKERS / PARSE_WORKERS style
+    setting: None or 0 means one worker per CPU core.
+    """
+    if not workers:
+        return os.cpu_count() or 1
+    return max(1, int(workers))
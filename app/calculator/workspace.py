@@ -0,0 +1,89 @@
+# ==============================================================================
+# app/calculator/workspace.py
+# ------------------------------------------------------------------------------
+# Uploads without a disk round-trip.
+# An uploaded workbook is parsed straight from the request stream (werkzeug
+# keeps small uploads in memory and large ones in an anonymous temporary
+# file), so two uploads with the same file name can no longer overwrite each
+# other. Scratch files a run does need (streaming spill files, a copy for
+# worker processes) live in a RunWorkspace: a unique directory per run that
+# is removed when the run ends.
+# Keeping the original upload is optional and content-addressed, so the same
+# workbook uploaded twice is stored once.
+# ==============================================================================
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_stream(stream):
+    """The SHA-256 hex digest of a seekable binary stream, which is left rewound."""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for block in iter(lambda: stream.read(COPY_BLOCK_SIZE), b''):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+def stream_size(stream):
+    """The size in bytes of a seekable stream, which is left rewound."""
+    size = stream.seek(0, os.SEEK_END)
+    stream.seek(0)
+    return size
+
+def store_upload(stream, content_hash, folder, extension='.xlsx'):
+    """
+    Keeps a copy of an upload as `<folder>/<content_hash><extension>`, unless
+    it is already there. Written atomically. Returns the path.
+    """
+    path = os.path.join(folder, content_hash + extension)
+    if os.path.exists(path):
+        return path
+    os.makedirs(folder, exist_ok=True)
+    fd, staging = tempfile.mkstemp(prefix='.staging-', dir=folder)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            stream.seek(0)
+            shutil.copyfileobj(stream, f, COPY_BLOCK_SIZE)
+        os.replace(staging, path)
+    except Exception:
+        os.unlink(staging)
+        raise
+    finally:
+        stream.seek(0)
+    return path
+
+
+class RunWorkspace:
+    """
+    A unique scratch directory for one calculation run, removed on exit:
+
+        with RunWorkspace(root) as workspace:
+            run_engine_streaming(upload, config, spill_dir=workspace.path)
+    """
+
+    def __init__(self, root=None):
+        self.root = root
+        self.path = None
+
+    def __enter__(self):
+        if self.root:
+            os.makedirs(self.root, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix='run-', dir=self.root)
+        return self
+
+    def __exit__(self, *exc_info):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def materialize(self, stream, name='workbook.xlsx'):
+        """Copies a stream into the workspace, for code that needs a path (e.g. worker processes)."""
+        path = os.path.join(self.path, name)
+        with open(path, 'wb') as f:
+            stream.seek(0)
+            shutil.copyfileobj(stream, f, COPY_BLOCK_SIZE)
+        stream.seek(0)
+        return path
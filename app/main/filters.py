@@ -5,6 +5,7 @@
 # ==============================================================================
 
 from app.main import bp
+from app.calculator.explain import render_transaction_details, render_bonus_details
 
 @bp.app_template_filter('to_persian_int')
 def to_persian_int_filter(s):
@@ -16,4 +17,14 @@ def to_persian_int_filter(s):
         # Round to handle potential floats, then convert to int
         return "{:,}".format(int(round(float(s))))
     except (ValueError, TypeError):
-        return s
\ No newline at end of file
+        return s
+
+@bp.app_template_filter('calculation_details')
+def calculation_details_filter(txn):
+    """Renders the explanation lines of a transaction (see calculation_details.html)."""
+    return render_transaction_details(txn)
+
+@bp.app_template_filter('bonus_details')
+def bonus_details_filter(person_data):
+    """Renders the bonus explanation lines of a person-month."""
+    return render_bonus_details(person_data)
@@ -0,0 +1,79 @@
+# ==============================================================================
+# app/main/report_cache.py
+# ------------------------------------------------------------------------------
+# Rendered report pages, cached and served with conditional GET.
+# A CalculationRun never changes once its views are built, so a report page
+# is fully determined by the run (and when its views were last rebuilt), the
+# view (admin or one person), the session's admin flag (the navigation bar)
+# and the templates. That tuple is the cache key and, hashed, the ETag:
+# browsers revalidate with If-None-Match / If-Modified-Since and get a 304,
+# and other repeat views are served from the application cache (app/cache.py,
+# shared between workers unless it is the memory backend) without touching
+# the results. Rebuilding a run's views (flask rebuild-views) stamps a new
+# view_updated_at, so its old pages are never served again.
+# ==============================================================================
+
+import hashlib
+from flask import current_app, request, session
+
+from app.cache import get_cache
+
+# Templates a report page is rendered from; their sources are part of the key.
+REPORT_TEMPLATES = ('base.html', 'report.html')
+
+
+def template_version(app=None):
+    """Digest of the report templates' sources, computed once per process."""
+    app = app or current_app._get_current_object()
+    if 'report_template_version' not in app.extensions:
+        digest = hashlib.sha1()
+        for name in REPORT_TEMPLATES:
+            source, _, _ = app.jinja_env.loader.get_source(app.jinja_env, name)
+            digest.update(source.encode('utf-8'))
+        app.extensions['report_template_version'] = digest.hexdigest()
+    return app.extensions['report_template_version']
+
+def cached_report(run, view, render):
+    """
+    Serves a report page through the cache, answering conditional requests
+    with 304 Not Modified.
+
+    Args:
+        run (CalculationRun): The run shown.
+        view (str): 'admin', or the name of the person whose report it is.
+        render (callable): Renders the page (a str) on a cache miss, or
+            returns None if the run has nothing to show.
+
+    Returns:
+        flask.Response or None: None if render returned None.
+    """
+    # Pages carrying flashed messages are one-off: rendered, never cached.
+    if session.get('_flashes'):
+        body = render()
+        return current_app.make_response(body) if body is not None else None
+
+    last_modified = run.view_updated_at or run.upload_timestamp
+    key = (run.public_id, last_modified.isoformat(), view, bool(session.get('admin_logged_in')), template_version())
+    etag = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+    if request.if_none_match.contains(etag) or (
+            not request.if_none_match and request.if_modified_since is not None
+            and last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)):
+        response = current_app.response_class(status=304)
+    else:
+        cache = get_cache()
+        body = cache.get('report', etag) if cache is not None else None
+        if body is None:
+            body = render()
+            if body is None:
+                return None
+            body = body.encode('utf-8')
+            if cache is not None:
+                cache.set('report', etag, body)
+        response = current_app.response_class(body, mimetype='text/html')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Reports are private and must be revalidated (their access is session-checked).
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
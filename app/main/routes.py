@@ -6,24 +6,42 @@
 # ==============================================================================
 
 import os
+import re
 import json
+import time
+import uuid
 from datetime import datetime
 from functools import wraps
-import pandas as pd
 from flask import (render_template, request, flash, redirect, url_for, 
-                   current_app, session, Response)
+                   current_app, session, Response, jsonify, send_from_directory, abort)
 from werkzeug.utils import secure_filename
+from sqlalchemy import or_, and_
 from sqlalchemy.exc import IntegrityError
 import pdfkit
 
 from app import db
 from app.main import bp
 from app.models import CalculationRun, PersonResult, CommissionRuleSet, MonthlyTarget, AppSetting, User
-from app.calculator.validator import validate_excel_file
-from app.calculator.engine import calculate_commissions, summarize_results, CalculationConfig
+from app.calculator.workbook_cache import cache_from_config, validate_cached
+from app.calculator.workspace import RunWorkspace, hash_stream, store_upload, stream_size
+from app.calculator.bundle import is_bundle
+from app.calculator.quality import QualityReport, check_dataframes
+from app.calculator.engine import (run_engine, summarize_results,
+                                   PreviousRun, ENGINE_MODE_FAST, ENGINE_MODES)
+from app.calculator.streaming import run_engine_streaming
+from app.calculator.config import get_engine_config
+from app.calculator.rules import load_rule_index
+from app.calculator.scenarios import parse_scenarios, evaluate_scenarios
 from app.main.forms import (AdminLoginForm, CommissionRuleForm, MonthlyTargetForm, AppSettingForm, 
                             UserForm, EditUserForm, UserLoginForm)
-from app.main.utils import prepare_frontend_data, _perform_frontend_aggregation
+from app.main.utils import _perform_frontend_aggregation
+from app.main.report_cache import cached_report
+from app.cache import get_shared_cache
+from app.runs import (save_calculation_run, load_run_results, load_report_data, load_person_month,
+                      export_results_json)
+
+# Quality reports a session keeps access to (the most recent ones).
+QUALITY_REPORTS_PER_SESSION = 10
 
 # --- Helper Functions ---
 
@@ -42,6 +60,93 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def _load_previous_run():
+    """The latest run with input fingerprints, for incremental recalculation (or None)."""
+    previous = (CalculationRun.query
+                .filter(CalculationRun.input_fingerprints_json.isnot(None))
+                .order_by(CalculationRun.upload_timestamp.desc())
+                .first())
+    if previous is None:
+        return None
+    return PreviousRun(json.loads(previous.input_fingerprints_json),
+                       lambda: load_run_results(previous) or {})
+
+def _read_upload(file, workspace):
+    """
+    Prepares an uploaded workbook to be parsed straight from the request stream.
+    It is only copied into the run workspace when worker processes read it
+    (PARSE_WORKERS other than 1), and a content-addressed copy is kept in
+    UPLOAD_FOLDER only if KEEP_UPLOADS is set.
+
+    Returns:
+        tuple: (secure filename, stream or path to parse, SHA-256 hex digest, size in bytes)
+    """
+    stream = file.stream
+    content_hash = hash_stream(stream)
+    # An .xlsx workbook or a .zip bundle (allowed_file has checked it)
+    extension = os.path.splitext(file.filename)[1].lower()
+    if current_app.config['KEEP_UPLOADS']:
+        store_upload(stream, content_hash, current_app.config['UPLOAD_FOLDER'], extension)
+    source = stream if current_app.config['PARSE_WORKERS'] == 1 else workspace.materialize(stream, 'upload' + extension)
+    return secure_filename(file.filename), source, content_hash, stream_size(stream)
+
+def _flash_quality_report(report, errors=()):
+    """
+    Flashes validation errors and the capped data-quality summary, and saves the
+    full report as a CSV file whose download link is flashed with it. Only this
+    session may download it (the report names people and amounts).
+    """
+    for error in errors:
+        flash(error, 'danger')
+    for warning in report.messages(blocking=False):
+        flash(warning, 'warning')
+    if len(report):
+        folder = current_app.config['QUALITY_REPORT_FOLDER']
+        os.makedirs(folder, exist_ok=True)
+        _remove_old_quality_reports(folder, current_app.config['QUALITY_REPORT_MAX_AGE'])
+        report_id = uuid.uuid4().hex
+        with open(os.path.join(folder, f"{report_id}.csv"), 'w', encoding='utf-8') as f:
+            f.write(report.to_csv())
+        session['quality_reports'] = (session.get('quality_reports', []) + [report_id])[-QUALITY_REPORTS_PER_SESSION:]
+        flash(report_id, 'quality-report')
+
+def _remove_old_quality_reports(folder, max_age):
+    """Deletes the quality reports written more than max_age seconds ago."""
+    cutoff = time.time() - max_age
+    for entry in os.scandir(folder):
+        try:
+            if entry.name.endswith('.csv') and entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+        except FileNotFoundError:
+            continue  # Removed by another worker meanwhile
+
+def _evaluate_uploaded_scenarios():
+    """
+    Validates the uploaded workbook and scenario definitions of a what-if
+    request and evaluates them against the live configuration.
+
+    Returns:
+        tuple: (evaluation dict or None, list of error messages)
+    """
+    file = request.files.get('file')
+    if file is None or file.filename == '':
+        return None, ['هیچ فایلی انتخاب نشده است.']
+    if not allowed_file(file.filename):
+        return None, ['نوع فایل مجاز نیست. لطفاً یک فایل .xlsx یا .zip بارگذاری کنید.']
+
+    scenarios, errors = parse_scenarios(request.form.get('scenarios', ''))
+    if errors:
+        return None, errors
+
+    with RunWorkspace(current_app.config['RUN_WORKSPACE_ROOT']) as workspace:
+        _, source, content_hash, _ = _read_upload(file, workspace)
+        dataframes, errors = validate_cached(source, cache_from_config(current_app.config, get_shared_cache()),
+                                             content_hash, workers=current_app.config['PARSE_WORKERS'])
+    if errors:
+        return None, errors
+
+    return evaluate_scenarios(dataframes, scenarios, get_engine_config()), []
+
 # --- Main Application Routes ---
 
 @bp.route('/', methods=['GET', 'POST'])
@@ -58,75 +163,122 @@ def index():
             return redirect(request.url)
         
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
-            file.save(filepath)
-
-            dataframes, errors = validate_excel_file(filepath)
-            if errors:
-                for error in errors:
-                    flash(error, 'danger')
-                return redirect(request.url)
+            with RunWorkspace(current_app.config['RUN_WORKSPACE_ROOT']) as workspace:
+                filename, source, content_hash, size = _read_upload(file, workspace)
+                cache = cache_from_config(current_app.config, get_shared_cache())
+
+                # Large workbooks are validated chunk by chunk while they are calculated (and
+                # cached as they are read), unless the cache already holds their parsed sheets
+                # (bundles are read whole).
+                streaming = (size > current_app.config['STREAMING_THRESHOLD_BYTES']
+                             and (cache is None or content_hash not in cache) and not is_bundle(source))
+                report = QualityReport()
+                dataframes, errors = (None, []) if streaming else validate_cached(
+                    source, cache, content_hash, workers=current_app.config['PARSE_WORKERS'], report=report)
+                if errors:
+                    _flash_quality_report(report, errors)
+                    return redirect(request.url)
+                if not streaming:
+                    check_dataframes(dataframes, report)
             
-            try:
-                results, config = calculate_commissions(dataframes)
-                summary_data = summarize_results(results, dataframes.get('Commissions paid'), config)
-
-                months_in_report = sorted(results.keys())
-                period_string = f"{months_in_report[0]} to {months_in_report[-1]}" if months_in_report else "N/A"
-
-                targets_df = dataframes.get('Additional commissions')
-                targets_json_str = targets_df.to_json(orient='records') if targets_df is not None else '[]'
-
-                new_run = CalculationRun(
-                    filename=filename,
-                    report_period=period_string,
-                    upload_timestamp=datetime.utcnow(),
-                    detailed_results_json=json.dumps(results, ensure_ascii=False),
-                    targets_json=targets_json_str
-                )
-                db.session.add(new_run)
-                db.session.flush()
-
-                for person_name, data in summary_data.items():
-                    person_result = PersonResult(
-                        person_name=person_name, commission_model=data['commission_model'],
-                        total_original_commission=data['total_original_commission'],
-                        total_additional_bonus=data['total_additional_bonus'],
-                        total_payable_commission=data['total_payable_commission'],
-                        total_paid_commission=data['total_paid_commission'],
-                        total_full_commission=data['total_full_commission'],
-                        total_pending_commission=data['total_pending_commission'],
-                        remaining_balance=data['remaining_balance'], calculation_run_id=new_run.id
-                    )
-                    db.session.add(person_result)
-                
-                db.session.commit()
-                flash('محاسبات با موفقیت انجام و ذخیره شد.', 'success')
-                return redirect(url_for('main.admin_master_report', public_id=new_run.public_id))
-
-            except Exception as e:
-                db.session.rollback()
-                current_app.logger.error(f"Calculation or database operation failed: {e}", exc_info=True)
-                flash(f'یک خطای غیرمنتظره در حین محاسبه رخ داد. لطفاً لاگ سرور را بررسی کنید. خطا: {e}', 'danger')
-                return redirect(request.url)
+                engine_mode = request.form.get('engine_mode', ENGINE_MODE_FAST)
+                if engine_mode not in ENGINE_MODES:
+                    engine_mode = ENGINE_MODE_FAST
+
+                try:
+                    config = get_engine_config()
+                    previous_run = _load_previous_run()
+                    workers = current_app.config['ENGINE_WORKERS']
+                    if streaming:
+                        results, dataframes, errors = run_engine_streaming(
+                            source, config, chunk_rows=current_app.config['STREAMING_CHUNK_ROWS'],
+                            mode=engine_mode, previous_run=previous_run, workers=workers,
+                            spill_dir=workspace.path, report=report,
+                            cache_entry=cache.writer(content_hash) if cache is not None else None
+                        )
+                        if errors:
+                            _flash_quality_report(report, errors)
+                            return redirect(request.url)
+                    else:
+                        results = run_engine(dataframes, config, mode=engine_mode, previous_run=previous_run, workers=workers)
+                    summary_data = summarize_results(results, dataframes.get('Commissions paid'), config)
+
+                    new_run, _ = save_calculation_run(filename, results, summary_data,
+                                                      dataframes.get('Additional commissions'), engine_mode)
+                    db.session.commit()
+                    flash('محاسبات با موفقیت انجام و ذخیره شد.', 'success')
+                    _flash_quality_report(report)
+                    return redirect(url_for('main.admin_master_report', public_id=new_run.public_id))
+
+                except Exception as e:
+                    db.session.rollback()
+                    current_app.logger.error(f"Calculation or database operation failed: {e}", exc_info=True)
+                    flash(f'یک خطای غیرمنتظره در حین محاسبه رخ داد. لطفاً لاگ سرور را بررسی کنید. خطا: {e}', 'danger')
+                    return redirect(request.url)
 
         else:
-            flash('نوع فایل مجاز نیست. لطفاً یک فایل .xlsx بارگذاری کنید.', 'danger')
+            flash('نوع فایل مجاز نیست. لطفاً یک فایل .xlsx یا .zip بارگذاری کنید.', 'danger')
             return redirect(request.url)
 
     return render_template('index.html')
 
+@bp.route('/quality-report/<report_id>')
+def download_quality_report(report_id):
+    """Downloads the full data-quality report of an upload (see _flash_quality_report)."""
+    if not re.fullmatch(r'[0-9a-f]{32}', report_id) or report_id not in session.get('quality_reports', []):
+        abort(404)
+    return send_from_directory(current_app.config['QUALITY_REPORT_FOLDER'], f"{report_id}.csv",
+                               as_attachment=True, download_name='quality_report.csv', mimetype='text/csv')
+
 @bp.route('/history')
 @admin_required
 def history():
-    """Displays a list of all past calculation runs for the admin."""
-    runs = CalculationRun.query.order_by(CalculationRun.upload_timestamp.desc()).all()
+    """
+    Lists past calculation runs for the admin, newest first, one page at a time.
+    Pages are keyset-paginated: ?before=<cursor> continues after the last run
+    of the previous page, so deep pages cost the same as the first.
+    """
+    page_size = current_app.config['HISTORY_PAGE_SIZE']
+    query = CalculationRun.query.order_by(CalculationRun.upload_timestamp.desc(), CalculationRun.id.desc())
+    cursor = _parse_history_cursor(request.args.get('before'))
+    if cursor is not None:
+        timestamp, run_id = cursor
+        query = query.filter(or_(
+            CalculationRun.upload_timestamp < timestamp,
+            and_(CalculationRun.upload_timestamp == timestamp, CalculationRun.id < run_id)
+        ))
+    runs = query.limit(page_size + 1).all()
+    next_cursor = _history_cursor(runs[page_size - 1]) if len(runs) > page_size else None
+    runs = runs[:page_size]
+
+    users_by_run = _users_by_run([run.id for run in runs])
     for run in runs:
-        run.person_names = [p.person_name for p in run.person_results]
-        run.users = User.query.filter(User.name.in_(run.person_names)).all()
-    return render_template('history.html', runs=runs)
+        run.users = users_by_run.get(run.id, [])
+    return render_template('history.html', runs=runs, next_cursor=next_cursor, is_first_page=cursor is None)
+
+def _history_cursor(run):
+    return f"{run.upload_timestamp.isoformat()}_{run.id}"
+
+def _parse_history_cursor(value):
+    """(upload_timestamp, id) from a history cursor, or None for the first page (also if malformed)."""
+    if not value:
+        return None
+    timestamp, _, run_id = value.rpartition('_')
+    try:
+        return datetime.fromisoformat(timestamp), int(run_id)
+    except ValueError:
+        return None
+
+def _users_by_run(run_ids):
+    """The registered users appearing in each of the given runs, in one joined query."""
+    rows = (db.session.query(PersonResult.calculation_run_id, User)
+            .join(User, User.name == PersonResult.person_name)
+            .filter(PersonResult.calculation_run_id.in_(run_ids))
+            .order_by(PersonResult.calculation_run_id, User.id))
+    users_by_run = {}
+    for run_id, user in rows:
+        users_by_run.setdefault(run_id, []).append(user)
+    return users_by_run
 
 # --- NEW REPORTING AND LOGIN FLOW ---
 
@@ -154,83 +306,62 @@ def user_login(public_id, username):
 
 @bp.route('/report/<public_id>/<username>')
 def view_user_report(public_id, username):
-    """Displays a filtered, secure report for a single user."""
-    # --- DEBUG LOG ---
-    current_app.logger.info("="*50)
-    current_app.logger.info(f"ENTERING 'view_user_report' for user: '{username}', report: '{public_id}'")
-    
+    """
+    Displays a filtered, secure report for a single user. Only the user's
+    slice of the run is read: the run's team-level view, their own view and
+    their transactions (and only when the page is not cached).
+    """
     if session.get('report_access_user') != username or session.get('report_access_id') != public_id:
-        # --- DEBUG LOG ---
-        current_app.logger.warning(f"SESSION CHECK FAILED! Session user: '{session.get('report_access_user')}', Session report: '{session.get('report_access_id')}'")
+        current_app.logger.warning(f"Report access denied for user '{username}' on report '{public_id}': not logged in to it.")
         flash('برای مشاهده این گزارش ابتدا باید وارد شوید.', 'warning')
         return redirect(url_for('main.user_login', public_id=public_id, username=username))
 
-    # --- DEBUG LOG ---
-    current_app.logger.info("Session check PASSED.")
-    
-    run = CalculationRun.query.filter_by(public_id=public_id).first_or_404()
-    user = User.query.filter_by(username=username).first_or_404()
-    
-    # --- DEBUG LOG ---
-    current_app.logger.info(f"Successfully fetched User object. User's full name from DB is: '{user.name}'")
-    
-    if not run.detailed_results_json:
-        flash('اطلاعات دقیق برای این گزارش یافت نشد.', 'danger')
+    # The run's metadata and the user's name in one query; the views are read on a cache miss.
+    row = (db.session.query(CalculationRun, PersonResult.person_name)
+           .join(PersonResult, PersonResult.calculation_run_id == CalculationRun.id)
+           .join(User, User.name == PersonResult.person_name)
+           .filter(CalculationRun.public_id == public_id, User.username == username)
+           .first())
+    if row is None:
+        CalculationRun.query.filter_by(public_id=public_id).first_or_404()
+        user = User.query.filter_by(username=username).first_or_404()
+        flash(f'اطلاعاتی برای کاربر "{user.name}" در این گزارش یافت نشد.', 'warning')
         return redirect(url_for('main.index'))
+    run, person_name = row
 
-    full_results = json.loads(run.detailed_results_json)
-    all_person_results = PersonResult.query.filter_by(calculation_run_id=run.id).all()
-    
-    # --- DEBUG LOG ---
-    all_names_in_report = [p.person_name for p in all_person_results]
-    current_app.logger.info(f"All person names found in this report's PersonResult table: {all_names_in_report}")
-    
-    # --- THIS IS THE MOST IMPORTANT CHECK ---
-    user_name_to_filter = user.name
-    user_has_data = user_name_to_filter in all_names_in_report
-    # --- DEBUG LOG ---
-    current_app.logger.info(f"The name to filter by is: '{user_name_to_filter}'")
-    current_app.logger.info(f"Is the user's name in the report's list of people? {'YES' if user_has_data else 'NO'}")
-
-    if not user_has_data:
-        flash(f'اطلاعاتی برای کاربر "{user.name}" در این گزارش یافت نشد.', 'warning')
+    response = cached_report(run, person_name, lambda: _render_report(
+        run, load_report_data(run, person_name=person_name), is_user_view=True))
+    if response is None:
+        flash('اطلاعات دقیق برای این گزارش یافت نشد.', 'danger')
         return redirect(url_for('main.index'))
-        
-    full_summary_data = {}
-    for res in all_person_results:
-        full_summary_data[res.person_name] = {
-            'person_name': res.person_name, 'commission_model': res.commission_model,
-            'total_original_commission': res.total_original_commission,
-            'total_additional_bonus': res.total_additional_bonus,
-            'total_payable_commission': res.total_payable_commission,
-            'total_paid_commission': res.total_paid_commission,
-            'total_full_commission': res.total_full_commission,
-            'total_pending_commission': res.total_pending_commission,
-            'remaining_balance': res.remaining_balance
-        }
-    
-    targets_df = pd.read_json(run.targets_json, orient='records') if run.targets_json else pd.DataFrame()
-    frontend_data = prepare_frontend_data(
-        full_results, 
-        full_summary_data, 
-        targets_df, 
-        filter_person_name=user.name
-    )
-    
-    # --- DEBUG LOG ---
-    current_app.logger.info(f"Data prepared for template. Number of people in final data: {len(frontend_data['personList'])}")
-    current_app.logger.info("="*50)
-    
-    return render_template(
-        'report.html', 
-        run=run,
-        frontend_data=frontend_data,
-        overall_summary=frontend_data['overallSummary'],
-        detailed_report=frontend_data['detailedReport'],
-        person_monthly_report=frontend_data['personMonthlyReport'],
-        person_list=frontend_data['personList'],
-        is_user_view=True
-    )
+    return response
+
+@bp.route('/report/<public_id>/explain')
+def explain_calculations(public_id):
+    """
+    The calculation explanations of one person in one month of a report, as
+    an HTML fragment: of their transactions in the role given, or of their
+    bonus without one. The report page loads it when the section is opened,
+    so the explanations are not rendered for every transaction of the page.
+    """
+    month_key, person_name, role = request.args.get('month'), request.args.get('person'), request.args.get('role')
+    if not month_key or not person_name:
+        abort(400)
+    run = CalculationRun.query.filter_by(public_id=public_id).first_or_404()
+    if not session.get('admin_logged_in'):
+        # A user sees only their own explanations, of the report they are logged in to.
+        username = session.get('report_access_user')
+        user = User.query.filter_by(username=username).first() if username and session.get('report_access_id') == public_id else None
+        if user is None or user.name != person_name:
+            abort(403)
+
+    person_data = load_person_month(run, month_key, person_name)
+    if person_data is None:
+        abort(404)
+    if role is None:
+        return render_template('calculation_details.html', bonus=person_data, transactions=[])
+    transactions = [txn for txn in person_data['transactions'] if txn['role'] == role]
+    return render_template('calculation_details.html', bonus=None, transactions=transactions)
 
 # --- DEPRECATED/OLD ROUTES ---
 @bp.route('/report/<int:run_id>')
@@ -270,36 +401,25 @@ def admin_dashboard():
     """Main admin dashboard showing rules and targets."""
     rules = CommissionRuleSet.query.order_by(CommissionRuleSet.model_name, CommissionRuleSet.min_sales).all()
     targets = MonthlyTarget.query.order_by(MonthlyTarget.year.desc(), MonthlyTarget.month.desc()).all()
-    return render_template('admin.html', rules=rules, targets=targets)
+    bracket_issues = load_rule_index().issues
+    return render_template('admin.html', rules=rules, targets=targets, bracket_issues=bracket_issues)
     
 @bp.route('/admin/report/<public_id>')
 @admin_required
 def admin_master_report(public_id):
     """Displays the full, unfiltered report for an administrator."""
+    # Metadata only: the views are read on a cache miss.
     run = CalculationRun.query.filter_by(public_id=public_id).first_or_404()
-    
-    if not run.detailed_results_json:
+    response = cached_report(run, 'admin', lambda: _render_report(run, load_report_data(run), is_user_view=False))
+    if response is None:
         flash('اطلاعات دقیق برای این گزارش یافت نشد.', 'danger')
         return redirect(url_for('main.history'))
+    return response
 
-    results = json.loads(run.detailed_results_json)
-    person_results_query = PersonResult.query.filter_by(calculation_run_id=run.id).all()
-    summary_data = {}
-    for res in person_results_query:
-        summary_data[res.person_name] = {
-            'person_name': res.person_name, 'commission_model': res.commission_model,
-            'total_original_commission': res.total_original_commission,
-            'total_additional_bonus': res.total_additional_bonus,
-            'total_payable_commission': res.total_payable_commission,
-            'total_paid_commission': res.total_paid_commission,
-            'total_full_commission': res.total_full_commission,
-            'total_pending_commission': res.total_pending_commission,
-            'remaining_balance': res.remaining_balance
-        }
-    
-    targets_df = pd.read_json(run.targets_json, orient='records') if run.targets_json else pd.DataFrame()
-    frontend_data = prepare_frontend_data(results, summary_data, targets_df)
-    
+def _render_report(run, frontend_data, is_user_view):
+    """Renders report.html, or returns None if there is no frontend data."""
+    if frontend_data is None:
+        return None
     return render_template(
         'report.html', 
         run=run,
@@ -308,9 +428,46 @@ def admin_master_report(public_id):
         detailed_report=frontend_data['detailedReport'],
         person_monthly_report=frontend_data['personMonthlyReport'],
         person_list=frontend_data['personList'],
-        is_user_view=False
+        is_user_view=is_user_view
     )
 
+@bp.route('/admin/report/<public_id>/results.json')
+@admin_required
+def export_run_results(public_id):
+    """Downloads a run's detailed results as one JSON document."""
+    run = CalculationRun.query.filter_by(public_id=public_id).first_or_404()
+    return Response(export_results_json(run), mimetype='application/json',
+                    headers={'Content-Disposition': f'attachment; filename=results_{run.public_id}.json'})
+
+@bp.route('/admin/scenarios', methods=['GET', 'POST'])
+@admin_required
+def admin_scenarios():
+    """What-if comparison of candidate rule sets and settings; nothing is saved."""
+    evaluation = None
+    if request.method == 'POST':
+        try:
+            evaluation, errors = _evaluate_uploaded_scenarios()
+        except Exception as e:
+            current_app.logger.error(f"Scenario evaluation failed: {e}", exc_info=True)
+            evaluation, errors = None, [f'یک خطای غیرمنتظره در حین ارزیابی سناریوها رخ داد. خطا: {e}']
+        for error in errors:
+            flash(error, 'danger')
+    return render_template('admin_scenarios.html', evaluation=evaluation,
+                           scenarios_text=request.form.get('scenarios', ''))
+
+@bp.route('/admin/scenarios/evaluate', methods=['POST'])
+@admin_required
+def evaluate_scenarios_api():
+    """JSON variant of the what-if comparison, for scripts and tools."""
+    try:
+        evaluation, errors = _evaluate_uploaded_scenarios()
+    except Exception as e:
+        current_app.logger.error(f"Scenario evaluation failed: {e}", exc_info=True)
+        evaluation, errors = None, [f'یک خطای غیرمنتظره در حین ارزیابی سناریوها رخ داد. خطا: {e}']
+    if errors:
+        return jsonify({'errors': errors}), 400
+    return jsonify(evaluation)
+
 @bp.route('/admin/rule/add', methods=['GET', 'POST'])
 @admin_required
 def add_rule():
@@ -396,9 +553,7 @@ def edit_setting(setting_id):
                 return render_template('admin_form.html', form=form, title=f'ویرایش تنظیم: {setting.key}', description=setting.description)
         setting.value = new_value
         db.session.commit()
-        from app.calculator.engine import CalculationConfig
-        CalculationConfig._instance = None
-        flash(f'تنظیم "{setting.key}" با موفقیت ویرایش شد و حافظه نهان (cache) کانفیگ پاک شد.', 'success')
+        flash(f'تنظیم "{setting.key}" با موفقیت ویرایش شد و در محاسبات بعدی اعمال می‌شود.', 'success')
         return redirect(url_for('main.admin_settings'))
     return render_template('admin_form.html', form=form, title=f'ویرایش تنظیم: {setting.key}', description=setting.description)
 
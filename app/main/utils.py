@@ -3,17 +3,28 @@
 # (Updated with Aggregation Logic)
 # ==============================================================================
 import pandas as pd
-from app.models import CommissionRuleSet
+from app.calculator.rules import load_rule_index
+from app.calculator.store import transaction_sum, transaction_role_summary
 
-def get_bracket_range_string(bracket_base, commission_model):
+# Bump when the layout of the materialized views (split_frontend_view) changes;
+# runs stored in another layout are aggregated on the fly until rebuilt.
+FRONTEND_VIEW_FORMAT = 2
+
+def get_bracket_range_string(bracket_base, commission_model, rule_index=None):
     """Finds the human-readable string for a given sales bracket."""
-    rules_from_db = CommissionRuleSet.query.filter_by(model_name=commission_model).all()
-    for rule in rules_from_db:
-        if rule.min_sales <= bracket_base < rule.max_sales:
-            min_str = f"{rule.min_sales / 1_000_000:,.0f}"
-            max_str = "∞" if rule.max_sales >= 999999999999 else f"{rule.max_sales / 1_000_000:,.0f}"
-            return f"پله: {min_str} - {max_str} میلیون"
-    return "پله: نامشخص"
+    if rule_index is None:
+        rule_index = load_rule_index()
+    return rule_index.label_for(bracket_base, commission_model)
+
+def _person_total(person_data, field):
+    """
+    Sum of a transaction field over a person-month. People whose transactions
+    were not loaded (see app/runs.py:load_run_results) carry it in 'totals'.
+    """
+    totals = person_data.get('totals')
+    if totals is not None:
+        return totals[field]
+    return transaction_sum(person_data.get('transactions', []), field)
 
 def _perform_frontend_aggregation(results):
     """
@@ -21,29 +32,25 @@ def _perform_frontend_aggregation(results):
     summary keys needed by the frontend templates (both web and PDF).
     This function modifies the 'results' dictionary in place.
     """
+    rule_index = load_rule_index()
     for month_key, month_data in results.items():
         total_monthly_net = 0
         total_monthly_commission = 0
+        persons = month_data.get('persons', {})
+        # The bracket labels of the whole month in one lookup
+        bracket_labels = rule_index.labels_for_bases(
+            [person_data.get('bracket_base', 0) for person_data in persons.values()],
+            [person_data.get('model', '') for person_data in persons.values()])
 
-        for person_name, person_data in month_data.get('persons', {}).items():
-            person_total_net = 0
-            person_unpaid_commission = 0
-            person_data['roles_summary'] = {}
-
-            for txn in person_data.get('transactions', []):
-                person_total_net += txn.get('net_value', 0)
-                person_unpaid_commission += txn.get('commission_remaining', 0)
-                
-                role_summary = person_data['roles_summary'].setdefault(txn.get('role'), {
-                    'total_sales': 0, 'total_commission': 0, 'transaction_count': 0
-                })
-                role_summary['total_sales'] += txn.get('commission_base', 0)
-                role_summary['total_commission'] += txn.get('payable_commission', 0)
-                role_summary['transaction_count'] += 1
+        for (person_name, person_data), bracket_label in zip(persons.items(), bracket_labels):
+            transactions = person_data.get('transactions', [])
+            person_total_net = _person_total(person_data, 'net_value')
+            person_unpaid_commission = _person_total(person_data, 'commission_remaining')
+            person_data['roles_summary'] = transaction_role_summary(transactions)
 
             person_data['total_net_sales'] = person_total_net
             person_data['unpaid_commission'] = person_unpaid_commission
-            person_data['bracket_range_str'] = get_bracket_range_string(person_data.get('bracket_base', 0), person_data.get('model', ''))
+            person_data['bracket_range_str'] = bracket_label
 
             total_monthly_net += person_total_net
             total_monthly_commission += person_data.get('total_commission', 0)
@@ -96,8 +103,8 @@ def prepare_frontend_data(results, summary_data, additional_commissions_df, filt
         for person_name, person_data in month_data['persons'].items():
             if person_name in person_monthly_report:
                 original_commission = person_data['total_commission'] - person_data.get('additional_bonus', 0)
-                monthly_full_commission = sum(txn.get('full_commission', 0) for txn in person_data.get('transactions', []))
-                monthly_pending_commission = sum(txn.get('commission_remaining', 0) for txn in person_data.get('transactions', []))
+                monthly_full_commission = _person_total(person_data, 'full_commission')
+                monthly_pending_commission = _person_total(person_data, 'commission_remaining')
                 
                 person_monthly_report[person_name]['months'][month] = {
                     'bracket_base': person_data['bracket_base'],
@@ -118,32 +125,129 @@ def prepare_frontend_data(results, summary_data, additional_commissions_df, filt
     }
 
     # --- STEP 2: If a filter is requested, surgically filter the final prepared data ---
-    if filter_person_name and filter_person_name in person_list:
-        # Filter person list
-        frontend_data['personList'] = [filter_person_name]
+    if filter_person_name:
+        frontend_data = filter_frontend_data(frontend_data, filter_person_name)
 
-        # Filter overall summary
-        frontend_data['overallSummary'] = [s for s in frontend_data['overallSummary'] if s['person_name'] == filter_person_name]
-        
-        # Filter detailed report
-        filtered_detailed_report = {}
-        for month, month_data in frontend_data['detailedReport'].items():
-            if filter_person_name in month_data.get('persons', {}):
-                # Create a new month dict, keeping month-level summaries but filtering persons
-                new_month_data = month_data.copy()
-                new_month_data['persons'] = {filter_person_name: month_data['persons'][filter_person_name]}
-                filtered_detailed_report[month] = new_month_data
-        frontend_data['detailedReport'] = filtered_detailed_report
-
-        # Filter person-monthly report
-        frontend_data['personMonthlyReport'] = {
-            filter_person_name: frontend_data['personMonthlyReport'][filter_person_name]
-        }
+    return frontend_data
+
+def filter_frontend_data(frontend_data, filter_person_name):
+    """Narrows prepared frontend data to one person, keeping month-level totals and the team chart."""
+    if filter_person_name not in frontend_data['personList']:
+        return frontend_data
 
-        # Filter chart data for persons (but keep total sales for context)
-        filtered_persons_chart_data = {
-            filter_person_name: frontend_data['chartData']['datasets']['persons'][filter_person_name]
+    # Filter person list
+    frontend_data['personList'] = [filter_person_name]
+
+    # Filter overall summary
+    frontend_data['overallSummary'] = [s for s in frontend_data['overallSummary'] if s['person_name'] == filter_person_name]
+
+    # Filter detailed report
+    filtered_detailed_report = {}
+    for month, month_data in frontend_data['detailedReport'].items():
+        if filter_person_name in month_data.get('persons', {}):
+            # Create a new month dict, keeping month-level summaries but filtering persons
+            new_month_data = month_data.copy()
+            new_month_data['persons'] = {filter_person_name: month_data['persons'][filter_person_name]}
+            filtered_detailed_report[month] = new_month_data
+    frontend_data['detailedReport'] = filtered_detailed_report
+
+    # Filter person-monthly report
+    frontend_data['personMonthlyReport'] = {
+        filter_person_name: frontend_data['personMonthlyReport'][filter_person_name]
+    }
+
+    # Filter chart data for persons (but keep total sales for context)
+    filtered_persons_chart_data = {
+        filter_person_name: frontend_data['chartData']['datasets']['persons'][filter_person_name]
+    }
+    frontend_data['chartData']['datasets']['persons'] = filtered_persons_chart_data
+
+    return frontend_data
+
+def build_frontend_view(results, summary_data, additional_commissions_df):
+    """
+    The frontend data of a run without its transactions: everything the report
+    shows that is aggregated (month totals, roles summaries, the person-monthly
+    report and the chart). Computed once when the run is saved; the results are
+    left unchanged.
+    """
+    view_results = {}
+    for month, month_data in results.items():
+        view_month = {key: value for key, value in month_data.items() if key != 'transaction_store'}
+        view_month['persons'] = {name: dict(person_data) for name, person_data in month_data['persons'].items()}
+        view_results[month] = view_month
+    if additional_commissions_df is None:
+        additional_commissions_df = pd.DataFrame()
+
+    frontend_data = prepare_frontend_data(view_results, summary_data, additional_commissions_df)
+    for month_data in frontend_data['detailedReport'].values():
+        for person_data in month_data['persons'].values():
+            person_data.pop('transactions', None)
+            person_data.pop('totals', None)
+    return frontend_data
+
+def split_frontend_view(frontend_data):
+    """
+    Splits a materialized view into its team-level part (month totals and
+    bonus summaries, the chart's months, total sales and targets) and one
+    slice per person, so a user's report reads only their own slice.
+
+    Returns:
+        tuple: (team view, {person name: person view})
+    """
+    chart_data = frontend_data['chartData']
+    team_view = {
+        'format': FRONTEND_VIEW_FORMAT,
+        'personList': frontend_data['personList'],
+        'months': {
+            month: {key: value for key, value in month_data.items() if key != 'persons'}
+            for month, month_data in frontend_data['detailedReport'].items()
+        },
+        'chartData': {
+            'labels': chart_data['labels'],
+            'datasets': {key: value for key, value in chart_data['datasets'].items() if key != 'persons'}
+        }
+    }
+    summaries = {summary['person_name']: summary for summary in frontend_data['overallSummary']}
+    person_views = {}
+    for person in frontend_data['personList']:
+        person_views[person] = {
+            'summary': summaries[person],
+            'months': {
+                month: month_data['persons'][person]
+                for month, month_data in frontend_data['detailedReport'].items() if person in month_data['persons']
+            },
+            'monthlyReport': frontend_data['personMonthlyReport'][person],
+            'chart': chart_data['datasets']['persons'][person]
         }
-        frontend_data['chartData']['datasets']['persons'] = filtered_persons_chart_data
+    return team_view, person_views
 
-    return frontend_data
\ No newline at end of file
+def join_frontend_view(team_view, person_views):
+    """
+    Reassembles frontend data, as prepare_frontend_data returns it, from the
+    team view and the views of the people to show (everyone, or one person
+    for a user's report).
+    """
+    persons = [person for person in team_view['personList'] if person in person_views]
+    detailed_report = {}
+    for month, month_data in team_view['months'].items():
+        month_persons = {
+            person: person_views[person]['months'][month]
+            for person in persons if month in person_views[person]['months']
+        }
+        if month_persons:
+            detailed_report[month] = {'persons': month_persons, **month_data}
+    chart_data = {
+        'labels': team_view['chartData']['labels'],
+        'datasets': {
+            **team_view['chartData']['datasets'],
+            'persons': {person: person_views[person]['chart'] for person in persons}
+        }
+    }
+    return {
+        'personList': persons,
+        'overallSummary': [person_views[person]['summary'] for person in persons],
+        'detailedReport': detailed_report,
+        'personMonthlyReport': {person: person_views[person]['monthlyReport'] for person in persons},
+        'chartData': chart_data
+    }
@@ -8,12 +8,16 @@ from datetime import datetime
 from app import db
 import json
 import uuid
+from sqlalchemy import event
+from sqlalchemy.orm import Session, deferred
 from werkzeug.security import generate_password_hash, check_password_hash
 
 class CalculationRun(db.Model):
     """
     Stores metadata for each uploaded file and calculation run.
     Each run is a snapshot of a calculation at a specific time.
+    The JSON text columns are deferred: listing queries load only the metadata,
+    and each text column is read on first access.
     """
     __tablename__ = 'calculation_run'
     id = db.Column(db.Integer, primary_key=True)
@@ -22,12 +26,28 @@ class CalculationRun(db.Model):
     report_period = db.Column(db.String(64), index=True)
     upload_timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     
-    # Column to store the full, detailed report as a JSON string
-    detailed_results_json = db.Column(db.Text, nullable=True)
-    targets_json = db.Column(db.Text, nullable=True)
+    # The full, detailed report as one JSON string. Only written when
+    # STORE_RESULTS_BLOB is set, and read for runs saved before the results
+    # were normalized into PersonMonthResult / RunTransaction rows.
+    detailed_results_json = deferred(db.Column(db.Text, nullable=True))
+    # Month-level results (bonus summaries) as JSON; NULL for runs saved before
+    # the normalized tables, which only have detailed_results_json.
+    month_summaries_json = deferred(db.Column(db.Text, nullable=True))
+    targets_json = deferred(db.Column(db.Text, nullable=True))
+    # The team-level part of the aggregated report data, computed when the run
+    # is saved so report views don't re-aggregate (see app/main/utils.py).
+    frontend_view_json = deferred(db.Column(db.Text, nullable=True))
+    # When the views were last built; rendered report pages are cached per stamp.
+    view_updated_at = db.Column(db.DateTime, nullable=True)
+    # Engine mode the run was calculated with ('fast' or 'forensic')
+    engine_mode = db.Column(db.String(16), nullable=True)
+    # Input fingerprints (global + per month) used for incremental recalculation
+    input_fingerprints_json = deferred(db.Column(db.Text, nullable=True))
     # Relationship: One CalculationRun has many PersonResults.
     # If a run is deleted, all its associated results are also deleted.
     person_results = db.relationship('PersonResult', backref='calculation_run', lazy='dynamic', cascade="all, delete-orphan")
+    person_months = db.relationship('PersonMonthResult', backref='calculation_run', lazy='dynamic', cascade="all, delete-orphan")
+    transactions = db.relationship('RunTransaction', backref='calculation_run', lazy='dynamic', cascade="all, delete-orphan")
 
     def __repr__(self):
         return f'<CalculationRun {self.id}: {self.filename}>'
@@ -51,13 +71,87 @@ class PersonResult(db.Model):
     total_full_commission = db.Column(db.Float, default=0) # Potential commission at 100% collection
     total_pending_commission = db.Column(db.Float, default=0) # Commission waiting on collection
     # --- END OF ADDED FIELDS ---
+
+    # This person's slice of the run's materialized report view, so a user's
+    # report doesn't read the whole team's (see app/main/utils.py:split_frontend_view)
+    report_view_json = deferred(db.Column(db.Text, nullable=True))
     
     # Foreign Key to link back to the CalculationRun
     calculation_run_id = db.Column(db.Integer, db.ForeignKey('calculation_run.id'), nullable=False)
 
+    __table_args__ = (db.Index('ix_person_result_run_person', 'calculation_run_id', 'person_name'),)
+
     def __repr__(self):
         return f'<PersonResult {self.id}: {self.person_name}>'
 
+class PersonMonthResult(db.Model):
+    """
+    One person's results for one month of a run. Reports read only the rows of
+    the months and people they render (see app/runs.py:load_run_results).
+    """
+    __tablename__ = 'person_month_result'
+    id = db.Column(db.Integer, primary_key=True)
+    calculation_run_id = db.Column(db.Integer, db.ForeignKey('calculation_run.id'), nullable=False)
+    month = db.Column(db.String(16), nullable=False)
+    person_name = db.Column(db.String(128), nullable=False)
+    commission_model = db.Column(db.String(64))
+    bracket_base = db.Column(db.Float, default=0)
+    total_commission = db.Column(db.Float, default=0)
+    additional_bonus = db.Column(db.Float, default=0)
+
+    # Sums over the person's transactions, so a month's totals can be shown
+    # without loading every transaction of the month.
+    total_net_sales = db.Column(db.Float, default=0)
+    total_full_commission = db.Column(db.Float, default=0)
+    total_pending_commission = db.Column(db.Float, default=0)
+
+    # The person's [start, stop) range of RunTransaction.position in the month
+    transaction_start = db.Column(db.Integer, nullable=False)
+    transaction_stop = db.Column(db.Integer, nullable=False)
+    # Any other person-month results (e.g. the bonus breakdown) as JSON
+    details_json = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_person_month_result_run_person', 'calculation_run_id', 'person_name'),
+        db.Index('ix_person_month_result_run_month', 'calculation_run_id', 'month'),
+    )
+
+    def __repr__(self):
+        return f'<PersonMonthResult {self.id}: {self.person_name} {self.month}>'
+
+class RunTransaction(db.Model):
+    """
+    One transaction of a run, as calculated by the engine: a row of a month's
+    TransactionStore (app/calculator/store.py) at the given position.
+    """
+    __tablename__ = 'run_transaction'
+    id = db.Column(db.Integer, primary_key=True)
+    calculation_run_id = db.Column(db.Integer, db.ForeignKey('calculation_run.id'), nullable=False)
+    month = db.Column(db.String(16), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    person_name = db.Column(db.String(128), nullable=False)
+    role = db.Column(db.String(64))
+    company = db.Column(db.String(256))
+    invoice_link = db.Column(db.String(256))
+    is_renewal = db.Column(db.Boolean, default=False)
+
+    net_value = db.Column(db.Float)
+    commission_base = db.Column(db.Float)
+    paid_amount = db.Column(db.Float)
+    rate_used = db.Column(db.Float)
+    full_commission = db.Column(db.Float)
+    payable_commission = db.Column(db.Float)
+    commission_remaining = db.Column(db.Float)
+    collection_ratio = db.Column(db.Float)
+
+    __table_args__ = (
+        db.Index('ix_run_transaction_run_person', 'calculation_run_id', 'person_name'),
+        db.Index('ix_run_transaction_run_month', 'calculation_run_id', 'month'),
+    )
+
+    def __repr__(self):
+        return f'<RunTransaction {self.id}: {self.person_name} {self.month}>'
+
 class CommissionRuleSet(db.Model):
     """
     Stores the commission brackets for each employment model.
@@ -119,7 +213,59 @@ class AppSetting(db.Model):
         if self.value_type == 'json':
             return json.loads(self.value)
         return self.value
-    
+
+
+class ConfigVersion(db.Model):
+    """
+    A single row stamped with a new version whenever an AppSetting or a
+    CommissionRuleSet row changes. Each worker process compares it with the
+    stamp of its cached engine configuration (see app/calculator/config.py).
+    """
+    __tablename__ = 'config_version'
+    ROW_ID = 1
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ConfigVersion {self.version} ({self.updated_at})>'
+
+    @classmethod
+    def current(cls):
+        """The current (version, updated_at) stamp in one primary-key read, or (0, None)."""
+        row = db.session.execute(
+            db.select(cls.version, cls.updated_at).where(cls.id == cls.ROW_ID)
+        ).first()
+        return tuple(row) if row is not None else (0, None)
+
+    @classmethod
+    def bump(cls, session):
+        """Stamps a new version inside the session's current transaction."""
+        table = cls.__table__
+        result = session.execute(
+            table.update().where(table.c.id == cls.ROW_ID)
+            .values(version=table.c.version + 1, updated_at=datetime.utcnow())
+        )
+        if result.rowcount == 0:
+            session.execute(table.insert().values(id=cls.ROW_ID, version=1, updated_at=datetime.utcnow()))
+
+
+# Configuration tables whose changes invalidate the cached engine configuration.
+CONFIG_MODELS = (AppSetting, CommissionRuleSet)
+
+@event.listens_for(Session, 'before_flush')
+def _bump_config_version_on_flush(session, flush_context, instances):
+    changed = (session.new | session.dirty | session.deleted)
+    if any(isinstance(obj, CONFIG_MODELS) for obj in changed):
+        ConfigVersion.bump(session)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _bump_config_version_on_bulk_change(orm_execute_state):
+    # Bulk query(...).update()/delete() calls bypass the flush.
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper is not None \
+            and orm_execute_state.bind_mapper.class_ in CONFIG_MODELS:
+        ConfigVersion.bump(orm_execute_state.session)
+
 class User(db.Model):
     """
     Stores user credentials for accessing personalized reports.
@@ -0,0 +1,349 @@
+# ==============================================================================
+# app/runs.py
+# ------------------------------------------------------------------------------
+# Persistence of finished calculations as CalculationRun / PersonResult rows.
+# Shared by the upload form and the `flask calc` batch command. Rows are
+# written in bulk (executemany in batches) inside the caller's transaction.
+# The detailed results are normalized into one PersonMonthResult row per
+# person and month and one RunTransaction row per transaction, so a report
+# loads only the slice it renders (load_run_results) instead of parsing the
+# whole nested result. The single JSON blob is optional (STORE_RESULTS_BLOB)
+# and can always be rebuilt for export (export_results_json).
+# ==============================================================================
+
+import json
+import logging
+import time
+from collections import namedtuple
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from flask import current_app
+from app import db
+from app.models import CalculationRun, PersonResult, PersonMonthResult, RunTransaction
+from app.calculator.store import (TransactionStore, TransactionSlice, NUMERIC_FIELDS, CODED_FIELDS,
+                                  dump_results, load_results)
+
+# Rows per executemany call when saving a run
+PERSIST_BATCH_ROWS = 5000
+# Store fields filled by Pass 1; the other numeric fields are added by Pass 2, in NUMERIC_FIELDS order.
+INPUT_FIELDS = ('net_value', 'commission_base', 'paid_amount')
+# RunTransaction column of each coded store field
+CODED_COLUMNS = {'role': 'role', 'company': 'company', 'person': 'person_name', 'invoice_link': 'invoice_link'}
+# RunTransaction columns read back into a store
+TRANSACTION_FIELDS = ['month', 'position', 'is_renewal'] + list(CODED_COLUMNS.values()) + list(NUMERIC_FIELDS)
+# Person-month keys with a column of their own; any others go to details_json.
+PERSON_MONTH_KEYS = ('model', 'bracket_base', 'transactions', 'total_commission', 'additional_bonus')
+# Per-person transaction sums kept on PersonMonthResult
+PERSON_MONTH_TOTALS = {
+    'net_value': 'total_net_sales',
+    'full_commission': 'total_full_commission',
+    'commission_remaining': 'total_pending_commission'
+}
+
+class PersistStats(namedtuple('PersistStats', ['rows', 'seconds'])):
+    """Rows inserted for a run and the seconds the inserts took."""
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds > 0 else float(self.rows)
+
+def save_calculation_run(filename, results, summary_data, targets_df, engine_mode, batch_rows=PERSIST_BATCH_ROWS):
+    """
+    Writes a CalculationRun with its PersonResult, PersonMonthResult and
+    RunTransaction rows. All rows are prepared first and then inserted with
+    executemany in batches of `batch_rows`, so the database write lock is
+    held only for the inserts. The caller commits (or rolls back).
+
+    Returns:
+        tuple: (CalculationRun, PersistStats of the inserts)
+    """
+    months_in_report = sorted(results.keys())
+    period_string = f"{months_in_report[0]} to {months_in_report[-1]}" if months_in_report else "N/A"
+    targets_json_str = targets_df.to_json(orient='records') if targets_df is not None else '[]'
+
+    saved_at = datetime.utcnow()
+    new_run = CalculationRun(
+        filename=filename,
+        report_period=period_string,
+        upload_timestamp=saved_at,
+        view_updated_at=saved_at,
+        detailed_results_json=dump_results(results) if current_app.config['STORE_RESULTS_BLOB'] else None,
+        month_summaries_json=json.dumps(_month_summaries(results), ensure_ascii=False),
+        targets_json=targets_json_str,
+        engine_mode=engine_mode,
+        input_fingerprints_json=json.dumps(results.fingerprints)
+    )
+    person_rows = [
+        {
+            'person_name': person_name, 'commission_model': data['commission_model'],
+            'total_original_commission': data['total_original_commission'],
+            'total_additional_bonus': data['total_additional_bonus'],
+            'total_payable_commission': data['total_payable_commission'],
+            'total_paid_commission': data['total_paid_commission'],
+            'total_full_commission': data['total_full_commission'],
+            'total_pending_commission': data['total_pending_commission'],
+            'remaining_balance': data['remaining_balance']
+        }
+        for person_name, data in summary_data.items()
+    ]
+    person_month_rows, transaction_rows = _result_rows(results)
+    new_run.frontend_view_json, person_views = _dump_frontend_views(results, summary_data, targets_df)
+    for row in person_rows:
+        row['report_view_json'] = person_views[row['person_name']]
+
+    started = time.perf_counter()
+    db.session.add(new_run)
+    db.session.flush()
+    row_count = 1
+    for model, rows in ((PersonResult, person_rows), (PersonMonthResult, person_month_rows),
+                        (RunTransaction, transaction_rows)):
+        insert = model.__table__.insert().values(calculation_run_id=new_run.id)
+        for first in range(0, len(rows), batch_rows):
+            db.session.execute(insert, rows[first:first + batch_rows])
+        row_count += len(rows)
+    stats = PersistStats(row_count, time.perf_counter() - started)
+    logging.info(f"Saved run {new_run.id}: {stats.rows:,} rows in {stats.seconds:.2f}s ({stats.rows_per_second:,.0f} rows/s).")
+    return new_run, stats
+
+def _month_summaries(results):
+    """The month-level results other than the people and their transactions, in month order."""
+    return {
+        month_key: {key: value for key, value in month_data.items() if key not in ('persons', 'transaction_store')}
+        for month_key, month_data in results.items()
+    }
+
+def _result_rows(results):
+    """
+    Flattens the results into PersonMonthResult and RunTransaction row mappings
+    (without the run id).
+
+    Returns:
+        tuple: (person-month rows, transaction rows)
+    """
+    person_month_rows, transaction_rows = [], []
+    for month_key, month_data in results.items():
+        store = month_data['transaction_store']
+        frame = pd.DataFrame({'position': np.arange(len(store))})
+        for field in CODED_FIELDS:
+            frame[CODED_COLUMNS[field]] = np.asarray(store.dictionaries[field], dtype=object)[store.columns[f'{field}_code']]
+        frame['is_renewal'] = store.columns['is_renewal']
+        for field in NUMERIC_FIELDS:
+            if field in store.columns:
+                frame[field] = store.columns[field]
+        frame.insert(0, 'month', month_key)
+        transaction_rows.extend(frame.to_dict('records'))
+
+        for person_name, person_data in month_data['persons'].items():
+            transactions = person_data['transactions']
+            details = {key: value for key, value in person_data.items() if key not in PERSON_MONTH_KEYS}
+            row = {
+                'month': month_key, 'person_name': person_name,
+                'commission_model': person_data['model'], 'bracket_base': person_data['bracket_base'],
+                'total_commission': person_data.get('total_commission', 0),
+                'additional_bonus': person_data.get('additional_bonus', 0),
+                'transaction_start': transactions.start, 'transaction_stop': transactions.stop,
+                'details_json': json.dumps(details, ensure_ascii=False) if details else None
+            }
+            for field, column in PERSON_MONTH_TOTALS.items():
+                row[column] = transactions.sum(field)
+            person_month_rows.append(row)
+    return person_month_rows, transaction_rows
+
+def load_run_results(run, person_name=None):
+    """
+    Loads a run's detailed results in the engine's layout (see store.py).
+
+    With person_name, only that person's transactions are read. Everyone's
+    person-month rows are still loaded, so month totals stay complete: the
+    other people get an empty transaction slice plus their stored sums under
+    'totals' (see main/utils.py).
+
+    Returns:
+        dict or None: The results, or None if the run has no detailed results.
+    """
+    if run.month_summaries_json is None:
+        # Saved before the results were normalized
+        return load_results(run.detailed_results_json) if run.detailed_results_json else None
+
+    person_rows = (PersonMonthResult.query
+                   .filter_by(calculation_run_id=run.id)
+                   .order_by(PersonMonthResult.id)
+                   .all())
+    stores = _month_stores(run, person_name)
+
+    results = {}
+    for month_key, summary in json.loads(run.month_summaries_json).items():
+        store = stores[month_key] if month_key in stores else _store_from_rows(pd.DataFrame(columns=TRANSACTION_FIELDS))
+        results[month_key] = {'persons': {}, 'transaction_store': store, **summary}
+    for row in person_rows:
+        month_data = results[row.month]
+        if person_name is None:
+            transactions = TransactionSlice(month_data['transaction_store'], row.transaction_start, row.transaction_stop)
+        elif row.person_name == person_name:
+            transactions = TransactionSlice(month_data['transaction_store'], 0, row.transaction_stop - row.transaction_start)
+        else:
+            transactions = TransactionSlice(month_data['transaction_store'], 0, 0)
+        person_data = {
+            'model': row.commission_model, 'bracket_base': row.bracket_base, 'transactions': transactions,
+            'total_commission': row.total_commission, 'additional_bonus': row.additional_bonus
+        }
+        if row.details_json:
+            person_data.update(json.loads(row.details_json))
+        if person_name is not None and row.person_name != person_name:
+            person_data['totals'] = {field: getattr(row, column) for field, column in PERSON_MONTH_TOTALS.items()}
+        month_data['persons'][row.person_name] = person_data
+    return results
+
+def load_run_transactions(run, person_name=None):
+    """
+    The transactions of a run (or of one person) in one query, without the
+    other results.
+
+    Returns:
+        dict: month -> {person name: TransactionSlice}
+    """
+    slices = {}
+    for month_key, store in _month_stores(run, person_name).items():
+        # A person's transactions are contiguous in the month's store.
+        person_codes = store.columns['person_code']
+        starts = np.flatnonzero(np.r_[True, person_codes[1:] != person_codes[:-1]])
+        stops = np.r_[starts[1:], len(person_codes)]
+        slices[month_key] = {
+            store.dictionaries['person'][person_codes[start]]: TransactionSlice(store, int(start), int(stop))
+            for start, stop in zip(starts, stops)
+        }
+    return slices
+
+def load_person_month(run, month_key, person_name):
+    """
+    One person's results for one month of a run, with only their
+    transactions of that month read (for the report's explanations, which
+    are rendered when a section of the page is opened).
+
+    Returns:
+        dict or None: The person-month in the engine's layout, or None if the
+            run has no such results.
+    """
+    if run.month_summaries_json is None:
+        results = load_run_results(run, person_name)
+        return (results or {}).get(month_key, {}).get('persons', {}).get(person_name)
+
+    row = PersonMonthResult.query.filter_by(calculation_run_id=run.id, month=month_key, person_name=person_name).first()
+    if row is None:
+        return None
+    store = _store_from_rows(_read_transactions(run, person_name, month_key))
+    person_data = {
+        'model': row.commission_model, 'bracket_base': row.bracket_base,
+        'transactions': TransactionSlice(store, 0, len(store)),
+        'total_commission': row.total_commission, 'additional_bonus': row.additional_bonus
+    }
+    if row.details_json:
+        person_data.update(json.loads(row.details_json))
+    return person_data
+
+def _read_transactions(run, person_name=None, month_key=None):
+    """A run's RunTransaction rows (everyone's or one person's, optionally of one month) as a DataFrame in month and position order."""
+    query = (db.select(*(getattr(RunTransaction, field) for field in TRANSACTION_FIELDS))
+             .where(RunTransaction.calculation_run_id == run.id)
+             .order_by(RunTransaction.month, RunTransaction.position))
+    if person_name is not None:
+        query = query.where(RunTransaction.person_name == person_name)
+    if month_key is not None:
+        query = query.where(RunTransaction.month == month_key)
+    return pd.DataFrame(db.session.execute(query).all(), columns=TRANSACTION_FIELDS)
+
+def _month_stores(run, person_name=None):
+    """month -> TransactionStore of the run's transactions (everyone's or one person's); months without any are left out."""
+    transactions = _read_transactions(run, person_name)
+    return {month_key: _store_from_rows(rows) for month_key, rows in transactions.groupby('month', sort=False)}
+
+def _store_from_rows(rows):
+    """Rebuilds a month's TransactionStore from its RunTransaction rows, in position order."""
+    store = TransactionStore.from_arrays(
+        rows['is_renewal'].to_numpy(dtype=bool),
+        {field: rows[field].to_numpy(dtype=float) for field in INPUT_FIELDS},
+        {field: rows[column].to_numpy(dtype=object) for field, column in CODED_COLUMNS.items()}
+    )
+    for field in NUMERIC_FIELDS:
+        if field not in INPUT_FIELDS:
+            store.columns[field] = rows[field].to_numpy(dtype=float)
+    return store
+
+def _dump_frontend_views(results, summary_data, targets_df):
+    """The materialized view of a run as JSON: (team view, {person name: person view})."""
+    # Imported here: app.main imports this module through its routes.
+    from app.main.utils import build_frontend_view, split_frontend_view
+    team_view, person_views = split_frontend_view(build_frontend_view(results, summary_data, targets_df))
+    return (json.dumps(team_view, ensure_ascii=False),
+            {person: json.dumps(view, ensure_ascii=False) for person, view in person_views.items()})
+
+def run_summary_data(run):
+    """The per-person summary of a run from its PersonResult rows, as returned by summarize_results."""
+    return {
+        res.person_name: {
+            'person_name': res.person_name, 'commission_model': res.commission_model,
+            'total_original_commission': res.total_original_commission,
+            'total_additional_bonus': res.total_additional_bonus,
+            'total_payable_commission': res.total_payable_commission,
+            'total_paid_commission': res.total_paid_commission,
+            'total_full_commission': res.total_full_commission,
+            'total_pending_commission': res.total_pending_commission,
+            'remaining_balance': res.remaining_balance
+        }
+        for res in run.person_results.order_by(PersonResult.id)
+    }
+
+def run_targets_df(run):
+    """The 'Additional commissions' sheet the run was calculated with."""
+    return pd.read_json(run.targets_json, orient='records') if run.targets_json else pd.DataFrame()
+
+def load_report_data(run, person_name=None):
+    """
+    The frontend data of a run's report (see main/utils.py), narrowed to
+    person_name if given. Reads the team view materialized with the run, the
+    view of each person shown (PersonResult.report_view_json) and their
+    transactions. Runs saved without views in the current format are
+    aggregated on the fly.
+
+    Returns:
+        dict or None: The frontend data, or None if the run has no detailed results.
+    """
+    from app.main.utils import prepare_frontend_data, join_frontend_view, FRONTEND_VIEW_FORMAT
+    team_view = json.loads(run.frontend_view_json) if run.frontend_view_json else None
+    if team_view is None or team_view.get('format') != FRONTEND_VIEW_FORMAT:
+        results = load_run_results(run, person_name)
+        if results is None:
+            return None
+        return prepare_frontend_data(results, run_summary_data(run), run_targets_df(run), filter_person_name=person_name)
+
+    query = db.select(PersonResult.person_name, PersonResult.report_view_json).where(PersonResult.calculation_run_id == run.id)
+    if person_name is not None:
+        query = query.where(PersonResult.person_name == person_name)
+    person_views = {name: json.loads(view) for name, view in db.session.execute(query) if view}
+    frontend_data = join_frontend_view(team_view, person_views)
+
+    transactions = load_run_transactions(run, person_name)
+    for month_key, month_data in frontend_data['detailedReport'].items():
+        month_transactions = transactions.get(month_key, {})
+        for name, person_data in month_data['persons'].items():
+            person_data['transactions'] = month_transactions.get(name, [])
+    return frontend_data
+
+def refresh_frontend_view(run):
+    """Recomputes a run's materialized views from its stored results. The caller commits."""
+    results = load_run_results(run)
+    if results is None:
+        return False
+    run.frontend_view_json, person_views = _dump_frontend_views(results, run_summary_data(run), run_targets_df(run))
+    for person_result in run.person_results:
+        person_result.report_view_json = person_views.get(person_result.person_name)
+    run.view_updated_at = datetime.utcnow()
+    return True
+
+def export_results_json(run):
+    """The run's detailed results as one JSON document: the stored blob, or rebuilt from the tables."""
+    if run.detailed_results_json:
+        return run.detailed_results_json
+    results = load_run_results(run)
+    return dump_results(results if results is not None else {})
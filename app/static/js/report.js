@@ -2,8 +2,9 @@
 // app/static/js/report.js
 // ------------------------------------------------------------------------------
 // JavaScript for the main report page interactivity, including filtering,
-// chart rendering, and dynamic link updates. It consumes the `frontendData`
-// object that is embedded in the report.html template.
+// chart rendering, dynamic link updates and loading the calculation
+// explanations. It consumes the `frontendData` object that is embedded in the
+// report.html template.
 // ==============================================================================
 
 document.addEventListener('DOMContentLoaded', function () {
@@ -23,6 +24,7 @@ document.addEventListener('DOMContentLoaded', function () {
     } else {
         console.error("Frontend data object not found. Cannot initialize report interactivity.");
     }
+    initializeExplanations();
 
 
     // ==========================================================================
@@ -209,4 +211,47 @@ document.addEventListener('DOMContentLoaded', function () {
            }
        }
     }
-});
\ No newline at end of file
+
+    // ==========================================================================
+    // CALCULATION EXPLANATIONS
+    // ==========================================================================
+    // Each [data-explain-url] element is filled when the collapse holding it
+    // is first opened: the fragment has one .calculation-details block per
+    // .calculation-slot of the element, in the same order.
+    function initializeExplanations() {
+        document.addEventListener('show.bs.collapse', function (event) {
+            const owned = Array.from(event.target.querySelectorAll('[data-explain-url]'))
+                .filter(element => element.closest('.collapse') === event.target);
+            owned.forEach(loadExplanations);
+        });
+    }
+
+    function loadExplanations(element) {
+        if (element.dataset.explainState) {
+            return;
+        }
+        element.dataset.explainState = 'loading';
+        fetch(element.dataset.explainUrl, { credentials: 'same-origin' })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error('HTTP ' + response.status);
+                }
+                return response.text();
+            })
+            .then(html => {
+                const fragment = document.createElement('div');
+                fragment.innerHTML = html;
+                const blocks = fragment.querySelectorAll('.calculation-details');
+                element.querySelectorAll('.calculation-slot').forEach((slot, index) => {
+                    if (blocks[index]) {
+                        slot.replaceWith(blocks[index]);
+                    }
+                });
+                element.dataset.explainState = 'loaded';
+            })
+            .catch(error => {
+                delete element.dataset.explainState; // Retried the next time the section opens
+                console.error("Could not load the calculation details:", error);
+            });
+    }
+});
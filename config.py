@@ -36,14 +36,74 @@ class Config:
     # Disable an SQLAlchemy feature that is not needed and adds overhead.
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Results are stored as PersonMonthResult / RunTransaction rows. Set this to
+    # also keep the whole nested result as one JSON blob on each run; it can
+    # always be exported from the history page either way.
+    STORE_RESULTS_BLOB = os.environ.get('STORE_RESULTS_BLOB', '').lower() in ('1', 'true', 'yes')
+
     # --- File Upload Configuration ---
-    # Defines the folder where uploaded files will be temporarily stored.
+    # Uploads are parsed straight from the request stream. With KEEP_UPLOADS,
+    # a copy of each distinct upload is kept in UPLOAD_FOLDER, named by its SHA-256.
     UPLOAD_FOLDER = os.path.join(basedir, 'instance/uploads')
+    KEEP_UPLOADS = os.environ.get('KEEP_UPLOADS', '').lower() in ('1', 'true', 'yes')
+
+    # Each calculation run gets a unique scratch directory under this root
+    # (None: the system temporary directory), removed when the run ends.
+    RUN_WORKSPACE_ROOT = os.environ.get('RUN_WORKSPACE_ROOT') or None
     
-    # Specifies the allowed file extension for uploads.
-    ALLOWED_EXTENSIONS = {'.xlsx'}
+    # Full data-quality reports (CSV) of uploaded workbooks, offered for download
+    # to the session that uploaded them. Reports older than QUALITY_REPORT_MAX_AGE
+    # seconds are deleted when a new one is written.
+    QUALITY_REPORT_FOLDER = os.path.join(basedir, 'instance/quality_reports')
+    QUALITY_REPORT_MAX_AGE = int(os.environ.get('QUALITY_REPORT_MAX_AGE', 24 * 3600))
+
+    # Specifies the allowed file extensions for uploads: an Excel workbook, or a
+    # .zip bundle of one CSV or Parquet file per sheet (see calculator/bundle.py).
+    ALLOWED_EXTENSIONS = {'.xlsx', '.zip'}
 
     # Optional: Set a maximum file size for uploads (e.g., 16 MB)
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
     
-    WKHTMLTOPDF_PATH = os.environ.get('WKHTMLTOPDF_PATH') or None
\ No newline at end of file
+    WKHTMLTOPDF_PATH = os.environ.get('WKHTMLTOPDF_PATH') or None
+
+    # --- Cache ---
+    # Rendered report pages, engine configuration snapshots and parsed workbooks
+    # go through this cache (see app/cache.py). Backends: 'memory' (this process
+    # only), 'filesystem' or 'sqlite' (shared by the workers of a node; CACHE_URL
+    # is the directory or database file), 'redis' (shared by every node; CACHE_URL
+    # is redis://[:password@]host[:port][/db]) or 'none'.
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory').lower()
+    CACHE_URL = os.environ.get('CACHE_URL') or os.path.join(basedir, 'instance/cache')
+    # Least recently used entries are evicted beyond this size (memory,
+    # filesystem and sqlite; a Redis server uses its own maxmemory policy).
+    CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    # Entries expire after this many seconds; 0 keeps them until evicted.
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 7 * 24 * 3600))
+    # Change it to separate deployments sharing one cache server.
+    CACHE_KEY_PREFIX = os.environ.get('CACHE_KEY_PREFIX', 'asanito')
+
+    # Runs listed per page of the history (keyset pagination, newest first).
+    HISTORY_PAGE_SIZE = int(os.environ.get('HISTORY_PAGE_SIZE', 20))
+
+    # --- Calculation Engine ---
+    # Worker processes used to calculate months in parallel (Pass 2 & 3).
+    # 1 keeps the calculation in the request process; 0 uses every CPU core.
+    ENGINE_WORKERS = int(os.environ.get('ENGINE_WORKERS', 1))
+    # Worker processes used to read the sheets of an upload concurrently; a
+    # large 'Sales data' sheet is split into row ranges across them.
+    PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', 1))
+
+    # Uploads larger than this are calculated in streaming mode: 'Sales data' is
+    # read STREAMING_CHUNK_ROWS rows at a time and its transactions are spilled
+    # to disk, so reading and validating use memory bounded by the chunk size.
+    # The calculated results still keep every transaction (in compact column
+    # arrays) until the run is saved, so peak memory still grows with the row
+    # count, only much more slowly than a whole-sheet read.
+    STREAMING_THRESHOLD_BYTES = int(os.environ.get('STREAMING_THRESHOLD_BYTES', 4 * 1024 * 1024))
+    STREAMING_CHUNK_ROWS = int(os.environ.get('STREAMING_CHUNK_ROWS', 5000))
+
+    # Validated workbooks are cached on disk by content hash, so re-uploading
+    # the same file skips the Excel parse. Least recently used entries are
+    # evicted beyond WORKBOOK_CACHE_MAX_BYTES; 0 disables the cache.
+    WORKBOOK_CACHE_DIR = os.environ.get('WORKBOOK_CACHE_DIR') or os.path.join(basedir, 'instance/workbook_cache')
+    WORKBOOK_CACHE_MAX_BYTES = int(os.environ.get('WORKBOOK_CACHE_MAX_BYTES', 256 * 1024 * 1024))
\ No newline at end of file
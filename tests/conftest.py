@@ -1,22 +1,66 @@
 # tests/conftest.py
 
 import pytest
+import pandas as pd
+from io import StringIO
 
 @pytest.fixture(scope="module")
-def app_with_db():
+def app_with_db(tmp_path_factory):
     """
     Creates a new app instance for a test module, sets up an in-memory database,
-    and yields the app within an application context.
+    and yields the app within an application context. Files the app writes
+    (workbook cache, uploads, quality reports) go to a temporary directory.
     """
     from app import create_app, db
+    from config import Config
 
-    app = create_app()
-    app.config.update({
-        "TESTING": True,
-        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"
-    })
+    files = tmp_path_factory.mktemp('instance')
+
+    class TestConfig(Config):
+        # Set before create_app: Flask-SQLAlchemy creates its engine there.
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+        WORKBOOK_CACHE_DIR = str(files / 'workbook_cache')
+        UPLOAD_FOLDER = str(files / 'uploads')
+        QUALITY_REPORT_FOLDER = str(files / 'quality_reports')
+        CACHE_URL = str(files / 'cache')
+
+    app = create_app(TestConfig)
 
     with app.app_context():
         db.create_all()
         yield app  # The tests will run here
-        db.drop_all()
\ No newline at end of file
+        db.drop_all()
+
+@pytest.fixture
+def demo_dataframes():
+    """Provides the test case data as a dictionary of pandas DataFrames."""
+    # Note: 'درصد پلن های آسانیتویی' column is still here but should be ignored by engine
+    sales_data_csv = """بازاریاب,مذاکره کننده ارشد,هماهنگ کننده فروش,شرکت خریدار,مبلغ کل خالص فاکتور,وصول شده,کل مبلغ مبنای پورسانت,ماه,سال,تمدید اشتراک,درصد پلن های آسانیتویی,نسخه پلن
+,آمانج کردستانی,آمانج کردستانی,شرکت آلفا (فروش مستقیم),"300,000,000","300,000,000","300,000,000",1,1404,خیر,100,استاندارد
+,آمانج کردستانی,آمانج کردستانی,شرکت بتا (فروش با نماینده),"200,000,000","200,000,000","200,000,000",1,1404,خیر,50,استاندارد
+,پریناز لواسانی,پریناز لواسانی,شرکت گاما (تمدید),"50,000,000","50,000,000","50,000,000",1,1404,بله,100,حرفه‌ای
+,پریناز لواسانی,پریناز لواسانی,شرکت دلتا (فاقد شرایط پله),"100,000,000","10,000,000","100,000,000",1,1404,خیر,100,استاندارد
+,آمانج کردستانی,آمانج کردستانی,شرکت امگا (فروش ماه دوم),"800,000,000","800,000,000","800,000,000",2,1404,خیر,100,VIP
+"""
+    employee_models_csv = "نام,مدل همکاری\nآمانج کردستانی,پورسانت خالص\nپریناز لواسانی,حقوق ثابت + پورسانت"
+    additional_commissions_csv = "سال,ماه,تارگت جمعی,درصد اضافه جمعی,تارگت فرعی,درصد اضافه فرعی,درصد تاپ سلر\n1404,1,45000000,5,35000000,3,2\n1404,2,,5,,3,2"
+    commissions_paid_csv = "نام,مبلغ پرداخت شده\nآمانج کردستانی,10000000"
+    
+    return {
+        'Sales data': pd.read_csv(StringIO(sales_data_csv)),
+        'Employee Models': pd.read_csv(StringIO(employee_models_csv)),
+        'Additional commissions': pd.read_csv(StringIO(additional_commissions_csv)),
+        'Commissions paid': pd.read_csv(StringIO(commissions_paid_csv))
+    }
+
+@pytest.fixture
+def write_workbook():
+    """Provides a function writing sheets (plus the required 'Renew' sheet) to an .xlsx workbook."""
+    def write(path, dataframes):
+        sheets = dict(dataframes)
+        sheets['Renew'] = pd.DataFrame({'سال': [1404], 'ماه': [1], 'درصد تمدید': [5]})
+        with pd.ExcelWriter(path) as writer:
+            for sheet_name, df in sheets.items():
+                df.to_excel(writer, sheet_name=sheet_name, index=False)
+    return write
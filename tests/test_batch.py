@@ -0,0 +1,28 @@
+# tests/test_batch.py
+
+import logging
+import pandas as pd
+
+
+def test_calc_command_saves_each_workbook(demo_dataframes, app_with_db, tmp_path, caplog, write_workbook):
+    """`flask calc` calculates a directory of workbooks in parallel and reports the broken ones."""
+    from app.seed import seed_data
+    from app.models import CalculationRun
+
+    seed_data()
+    for name in ['team_a.xlsx', 'team_b.xlsx']:
+        write_workbook(tmp_path / name, demo_dataframes)
+    with pd.ExcelWriter(tmp_path / 'broken.xlsx') as writer:
+        demo_dataframes['Sales data'].to_excel(writer, sheet_name='Sales data', index=False)
+
+    runs_before = CalculationRun.query.count()
+    # Live logging (log_cli) swaps sys.stdout back while the runner captures the command output.
+    caplog.set_level(logging.CRITICAL)
+    result = app_with_db.test_cli_runner().invoke(args=['calc', str(tmp_path), '--workers', '2'])
+
+    assert result.exit_code == 1  # One workbook failed validation
+    assert 'Saved 2 of 3 workbooks' in result.output
+    assert 'Errors in broken.xlsx' in result.output
+    new_runs = CalculationRun.query.order_by(CalculationRun.id).all()[runs_before:]
+    assert sorted(run.filename for run in new_runs) == ['team_a.xlsx', 'team_b.xlsx']
+    assert all(run.person_results.count() == 2 for run in new_runs)
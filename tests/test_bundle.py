@@ -0,0 +1,65 @@
+# tests/test_bundle.py
+
+import os
+import zipfile
+import pandas as pd
+import pytest
+from app.calculator.validator import validate_excel_file
+
+
+def write_bundle(path, dataframes, extension):
+    sheets = dict(dataframes)
+    sheets['Renew'] = pd.DataFrame({'سال': [1404], 'ماه': [1], 'درصد تمدید': [5]})
+    with zipfile.ZipFile(path, 'w') as archive:
+        for sheet_name, df in sheets.items():
+            if extension == '.csv':
+                archive.writestr(f'export/{sheet_name}.csv', df.to_csv(index=False))
+            else:
+                archive.writestr(f'export/{sheet_name}.parquet', df.to_parquet(index=False))
+
+@pytest.mark.parametrize('extension', ['.csv', '.parquet'])
+def test_bundle_reads_like_the_workbook(demo_dataframes, tmp_path, write_workbook, extension):
+    """A .zip of per-sheet CSV or Parquet files yields the same DataFrames as the .xlsx workbook."""
+    if extension == '.csv':
+        # A text cell in a column of numbers: ints plus a string, as in the workbook
+        sales = demo_dataframes['Sales data'].astype({'ماه': object})
+        sales.loc[3, 'ماه'] = 'نامشخص'
+        demo_dataframes = {**demo_dataframes, 'Sales data': sales}
+    write_workbook(tmp_path / 'demo.xlsx', demo_dataframes)
+    write_bundle(tmp_path / 'demo.zip', demo_dataframes, extension)
+
+    expected, errors = validate_excel_file(tmp_path / 'demo.xlsx')
+    dataframes, errors = validate_excel_file(tmp_path / 'demo.zip')
+    assert errors == [] and list(dataframes) == list(expected)
+    for sheet_name, df in expected.items():
+        pd.testing.assert_frame_equal(dataframes[sheet_name], df)
+
+def test_bundle_goes_through_the_same_rules(demo_dataframes, tmp_path, write_workbook):
+    """Missing sheets, missing columns and non-numeric amounts are reported as for a workbook."""
+    sales = demo_dataframes['Sales data'].astype(object)
+    sales.loc[2, 'وصول شده'] = 'نامشخص'
+    broken = {**demo_dataframes, 'Sales data': sales,
+              'Employee Models': demo_dataframes['Employee Models'].drop(columns=['مدل همکاری'])}
+    write_workbook(tmp_path / 'broken.xlsx', broken)
+    write_bundle(tmp_path / 'broken.zip', broken, '.csv')
+
+    assert validate_excel_file(tmp_path / 'broken.zip') == validate_excel_file(tmp_path / 'broken.xlsx')
+    del broken['Commissions paid']
+    write_bundle(tmp_path / 'missing.zip', broken, '.csv')
+    assert "'Commissions paid'" in validate_excel_file(tmp_path / 'missing.zip')[1][0]
+
+def test_kept_bundle_upload_keeps_its_extension(demo_dataframes, app_with_db, tmp_path):
+    """With KEEP_UPLOADS, an uploaded .zip bundle is stored as <hash>.zip."""
+    from app.seed import seed_data
+    from app.calculator.workbook_cache import hash_file
+
+    seed_data()
+    path = tmp_path / 'demo.zip'
+    write_bundle(path, demo_dataframes, '.csv')
+    app_with_db.config.update(KEEP_UPLOADS=True, UPLOAD_FOLDER=str(tmp_path / 'uploads'))
+    client = app_with_db.test_client()
+    with client.session_transaction() as sess:
+        sess['admin_logged_in'] = True
+    with open(path, 'rb') as f:
+        assert '/admin/report/' in client.post('/', data={'file': (f, 'Demo.ZIP')}).headers['Location']
+    assert os.listdir(tmp_path / 'uploads') == [f'{hash_file(path)}.zip']
@@ -0,0 +1,140 @@
+# tests/test_cache.py
+
+import socketserver
+import threading
+import time
+import pytest
+from app.cache import Cache, MemoryBackend, FileSystemBackend, SQLiteBackend, RedisBackend
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    """Just enough of the Redis protocol for RedisBackend: PING, AUTH, SELECT, GET, SET [PX], DEL."""
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2])
+            command = args[0].upper()
+            now = time.time()
+            if command == b'GET':
+                value, expires = store.get(args[1], (None, 0))
+                if value is None or (expires and expires <= now):
+                    self.wfile.write(b'$-1\r\n')
+                else:
+                    self.wfile.write(b'$%d\r\n%s\r\n' % (len(value), value))
+            elif command == b'SET':
+                expires = now + int(args[4]) / 1000 if len(args) == 5 and args[3].upper() == b'PX' else 0
+                store[args[1]] = (args[2], expires)
+                self.wfile.write(b'+OK\r\n')
+            elif command == b'DEL':
+                self.wfile.write(b':%d\r\n' % (store.pop(args[1], None) is not None))
+            elif command in (b'PING', b'AUTH', b'SELECT'):
+                self.wfile.write(b'+OK\r\n')
+            else:
+                self.wfile.write(b'-ERR unknown command\r\n')
+
+@pytest.fixture(scope="module")
+def redis_url():
+    """A local Redis-protocol stand-in server, for the redis backend."""
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), RespHandler)
+    server.daemon_threads = True
+    server.store = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"redis://127.0.0.1:{server.server_address[1]}/1"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(params=['memory', 'filesystem', 'sqlite', 'redis'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryBackend(1024 * 1024)
+    if request.param == 'filesystem':
+        return FileSystemBackend(str(tmp_path / 'cache'), 1024 * 1024)
+    if request.param == 'sqlite':
+        return SQLiteBackend(str(tmp_path / 'cache.db'), 1024 * 1024)
+    return RedisBackend(request.getfixturevalue('redis_url'))
+
+
+def test_backends_store_versioned_values_until_they_expire(backend):
+    """Every backend round-trips pickled values; a new version misses and entries expire after their TTL."""
+    cache = Cache(backend, prefix=f'test-{time.time()}')
+    cache.set('report', 'page', b'<html>', version=1)
+    cache.set('engine-config', 'snapshot', {'rate': 0.05}, version=(3, None))
+    assert cache.get('report', 'page', version=1) == b'<html>'
+    assert cache.get('engine-config', 'snapshot', version=(3, None)) == {'rate': 0.05}
+    assert cache.get('report', 'page', version=2) is None
+
+    cache.delete('report', 'page', version=1)
+    assert cache.get('report', 'page', version=1) is None
+
+    cache.set('report', 'short-lived', b'x', ttl=0.05)
+    assert cache.get('report', 'short-lived') == b'x'
+    time.sleep(0.1)
+    assert cache.get('report', 'short-lived') is None
+
+@pytest.mark.parametrize('make_backend', [
+    lambda tmp_path: MemoryBackend(2500),
+    lambda tmp_path: FileSystemBackend(str(tmp_path / 'cache'), 2500 + 2 * 8),
+    lambda tmp_path: SQLiteBackend(str(tmp_path / 'cache.db'), 2500),
+])
+def test_local_backends_evict_least_recently_used(make_backend, tmp_path):
+    """Beyond its size bound, a backend drops the entries used longest ago."""
+    backend = make_backend(tmp_path)
+    backend.set('a', b'a' * 1000)
+    time.sleep(0.01)
+    backend.set('b', b'b' * 1000)
+    time.sleep(0.01)
+    assert backend.get('a') is not None  # 'b' is now the least recently used
+    time.sleep(0.01)
+    backend.set('c', b'c' * 1000)
+    assert backend.get('a') is not None and backend.get('c') is not None
+    assert backend.get('b') is None
+
+def test_unreachable_cache_server_is_a_miss():
+    """A failing backend degrades to cache misses instead of failing the request."""
+    cache = Cache(RedisBackend('redis://127.0.0.1:1', timeout=0.2))
+    cache.set('report', 'page', b'<html>')
+    assert cache.get('report', 'page') is None
+
+def test_workers_share_config_snapshots_and_workbooks(demo_dataframes, app_with_db, redis_url, tmp_path, monkeypatch):
+    """With a shared backend, another worker loads the engine configuration and parsed workbooks from the cache."""
+    import pickle
+    from app.seed import seed_data
+    from app.cache import get_shared_cache
+    from app.calculator import config as engine_config
+    from app.calculator.workbook_cache import WorkbookCache
+
+    seed_data()
+    configured = {key: app_with_db.config[key] for key in ('CACHE_BACKEND', 'CACHE_URL')}
+    app_with_db.config.update(CACHE_BACKEND='redis', CACHE_URL=redis_url)
+    app_with_db.extensions.pop('cache', None)
+    try:
+        shared = get_shared_cache()
+        monkeypatch.setattr(engine_config, '_cached_config', None)
+        built = engine_config.get_engine_config()
+
+        # Another worker: nothing cached in its process, and no database read of the rules.
+        def fail(*args, **kwargs):
+            raise AssertionError("the configuration was loaded from the database")
+        monkeypatch.setattr(engine_config, '_cached_config', None)
+        monkeypatch.setattr(engine_config, 'load_engine_config', fail)
+        loaded = engine_config.get_engine_config()
+        assert loaded is not built and loaded.version == built.version
+        assert loaded.settings() == built.settings() and loaded.rule_index.version == built.rule_index.version
+
+        # A workbook stored on one node is copied to another node's directory (and survives pickling for workers).
+        first = WorkbookCache(str(tmp_path / 'node-1'), 10 * 1024 * 1024, shared)
+        second = pickle.loads(pickle.dumps(WorkbookCache(str(tmp_path / 'node-2'), 10 * 1024 * 1024, shared)))
+        first.put('a' * 64, demo_dataframes)
+        assert 'a' * 64 in second
+        stored, copied = first.get('a' * 64), second.get('a' * 64)
+        assert all(copied[sheet_name].equals(df) for sheet_name, df in stored.items())
+    finally:
+        app_with_db.config.update(configured)
+        app_with_db.extensions.pop('cache', None)
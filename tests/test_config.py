@@ -0,0 +1,62 @@
+# tests/test_config.py
+
+import pickle
+import pytest
+from flask import has_app_context
+from app.calculator.config import EngineConfig
+from app.calculator.rules import BracketRule
+
+BRACKETS = [
+    BracketRule('پورسانت خالص', 0, 250000000, 0.05, 0.10, 0.02),
+    BracketRule('پورسانت خالص', 250000000, 500000000, 0.06, 0.12, 0.04),
+    BracketRule('حقوق ثابت + پورسانت', 0, 150000000, 0.00, 0.00, 0.00),
+    BracketRule('حقوق ثابت + پورسانت', 150000000, 250000000, 0.05, 0.05, 0.01),
+]
+
+def test_engine_runs_from_snapshot_without_app_context(demo_dataframes):
+    """The engine core only needs the DataFrames and an EngineConfig: no app context, no database."""
+    from app.calculator.engine import run_engine, summarize_results
+
+    assert not has_app_context()
+    config = pickle.loads(pickle.dumps(EngineConfig({'RENEWAL_COMMISSION_RATE': 0.05}, BRACKETS)))
+    assert config.CURRENCY_CONVERSION_FACTOR == 0.1  # Missing settings fall back to the defaults
+    assert config.rule_index.version
+
+    results = run_engine(demo_dataframes, config)
+    summary = summarize_results(results, demo_dataframes['Commissions paid'], config)
+    assert summary['آمانج کردستانی']['total_payable_commission'] == pytest.approx(28_600_000)
+    assert summary['پریناز لواسانی']['total_payable_commission'] == pytest.approx(500_000)
+
+    # Overrides produce a new snapshot and leave the original untouched.
+    renewal_free = config.replace(settings={'RENEWAL_COMMISSION_RATE': 0})
+    assert config.RENEWAL_COMMISSION_RATE == 0.05 and renewal_free.rules == config.rules
+    summary = summarize_results(run_engine(demo_dataframes, renewal_free), demo_dataframes['Commissions paid'], renewal_free)
+    assert summary['پریناز لواسانی']['total_payable_commission'] == pytest.approx(0)
+
+def test_cached_config_reloads_only_after_a_version_bump(app_with_db):
+    """get_engine_config returns the same snapshot until a setting or rule change stamps a new version."""
+    from concurrent.futures import ThreadPoolExecutor
+    from app import db
+    from app.seed import seed_data
+    from app.models import AppSetting, ConfigVersion
+    from app.calculator.config import get_engine_config
+
+    seed_data()
+    config = get_engine_config()
+    assert get_engine_config() is config
+
+    def config_in_thread(_):
+        with app_with_db.app_context():
+            return get_engine_config()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert all(c is config for c in executor.map(config_in_thread, range(8)))
+
+    version = ConfigVersion.current()
+    setting = AppSetting.query.filter_by(key='RENEWAL_COMMISSION_RATE').first()
+    setting.value = '0.07'
+    db.session.commit()
+    assert ConfigVersion.current()[0] == version[0] + 1
+
+    reloaded = get_engine_config()
+    assert reloaded is not config and reloaded.RENEWAL_COMMISSION_RATE == pytest.approx(0.07)
+    assert config.RENEWAL_COMMISSION_RATE != reloaded.RENEWAL_COMMISSION_RATE  # Old snapshot is untouched
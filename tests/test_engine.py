@@ -2,33 +2,9 @@
 # tests/test_engine.py
 
 import pytest
-import pandas as pd
-from io import StringIO
 import json
 
-# The app_with_db fixture is now automatically available from conftest.py
-
-@pytest.fixture
-def demo_dataframes():
-    """Provides the test case data as a dictionary of pandas DataFrames."""
-    # Note: 'درصد پلن های آسانیتویی' column is still here but should be ignored by engine
-    sales_data_csv = """بازاریاب,مذاکره کننده ارشد,هماهنگ کننده فروش,شرکت خریدار,مبلغ کل خالص فاکتور,وصول شده,کل مبلغ مبنای پورسانت,ماه,سال,تمدید اشتراک,درصد پلن های آسانیتویی,نسخه پلن
-,آمانج کردستانی,آمانج کردستانی,شرکت آلفا (فروش مستقیم),"300,000,000","300,000,000","300,000,000",1,1404,خیر,100,استاندارد
-,آمانج کردستانی,آمانج کردستانی,شرکت بتا (فروش با نماینده),"200,000,000","200,000,000","200,000,000",1,1404,خیر,50,استاندارد
-,پریناز لواسانی,پریناز لواسانی,شرکت گاما (تمدید),"50,000,000","50,000,000","50,000,000",1,1404,بله,100,حرفه‌ای
-,پریناز لواسانی,پریناز لواسانی,شرکت دلتا (فاقد شرایط پله),"100,000,000","10,000,000","100,000,000",1,1404,خیر,100,استاندارد
-,آمانج کردستانی,آمانج کردستانی,شرکت امگا (فروش ماه دوم),"800,000,000","800,000,000","800,000,000",2,1404,خیر,100,VIP
-"""
-    employee_models_csv = "نام,مدل همکاری\nآمانج کردستانی,پورسانت خالص\nپریناز لواسانی,حقوق ثابت + پورسانت"
-    additional_commissions_csv = "سال,ماه,تارگت جمعی,درصد اضافه جمعی,تارگت فرعی,درصد اضافه فرعی,درصد تاپ سلر\n1404,1,45000000,5,35000000,3,2\n1404,2,,5,,3,2"
-    commissions_paid_csv = "نام,مبلغ پرداخت شده\nآمانج کردستانی,10000000"
-    
-    return {
-        'Sales data': pd.read_csv(StringIO(sales_data_csv)),
-        'Employee Models': pd.read_csv(StringIO(employee_models_csv)),
-        'Additional commissions': pd.read_csv(StringIO(additional_commissions_csv)),
-        'Commissions paid': pd.read_csv(StringIO(commissions_paid_csv))
-    }
+# The app_with_db and demo_dataframes fixtures are automatically available from conftest.py
 
 # --- THE MAIN TEST FUNCTION (UPDATED) ---
 
@@ -39,7 +15,7 @@ def test_calculation_engine_with_demo_data(demo_dataframes, app_with_db):
     """
     from app import db
     from app.models import AppSetting, CommissionRuleSet
-    from app.calculator.engine import CalculationConfig, calculate_commissions, summarize_results
+    from app.calculator.engine import calculate_commissions, summarize_results
 
     # --- 0. Clean existing data to prevent unique constraint errors ---
     # This ensures we start with a clean slate even if the fixture seeded the DB
@@ -71,9 +47,6 @@ def test_calculation_engine_with_demo_data(demo_dataframes, app_with_db):
     
     db.session.commit()
     
-    # Invalidate any cached config singleton before running
-    CalculationConfig._instance = None
-    
     # --- 2. Execute the Calculation Engine ---
     results, config = calculate_commissions(demo_dataframes)
     summary = summarize_results(results, demo_dataframes.get('Commissions paid'), config)
@@ -122,4 +95,126 @@ def test_calculation_engine_with_demo_data(demo_dataframes, app_with_db):
     
     assert abs(parinaz_calculated['total_original_commission'] - parinaz_expected['original_commission']) < TOLERANCE
     assert abs(parinaz_calculated['total_additional_bonus'] - parinaz_expected['bonus']) < TOLERANCE
-# end of tests/test_engine.py
\ No newline at end of file
+
+    # --- 5. Explanations are rendered on demand, not stored per transaction ---
+    from app.calculator.explain import render_transaction_details, render_bonus_details
+    amanj_month_1 = results['1404-1']['persons']['آمانج کردستانی']
+    assert all('calculation_details' not in txn for txn in amanj_month_1['transactions'])
+    assert amanj_month_1['bonus_breakdown'] == {'collective': 2_500_000, 'individual': 1_500_000, 'top_seller': 1_000_000}
+    assert render_transaction_details(amanj_month_1['transactions'][0])[0] == "مبلغ مبنای پورسانت: 30,000,000 تومان"
+    assert render_bonus_details(amanj_month_1)[-1] == "مجموع پاداش: 5,000,000 تومان"
+
+def test_pass1_columnar_assembly(demo_dataframes):
+    """
+    Pass 1 builds the same nested structure the row-by-row loop used to build:
+    months/persons in first-seen order, transactions in (row, role) order and
+    bracket bases only from qualifying negotiator rows.
+    """
+    from types import SimpleNamespace
+    from app.calculator.engine import _build_sales_frame, _assemble_pass1_results
+
+    config = SimpleNamespace(
+        CURRENCY_CONVERSION_FACTOR=0.1, BRACKET_QUALIFICATION_MIN_COLLECTION_PERCENT=0.3,
+        DEFAULT_COMMISSION_MODEL='پورسانت خالص',
+        BRACKET_QUALIFICATION_MIN_VALUES={'استاندارد': 12000000, 'حرفه‌ای': 40000000, 'VIP': 60000000, 'default': 12000000}
+    )
+    sales_df = demo_dataframes['Sales data'].copy()
+    sales_df.loc[len(sales_df)] = sales_df.iloc[0]
+    sales_df.loc[len(sales_df) - 1, 'ماه'] = None  # Invalid month: the row must be skipped
+
+    frame = _build_sales_frame(sales_df, config)
+    results = _assemble_pass1_results(frame, {}, config)
+
+    assert list(results.keys()) == ['1404-1', '1404-2']
+    month_1 = results['1404-1']['persons']
+    assert list(month_1.keys()) == ['آمانج کردستانی', 'پریناز لواسانی']
+    assert month_1['آمانج کردستانی']['bracket_base'] == 50_000_000
+    assert month_1['پریناز لواسانی']['bracket_base'] == 0  # Renewal and low-collection rows do not qualify
+    assert [t['role'] for t in month_1['آمانج کردستانی']['transactions']] == ['مذاکره کننده ارشد', 'هماهنگ کننده فروش'] * 2
+    assert month_1['پریناز لواسانی']['transactions'][0]['is_renewal'] is True
+
+
+def test_engine_modes(demo_dataframes, app_with_db, caplog):
+    """Fast mode skips the per-row audit trail; forensic mode keeps it."""
+    import logging
+    from app.seed import seed_data
+    from app.calculator.engine import calculate_commissions, ENGINE_MODE_FAST, ENGINE_MODE_FORENSIC
+    from app.calculator.store import dump_results
+
+    seed_data()
+    with caplog.at_level(logging.DEBUG):
+        fast_results, _ = calculate_commissions(demo_dataframes, mode=ENGINE_MODE_FAST)
+    assert not any('Audit Log for Row' in r.message for r in caplog.records)
+
+    caplog.clear()
+    with caplog.at_level(logging.DEBUG):
+        forensic_results, _ = calculate_commissions(demo_dataframes, mode=ENGINE_MODE_FORENSIC)
+    assert any('Audit Log for Row 2 ' in r.message for r in caplog.records)
+    assert dump_results(fast_results) == dump_results(forensic_results)
+
+    with pytest.raises(ValueError):
+        calculate_commissions(demo_dataframes, mode='verbose')
+
+
+def test_incremental_recalculation(demo_dataframes, app_with_db):
+    """Only months whose inputs changed are recomputed; the rest are reused from the previous run."""
+    from app.seed import seed_data
+    from app.calculator.engine import calculate_commissions, PreviousRun
+    from app.calculator.store import dump_results, load_results
+
+    seed_data()
+    first_results, _ = calculate_commissions(demo_dataframes)
+    stored_results = dump_results(first_results)
+    previous_run = PreviousRun(first_results.fingerprints, lambda: load_results(stored_results))
+
+    # A corrected row in month 2 leaves month 1 untouched.
+    corrected = dict(demo_dataframes)
+    corrected['Sales data'] = demo_dataframes['Sales data'].copy()
+    corrected['Sales data'].loc[4, 'وصول شده'] = "700,000,000"
+    incremental_results, _ = calculate_commissions(corrected, previous_run=previous_run)
+    full_results, _ = calculate_commissions(corrected)
+    assert incremental_results.reused_months == ['1404-1']
+    assert dump_results(incremental_results) == dump_results(full_results)
+
+    # A new month 1 target is carried over into month 2, so both months are recomputed.
+    retargeted = dict(demo_dataframes)
+    retargeted['Additional commissions'] = demo_dataframes['Additional commissions'].copy()
+    retargeted['Additional commissions'].loc[0, 'تارگت فرعی'] = 900000000
+    retargeted_results, _ = calculate_commissions(retargeted, previous_run=previous_run)
+    assert retargeted_results.reused_months == []
+
+
+def test_parallel_months_match_serial(demo_dataframes, app_with_db):
+    """Fanning months out to worker processes gives exactly the serial results."""
+    from app.seed import seed_data
+    from app.calculator.engine import calculate_commissions
+    from app.calculator.store import dump_results
+
+    seed_data()
+    serial_results, _ = calculate_commissions(demo_dataframes, workers=1)
+    parallel_results, _ = calculate_commissions(demo_dataframes, workers=2)
+    assert dump_results(parallel_results) == dump_results(serial_results)
+
+
+def test_transaction_store_round_trip(demo_dataframes, app_with_db):
+    """Columnar results survive persistence; runs saved as lists of dicts still aggregate the same way."""
+    from app.seed import seed_data
+    from app.calculator.engine import calculate_commissions
+    from app.calculator.store import dump_results, load_results, transaction_sum, transaction_role_summary
+
+    seed_data()
+    results, _ = calculate_commissions(demo_dataframes)
+    store = results['1404-1']['transaction_store']
+    assert store.dictionaries['person'] == ['آمانج کردستانی', 'پریناز لواسانی']
+    assert store.columns['role_code'].dtype.kind == 'i'
+
+    loaded = load_results(dump_results(results))
+    assert dump_results(loaded) == dump_results(results)
+
+    amanj = loaded['1404-1']['persons']['آمانج کردستانی']
+    legacy_transactions = [txn.to_dict() for txn in amanj['transactions']]
+    assert legacy_transactions[0]['company'] == 'شرکت آلفا (فروش مستقیم)'
+    for field in ['full_commission', 'commission_remaining', 'net_value']:
+        assert transaction_sum(legacy_transactions, field) == pytest.approx(transaction_sum(amanj['transactions'], field))
+    assert transaction_role_summary(legacy_transactions) == transaction_role_summary(amanj['transactions'])
+# end of tests/test_engine.py
@@ -0,0 +1,91 @@
+# tests/test_loader.py
+
+import numpy as np
+import pandas as pd
+from app.calculator.validator import validate_excel_file
+
+
+def test_loader_reads_schema_columns_with_parsed_numbers(demo_dataframes, tmp_path, write_workbook):
+    """Only schema columns are read, and monetary columns come out as floats in one parse."""
+    path = tmp_path / 'demo.xlsx'
+    write_workbook(path, demo_dataframes)
+    dataframes, errors = validate_excel_file(path)
+    assert errors == []
+
+    sales = dataframes['Sales data']
+    assert 'درصد پلن های آسانیتویی' not in sales.columns  # Not in the schema
+    assert sales['مبلغ کل خالص فاکتور'].dtype == np.float64
+    assert sales['مبلغ کل خالص فاکتور'].tolist() == [3e8, 2e8, 5e7, 1e8, 8e8]
+    assert sales['ماه'].tolist() == [1, 1, 1, 1, 2]
+    assert sales['بازاریاب'].isna().all()  # Empty cells are NaN, as with pd.read_excel
+    targets = dataframes['Additional commissions']
+    assert np.isnan(targets['تارگت جمعی'].iloc[1])
+
+
+def test_parallel_validation_matches_serial(demo_dataframes, tmp_path, write_workbook, monkeypatch):
+    """Sales data split into row ranges across worker processes reads like one serial pass, errors in the same order."""
+    from app.calculator import loader
+
+    sales = demo_dataframes['Sales data']
+    sales = sales.loc[sales.index.repeat(40)].reset_index(drop=True).astype(object)
+    sales.loc[[7, 90, 150], 'وصول شده'] = 'نامشخص'
+    sales.loc[[3, 120], 'مبلغ کل خالص فاکتور'] = 'x'
+    sales.loc[60:70] = None  # Empty rows inside the sheet
+    path = tmp_path / 'big.xlsx'
+    write_workbook(path, {**demo_dataframes, 'Sales data': sales})
+
+    # Split the small Sales data sheet, read in small blocks so row tags straddle block boundaries.
+    monkeypatch.setattr(loader, 'MIN_SPLIT_XML_BYTES', 0)
+    monkeypatch.setattr(loader, 'XML_BLOCK_SIZE', 1000)
+
+    serial, serial_errors = validate_excel_file(path)
+    parallel, parallel_errors = validate_excel_file(path, workers=3)
+    assert serial is None and len(serial_errors) == 2  # One summary per column
+    assert parallel_errors == serial_errors
+
+    sales.loc[[7, 90, 150], 'وصول شده'] = '1'
+    sales.loc[[3, 120], 'مبلغ کل خالص فاکتور'] = '1'
+    write_workbook(path, {**demo_dataframes, 'Sales data': sales})
+    serial, _ = validate_excel_file(path)
+    parallel, errors = validate_excel_file(path, workers=3)
+    assert errors == []
+    for sheet_name, df in serial.items():
+        pd.testing.assert_frame_equal(parallel[sheet_name], df)
+
+def test_namespace_prefixed_sheet_is_split_like_serial(demo_dataframes, tmp_path, write_workbook, monkeypatch):
+    """Sheets written with a namespace prefix (<x:row>, as some .NET libraries do) are still read in parts."""
+    import re
+    import zipfile
+    from app.calculator import loader
+
+    sales = demo_dataframes['Sales data']
+    sales = sales.loc[sales.index.repeat(40)].reset_index(drop=True)
+    plain = tmp_path / 'plain.xlsx'
+    write_workbook(plain, {**demo_dataframes, 'Sales data': sales})
+    path = tmp_path / 'prefixed.xlsx'
+    with zipfile.ZipFile(plain) as source, zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as target:
+        for item in source.infolist():
+            data = source.read(item)
+            if item.filename.startswith('xl/worksheets/'):
+                data = data.replace(b' xmlns="', b' xmlns:x="')
+                data = re.sub(rb'<(/?)([A-Za-z]+)(?=[\s/>])', rb'<\1x:\2', data)
+            target.writestr(item, data)
+
+    monkeypatch.setattr(loader, 'MIN_SPLIT_XML_BYTES', 0)
+    monkeypatch.setattr(loader, 'XML_BLOCK_SIZE', 1000)
+    workbook = loader.open_workbook(path)
+    assert loader.split_count(workbook['Sales data'], 3) == 3
+    workbook.close()
+
+    serial, errors = validate_excel_file(plain)
+    assert errors == []
+    parallel, errors = validate_excel_file(path, workers=3)
+    assert errors == []
+    for sheet_name, df in serial.items():
+        pd.testing.assert_frame_equal(parallel[sheet_name], df)
+
+    # An openpyxl without the internals split reads use: sheets are read in one part.
+    monkeypatch.setattr(loader, 'WorkSheetParser', None)
+    workbook = loader.open_workbook(path)
+    assert loader.split_count(workbook['Sales data'], 3) == 1
+    workbook.close()
@@ -0,0 +1,75 @@
+# tests/test_quality.py
+
+import io
+import pandas as pd
+from app.calculator.validator import validate_excel_file
+from app.calculator.quality import (QualityReport, check_dataframes, PROBLEM_NOT_NUMERIC,
+                                    PROBLEM_PAID_EXCEEDS_NET, PROBLEM_DUPLICATE_INVOICE, PROBLEM_UNKNOWN_PERSON)
+
+
+def test_corrupted_column_gives_one_capped_message(demo_dataframes, tmp_path, write_workbook):
+    """Thousands of non-numeric cells make one summary message; the report keeps every cell."""
+    sales = demo_dataframes['Sales data']
+    sales = sales.loc[sales.index.repeat(400)].reset_index(drop=True)
+    sales['وصول شده'] = 'نامشخص'
+    path = tmp_path / 'corrupted.xlsx'
+    write_workbook(path, {**demo_dataframes, 'Sales data': sales})
+
+    report = QualityReport()
+    dataframes, errors = validate_excel_file(path, report=report)
+    assert dataframes is None
+    assert len(errors) == 1
+    assert "'وصول شده'" in errors[0] and '2,000' in errors[0] and 'ردیف اکسل 2، 3، 4، 5، 6، ...' in errors[0]
+
+    issues = report.issues
+    assert len(issues) == 2000 and report.has_errors
+    assert (issues['problem'] == PROBLEM_NOT_NUMERIC).all()
+    assert issues['excel_row'].tolist() == list(range(2, 2002))
+
+    csv = pd.read_csv(io.StringIO(report.to_csv().lstrip('\ufeff')))
+    assert len(csv) == 2000 and list(csv.columns) == ['شیت', 'ستون', 'ردیف اکسل', 'مقدار', 'مشکل', 'مانع محاسبه']
+
+def test_warning_checks(demo_dataframes, tmp_path, write_workbook):
+    """Paid above net, duplicate invoice links and unknown people are warnings, not errors."""
+    sales = demo_dataframes['Sales data'].copy()
+    sales['لینک فاکتور'] = ['a', 'b', 'a', None, None]
+    sales.loc[1, 'بازاریاب'] = 'نفر ناشناس'
+    sales.loc[3, 'وصول شده'] = '200,000,000'  # Net is 100,000,000
+    path = tmp_path / 'demo.xlsx'
+    write_workbook(path, {**demo_dataframes, 'Sales data': sales})
+
+    report = QualityReport()
+    dataframes, errors = validate_excel_file(path, report=report)
+    assert errors == []
+    check_dataframes(dataframes, report)
+    assert not report.has_errors
+
+    issues = report.issues.set_index('problem')
+    assert issues.loc[PROBLEM_PAID_EXCEEDS_NET, 'excel_row'] == 5
+    assert issues.loc[PROBLEM_DUPLICATE_INVOICE, 'excel_row'] == 4
+    assert issues.loc[PROBLEM_UNKNOWN_PERSON, 'value'] == 'نفر ناشناس'
+    assert len(report) == 3 and len(report.messages(blocking=False)) == 3
+
+def test_quality_report_download_is_tied_to_the_session(demo_dataframes, app_with_db, tmp_path, write_workbook):
+    """Only the uploading session can download its report; reports past their maximum age are removed."""
+    import os
+    import re
+    folder = tmp_path / 'reports'
+    folder.mkdir()
+    stale = folder / ('0' * 32 + '.csv')
+    stale.write_text('old')
+    os.utime(stale, (0, 0))
+    app_with_db.config.update(QUALITY_REPORT_FOLDER=str(folder), WORKBOOK_CACHE_MAX_BYTES=0)
+
+    sales = demo_dataframes['Sales data'].copy()
+    sales['وصول شده'] = 'نامشخص'
+    path = tmp_path / 'corrupted.xlsx'
+    write_workbook(path, {**demo_dataframes, 'Sales data': sales})
+    client = app_with_db.test_client()
+    with open(path, 'rb') as f:
+        page = client.post('/', data={'file': (f, 'corrupted.xlsx')}, follow_redirects=True).get_data(as_text=True)
+    link = re.search(r'/quality-report/[0-9a-f]{32}', page).group(0)
+
+    assert client.get(link).status_code == 200
+    assert app_with_db.test_client().get(link).status_code == 404
+    assert not stale.exists()
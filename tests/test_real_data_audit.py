@@ -55,14 +55,12 @@ def test_audit_specific_rows(live_dataframes, app_with_db, caplog):
     AUDIT MODE 1: Runs the engine on the FULL live Excel file and shows
     detailed logs ONLY for the selected AUDIT_ROW_NUMBERS.
     """
-    from app.calculator.engine import CalculationConfig, calculate_commissions
+    from app.calculator.engine import calculate_commissions, ENGINE_MODE_FORENSIC
     
     print("\n\n" + "="*20 + " RUNNING AUDIT MODE 1: SPECIFIC ROWS " + "="*20)
 
-    CalculationConfig._instance = None
-    
     with caplog.at_level(logging.DEBUG):
-        calculate_commissions(live_dataframes)
+        calculate_commissions(live_dataframes, mode=ENGINE_MODE_FORENSIC)
 
     print("\n--- DETAILED AUDIT LOGS FOR SELECTED ROWS ---")
     if not AUDIT_ROW_NUMBERS:
@@ -88,17 +86,15 @@ def test_trace_single_person(live_dataframes, app_with_db, caplog):
     AUDIT MODE 2: Runs the engine on the FULL live Excel file and shows
     all relevant logs and final summaries for a single person, with an optional month filter.
     """
-    from app.calculator.engine import CalculationConfig, calculate_commissions, summarize_results
+    from app.calculator.engine import calculate_commissions, summarize_results, ENGINE_MODE_FORENSIC
     
     mode_title = f"TRACING PERSON: '{TRACE_PERSON_NAME}'"
     if TRACE_MONTH_FILTER:
         mode_title += f" FOR MONTH: {TRACE_MONTH_FILTER}"
     print("\n\n" + "="*20 + f" RUNNING AUDIT MODE 2: {mode_title} " + "="*20)
     
-    CalculationConfig._instance = None
-    
     with caplog.at_level(logging.DEBUG):
-        results, config = calculate_commissions(live_dataframes)
+        results, config = calculate_commissions(live_dataframes, mode=ENGINE_MODE_FORENSIC)
         summary = summarize_results(results, live_dataframes.get('Commissions paid'), config)
 
     # --- 1. Filter and Print All Relevant Audit Logs for the Person and Month ---
@@ -0,0 +1,40 @@
+# tests/test_rules.py
+
+import numpy as np
+from app.calculator.rules import BracketRule, compile_rule_index
+
+RULES = [
+    BracketRule('پورسانت خالص', 0, 250000000, 0.05, 0.10, 0.02),
+    BracketRule('پورسانت خالص', 250000000, 500000000, 0.06, 0.12, 0.04),
+    BracketRule('پورسانت خالص', 400000000, 999999999999, 0.07, 0.14, 0.06),  # Overlaps the rule above
+    BracketRule('حقوق ثابت + پورسانت', 150000000, 250000000, 0.05, 0.05, 0.01),
+    BracketRule('حقوق ثابت + پورسانت', 300000000, 500000000, 0.06, 0.06, 0.02),
+]
+
+def _linear_scan(bracket_base, commission_model):
+    """The original per-person lookup the index replaces."""
+    for rule in RULES:
+        if rule.model_name == commission_model and rule.min_sales <= bracket_base < rule.max_sales:
+            return rule.negotiator_rate
+    return 0
+
+def test_rule_index_matches_linear_scan():
+    index = compile_rule_index(RULES)
+    bases = [0, 1, 249999999, 250000000, 399999999, 400000000, 450000000, 5e11, 2e12, 100000000, 260000000, 300000000]
+    for model in ['پورسانت خالص', 'حقوق ثابت + پورسانت', 'مدل ناشناخته']:
+        rates, matched = index.rates_for_bases(bases, [model] * len(bases))
+        expected = [_linear_scan(base, model) for base in bases]
+        assert np.allclose(rates['مذاکره کننده ارشد'], expected)
+        assert list(matched) == [rate != 0 for rate in expected]
+    models = ['پورسانت خالص', 'حقوق ثابت + پورسانت', 'مدل ناشناخته'] * 4
+    assert index.labels_for_bases(bases, models) == [index.label_for(base, model) for base, model in zip(bases, models)]
+
+def test_rule_index_reports_gaps_and_overlaps():
+    index = compile_rule_index(RULES)
+    issues = {(i['kind'], i['model'], i['start'], i['end']) for i in index.issues}
+    assert ('overlap', 'پورسانت خالص', 400000000, 500000000) in issues
+    assert ('gap', 'حقوق ثابت + پورسانت', 0, 150000000) in issues
+    assert ('gap', 'حقوق ثابت + پورسانت', 250000000, 300000000) in issues
+    assert index.label_for(260000000, 'حقوق ثابت + پورسانت') == "پله: نامشخص"
+    assert index.label_for(5e11, 'پورسانت خالص') == "پله: 400 - ∞ میلیون"
+    assert compile_rule_index(list(RULES)) is index  # Same rule-set version, same compiled index
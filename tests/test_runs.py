@@ -0,0 +1,201 @@
+# tests/test_runs.py
+
+import copy
+import json
+from contextlib import contextmanager
+import pytest
+
+
+@pytest.fixture
+def calculated(demo_dataframes, app_with_db):
+    """The demo data calculated with the seeded rules, as (results, summary)."""
+    from app.seed import seed_data
+    from app.calculator.engine import calculate_commissions, summarize_results
+
+    seed_data()
+    results, config = calculate_commissions(demo_dataframes)
+    return results, summarize_results(results, demo_dataframes['Commissions paid'], config)
+
+@pytest.fixture
+def saved_run(calculated, demo_dataframes):
+    """A run of the calculated demo data, saved and committed."""
+    from app import db
+    from app.runs import save_calculation_run
+
+    results, summary = calculated
+    run, _ = save_calculation_run('demo.xlsx', results, summary, demo_dataframes['Additional commissions'], 'fast')
+    db.session.commit()
+    return run
+
+@pytest.fixture
+def amanj_user(app_with_db):
+    """The user of 'آمانج کردستانی' (username 'amanj'), created once per module."""
+    from app import db
+    from app.models import User
+
+    user = User.query.filter_by(name='آمانج کردستانی').first()
+    if user is None:
+        user = User(username='amanj', name='آمانج کردستانی')
+        user.set_password('x')
+        db.session.add(user)
+        db.session.commit()
+    return user
+
+@contextmanager
+def recorded_statements():
+    """Collects the SQL statements executed inside the block."""
+    from sqlalchemy import event
+    from app import db
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+
+def test_run_results_are_stored_as_rows(demo_dataframes, calculated):
+    """A saved run loads back as the engine produced it, and a per-person load keeps the month totals."""
+    from app import db
+    from app.calculator.store import dump_results
+    from app.main.utils import prepare_frontend_data
+    from app.runs import save_calculation_run, load_run_results, export_results_json
+
+    results, summary = calculated
+    targets_df = demo_dataframes['Additional commissions']
+    run, saved = save_calculation_run('demo.xlsx', results, summary, targets_df, 'fast', batch_rows=4)
+    db.session.commit()
+
+    assert run.detailed_results_json is None  # STORE_RESULTS_BLOB is off
+    assert run.transactions.count() == 10 and run.person_months.count() == 3  # Inserted in batches of 4
+    assert saved.rows == 1 + 2 + 3 + 10 and saved.rows_per_second > 0
+    # Equal up to int/float: the amount columns are floats
+    assert json.loads(dump_results(load_run_results(run))) == json.loads(dump_results(results))
+    assert json.loads(export_results_json(run)) == json.loads(dump_results(results))
+
+    person = 'پریناز لواسانی'
+    sliced = load_run_results(run, person_name=person)
+    assert len(sliced['1404-1']['transaction_store']) == 4
+    expected = prepare_frontend_data(copy.deepcopy(results), summary, targets_df, filter_person_name=person)
+    actual = prepare_frontend_data(sliced, summary, targets_df, filter_person_name=person)
+    assert actual['personMonthlyReport'] == expected['personMonthlyReport']
+    for month, month_data in expected['detailedReport'].items():
+        assert actual['detailedReport'][month]['total_net_sales'] == month_data['total_net_sales']
+        assert actual['detailedReport'][month]['total_commission'] == month_data['total_commission']
+        assert [txn.to_dict() for txn in actual['detailedReport'][month]['persons'][person]['transactions']] == \
+            [txn.to_dict() for txn in month_data['persons'][person]['transactions']]
+
+def test_history_pages_without_loading_results(app_with_db, calculated, amanj_user):
+    """The history lists a keyset page of runs in a constant number of queries, without the JSON columns."""
+    from app import db
+    from app.runs import save_calculation_run
+
+    results, summary = calculated
+    for index in range(5):
+        save_calculation_run(f'run_{index}.xlsx', results, summary, None, 'fast')
+    db.session.commit()
+
+    app_with_db.config['HISTORY_PAGE_SIZE'] = 2
+    client = app_with_db.test_client()
+    with client.session_transaction() as sess:
+        sess['admin_logged_in'] = True
+    with recorded_statements() as statements:
+        first = client.get('/history').get_data(as_text=True)
+
+    assert 'run_4.xlsx' in first and 'run_3.xlsx' in first and 'run_2.xlsx' not in first
+    assert first.count('/amanj"') == 2  # One user link per run
+    assert len(statements) == 2  # The page of runs, then their users
+    assert not any('_json' in statement for statement in statements)
+
+    cursor = first.split('before=')[1].split('"')[0]
+    second = client.get(f'/history?before={cursor}').get_data(as_text=True)
+    assert 'run_2.xlsx' in second and 'run_1.xlsx' in second and 'run_3.xlsx' not in second
+
+def test_report_view_is_materialized(demo_dataframes, app_with_db, calculated, saved_run):
+    """Reports read the view saved with the run; `flask rebuild-views` recomputes it for older runs."""
+    from app import db
+    from app.main.utils import prepare_frontend_data
+    from app.runs import load_report_data, load_run_results
+
+    _, summary = calculated
+    run = saved_run
+    person = 'آمانج کردستانی'
+    materialized = load_report_data(run, person_name=person)
+    run.frontend_view_json = None  # As saved before views existed
+    db.session.commit()
+    aggregated = load_report_data(run, person_name=person)
+
+    def comparable(frontend_data):
+        for month_data in frontend_data['detailedReport'].values():
+            month_data.pop('transaction_store', None)
+        return json.loads(json.dumps(frontend_data, default=lambda transactions: [txn.to_dict() for txn in transactions]))
+    assert comparable(materialized) == comparable(aggregated)
+    assert list(materialized['detailedReport']) == ['1404-1', '1404-2']
+
+    result = app_with_db.test_cli_runner().invoke(args=['rebuild-views'])
+    assert 'Rebuilt 1 report views.' in result.output
+    db.session.refresh(run)
+    assert run.frontend_view_json is not None
+    assert comparable(load_report_data(run, person_name=person)) == comparable(materialized)
+    assert comparable(load_report_data(run)) == comparable(prepare_frontend_data(
+        load_run_results(run), summary, demo_dataframes['Additional commissions']))
+
+def test_user_report_reads_only_its_slice(app_with_db, saved_run, amanj_user):
+    """A user's report reads only their slice; repeat views come from the cache or get a 304."""
+    from app import db
+    from app.runs import refresh_frontend_view
+
+    run = saved_run
+    client = app_with_db.test_client()
+    with client.session_transaction() as sess:
+        sess['report_access_user'], sess['report_access_id'] = 'amanj', run.public_id
+    with recorded_statements() as miss_statements:
+        first = client.get(f'/report/{run.public_id}/amanj')
+    with recorded_statements() as hit_statements:
+        again = client.get(f'/report/{run.public_id}/amanj')
+    with recorded_statements() as statements:
+        revalidated = client.get(f'/report/{run.public_id}/amanj', headers={'If-None-Match': first.headers['ETag']})
+
+    page = first.get_data(as_text=True)
+    assert 'data-person-name="آمانج کردستانی"' in page and 'data-person-name="پریناز لواسانی"' not in page
+    # The run and user, the team view, the user's view and their transactions
+    assert len(miss_statements) == 4
+    assert all('person_name = ?' in statement for statement in miss_statements[2:])
+    assert len(hit_statements) == 1 and again.get_data(as_text=True) == page
+    assert revalidated.status_code == 304 and len(statements) == 1
+
+    # Rebuilding the run's views invalidates its cached pages and ETags.
+    refresh_frontend_view(run)
+    db.session.commit()
+    rebuilt = client.get(f'/report/{run.public_id}/amanj', headers={'If-None-Match': first.headers['ETag']})
+    assert rebuilt.status_code == 200 and rebuilt.headers['ETag'] != first.headers['ETag']
+
+def test_explanations_are_loaded_when_a_section_opens(app_with_db, calculated, saved_run, amanj_user):
+    """The report page carries no explanation text; each section's explanations come from a fragment, for the admin or the person only."""
+    results, _ = calculated
+    run = saved_run
+    person = 'آمانج کردستانی'
+    role = results['1404-1']['persons'][person]['transactions'][0]['role']
+    explain = f'/report/{run.public_id}/explain'
+    client = app_with_db.test_client()
+    with client.session_transaction() as sess:
+        sess['admin_logged_in'] = True
+    page = client.get(f'/admin/report/{run.public_id}').get_data(as_text=True)
+    assert 'calc-row' not in page and 'data-explain-url' in page
+
+    fragment = client.get(explain, query_string={'month': '1404-1', 'person': person, 'role': role}).get_data(as_text=True)
+    count = sum(1 for txn in results['1404-1']['persons'][person]['transactions'] if txn['role'] == role)
+    assert fragment.count('class="calculation-details"') == count
+    assert 'مبلغ مبنای پورسانت' in fragment and '30,000,000 تومان' in fragment
+    bonus = client.get(explain, query_string={'month': '1404-1', 'person': person}).get_data(as_text=True)
+    assert 'مجموع پاداش' in bonus and '5,000,000 تومان' in bonus
+    assert client.get(explain, query_string={'month': '1399-1', 'person': person}).status_code == 404
+
+    user_client = app_with_db.test_client()
+    with user_client.session_transaction() as sess:
+        sess['report_access_user'], sess['report_access_id'] = 'amanj', run.public_id
+    assert user_client.get(explain, query_string={'month': '1404-1', 'person': person, 'role': role}).status_code == 200
+    assert user_client.get(explain, query_string={'month': '1404-1', 'person': 'پریناز لواسانی', 'role': role}).status_code == 403
+    assert app_with_db.test_client().get(explain, query_string={'month': '1404-1', 'person': person}).status_code == 403
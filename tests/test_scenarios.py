@@ -0,0 +1,71 @@
+# tests/test_scenarios.py
+
+import json
+import pytest
+
+
+def test_scenarios_match_engine_and_report_deltas(demo_dataframes, app_with_db):
+    """The live baseline matches the engine; scenario deltas follow the changed settings and rules."""
+    from app.seed import seed_data
+    from app.models import CalculationRun
+    from app.calculator.engine import calculate_commissions, summarize_results
+    from app.calculator.scenarios import parse_scenarios, evaluate_scenarios
+
+    seed_data()
+    results, config = calculate_commissions(demo_dataframes)
+    summary = summarize_results(results, demo_dataframes['Commissions paid'], config)
+
+    scenarios, errors = parse_scenarios(json.dumps([
+        {'name': 'collective 6%', 'settings': {'BONUS_PERCENTAGES': {'collective': 0.06, 'individual': 0.03, 'top_seller': 0.02}}},
+        {'name': 'flat 10%', 'rules': [
+            {'model_name': 'پورسانت خالص', 'min_sales': 0, 'max_sales': 999999999999,
+             'marketer_rate': 0.1, 'negotiator_rate': 0.1, 'coordinator_rate': 0.1}
+        ]}
+    ]))
+    assert errors == []
+
+    runs_before = CalculationRun.query.count()
+    evaluation = evaluate_scenarios(demo_dataframes, scenarios, config)
+    assert CalculationRun.query.count() == runs_before
+
+    for person_name, person_summary in summary.items():
+        assert evaluation['baseline']['per_person'][person_name] == pytest.approx(person_summary['total_payable_commission'])
+
+    bonus_scenario, rules_scenario = evaluation['scenarios']
+    # One extra percent of collective bonus on Amanj's 50M and 80M bracket bases.
+    assert bonus_scenario['per_person']['آمانج کردستانی']['delta'] == pytest.approx(1_300_000)
+    assert bonus_scenario['per_person']['پریناز لواسانی']['delta'] == pytest.approx(0)
+    # Parinaz's model has no bracket in the replacement rules, so only her renewal commission remains.
+    assert rules_scenario['per_person']['پریناز لواسانی']['total'] == pytest.approx(500_000)
+    assert rules_scenario['bracket_issues'] == []
+
+    _, errors = parse_scenarios('[{"name": "bad", "settings": {"NOT_A_SETTING": 1}, "rules": [{"model_name": "x"}]}]')
+    assert len(errors) == 2
+
+def test_malformed_scenarios_are_validation_errors(demo_dataframes, app_with_db, tmp_path, write_workbook):
+    """Wrongly shaped rules or settings are reported as errors (400 from the API), and partial bonus overrides merge."""
+    from app.seed import seed_data
+    from app.calculator.engine import calculate_commissions
+    from app.calculator.scenarios import parse_scenarios, evaluate_scenarios
+
+    seed_data()
+    for text in ('[{"name": "a", "rules": 5}]', '[{"name": "a", "settings": [1]}]',
+                 '[{"name": "a", "rules": [5]}]', '[{"name": "a", "settings": {"RENEWAL_COMMISSION_RATE": "x"}}]'):
+        scenarios, errors = parse_scenarios(text)
+        assert len(errors) == 1, text
+
+    scenarios, errors = parse_scenarios('[{"settings": {"BONUS_PERCENTAGES": {"collective": 0.06}}}]')
+    assert errors == []
+    results, config = calculate_commissions(demo_dataframes)
+    evaluation = evaluate_scenarios(demo_dataframes, scenarios, config)
+    assert evaluation['scenarios'][0]['per_person']['آمانج کردستانی']['delta'] == pytest.approx(1_300_000)
+
+    path = tmp_path / 'demo.xlsx'
+    write_workbook(path, demo_dataframes)
+    client = app_with_db.test_client()
+    with client.session_transaction() as sess:
+        sess['admin_logged_in'] = True
+    with open(path, 'rb') as f:
+        response = client.post('/admin/scenarios/evaluate', data={
+            'file': (f, 'demo.xlsx'), 'scenarios': '[{"name": "a", "rules": 5}]'})
+    assert response.status_code == 400 and len(response.get_json()['errors']) == 1
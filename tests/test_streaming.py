@@ -0,0 +1,46 @@
+# tests/test_streaming.py
+
+from app.calculator.config import EngineConfig
+from app.calculator.rules import BracketRule
+from app.calculator.engine import run_engine
+from app.calculator.streaming import run_engine_streaming
+from app.calculator.loader import open_workbook, iter_sheet_chunks
+from app.calculator.store import dump_results
+from app.calculator.validator import validate_excel_file
+
+CONFIG = EngineConfig({}, [
+    BracketRule('پورسانت خالص', 0, 250000000, 0.05, 0.10, 0.02),
+    BracketRule('پورسانت خالص', 250000000, 500000000, 0.06, 0.12, 0.04),
+    BracketRule('حقوق ثابت + پورسانت', 0, 150000000, 0.00, 0.00, 0.00),
+])
+
+def test_streaming_matches_in_memory_engine(demo_dataframes, tmp_path, write_workbook):
+    """Streaming in chunks of any size gives the same results and fingerprints as the in-memory engine."""
+    path = tmp_path / 'demo.xlsx'
+    write_workbook(path, demo_dataframes)
+    dataframes, errors = validate_excel_file(path)
+    assert errors == []
+    expected = run_engine(dataframes, CONFIG)
+
+    for chunk_rows in (1, 2, 1000):
+        results, small_sheets, errors = run_engine_streaming(path, CONFIG, chunk_rows=chunk_rows, spill_dir=tmp_path)
+        assert errors == []
+        assert 'Sales data' not in small_sheets
+        assert dump_results(results) == dump_results(expected)
+        assert results.fingerprints == expected.fingerprints and results.row_count == 5
+    assert [p.name for p in tmp_path.iterdir()] == ['demo.xlsx']  # Spill files are removed
+
+def test_streaming_reports_invalid_rows_with_excel_row_numbers(demo_dataframes, tmp_path, write_workbook):
+    """Validation runs chunk by chunk, with the Excel row numbers of the whole sheet."""
+    sales = demo_dataframes['Sales data'].copy()
+    sales.loc[4, 'وصول شده'] = 'نامعلوم'
+    path = tmp_path / 'broken.xlsx'
+    write_workbook(path, {**demo_dataframes, 'Sales data': sales})
+
+    workbook = open_workbook(path)
+    assert [len(chunk) for chunk, _ in iter_sheet_chunks(workbook['Sales data'], 'Sales data', 2)] == [2, 2, 1]
+    workbook.close()
+    results, _, errors = run_engine_streaming(path, CONFIG, chunk_rows=2)
+    assert results is None
+    assert errors == validate_excel_file(path)[1]
+    assert 'ردیف اکسل 6' in errors[0]
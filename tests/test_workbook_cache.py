@@ -0,0 +1,77 @@
+# tests/test_workbook_cache.py
+
+import os
+import pandas as pd
+import pyarrow as pa
+from app.calculator import workbook_cache
+from app.calculator.workbook_cache import WorkbookCache, validate_cached, hash_file
+
+
+def test_repeat_upload_skips_parsing(demo_dataframes, tmp_path, write_workbook, monkeypatch):
+    """A workbook seen before comes back from the cache, identical to the parsed one."""
+    path = tmp_path / 'demo.xlsx'
+    write_workbook(path, demo_dataframes)
+    cache = WorkbookCache(str(tmp_path / 'cache'), 10 * 1024 * 1024)
+
+    parsed, errors = validate_cached(path, cache)
+    assert errors == [] and hash_file(path) in cache
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the workbook was parsed again")
+    monkeypatch.setattr(workbook_cache, 'validate_excel_file', fail)
+    cached, errors = validate_cached(path, cache)
+    assert errors == [] and list(cached) == list(parsed)
+    for sheet_name, df in parsed.items():
+        pd.testing.assert_frame_equal(cached[sheet_name], df)
+
+    # Numeric columns are views of the memory-mapped Arrow file, not copies.
+    base = cached['Sales data']['مبلغ کل خالص فاکتور'].values
+    while base is not None and not isinstance(base, pa.Array):
+        base = base.base
+    assert base is not None
+
+def test_least_recently_used_entries_are_evicted(demo_dataframes, tmp_path):
+    """Beyond its size bound, the cache drops the entries used longest ago."""
+    cache = WorkbookCache(str(tmp_path / 'cache'), 10 * 1024 * 1024)
+    cache.put('a' * 64, demo_dataframes)
+    entry_size = sum(f.stat().st_size for f in os.scandir(cache._entry_path('a' * 64)))
+    cache.max_bytes = entry_size * 2  # Room for two entries
+
+    cache.put('b' * 64, demo_dataframes)
+    os.utime(cache._entry_path('b' * 64), (0, 0))  # 'b' is now the least recently used
+    cache.put('c' * 64, demo_dataframes)
+
+    assert 'a' * 64 in cache and 'c' * 64 in cache
+    assert 'b' * 64 not in cache
+
+def test_streamed_upload_is_cached_for_the_repeat(demo_dataframes, app_with_db, tmp_path, write_workbook, monkeypatch):
+    """A large upload is cached while it streams, so uploading it again neither streams nor parses it."""
+    from app.seed import seed_data
+    from app.calculator.validator import validate_excel_file
+    from app.main import routes
+
+    seed_data()
+    path = tmp_path / 'large.xlsx'
+    write_workbook(path, demo_dataframes)
+    app_with_db.config.update(STREAMING_THRESHOLD_BYTES=0, STREAMING_CHUNK_ROWS=2,
+                              WORKBOOK_CACHE_DIR=str(tmp_path / 'cache'))
+    client = app_with_db.test_client()
+    with client.session_transaction() as sess:
+        sess['admin_logged_in'] = True
+
+    def upload():
+        with open(path, 'rb') as f:
+            return client.post('/', data={'file': (f, 'large.xlsx')})
+    assert '/admin/report/' in upload().headers['Location']
+
+    cached = WorkbookCache(str(tmp_path / 'cache'), 10 * 1024 * 1024).get(hash_file(path))
+    parsed, _ = validate_excel_file(path)
+    assert list(cached) == list(parsed)
+    for sheet_name, df in parsed.items():
+        pd.testing.assert_frame_equal(cached[sheet_name], df)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the workbook was read again")
+    monkeypatch.setattr(routes, 'run_engine_streaming', fail)
+    monkeypatch.setattr(workbook_cache, 'validate_excel_file', fail)
+    assert '/admin/report/' in upload().headers['Location']
@@ -0,0 +1,36 @@
+# tests/test_workspace.py
+
+import io
+import os
+import pandas as pd
+from app.calculator.validator import validate_excel_file
+from app.calculator.workspace import RunWorkspace, hash_stream, store_upload
+from app.calculator.workbook_cache import hash_file
+
+
+def test_workbook_is_parsed_from_memory(demo_dataframes, tmp_path, write_workbook):
+    """A workbook read from an in-memory stream parses like the file, and the stream is left rewound."""
+    path = tmp_path / 'demo.xlsx'
+    write_workbook(path, demo_dataframes)
+    stream = io.BytesIO(path.read_bytes())
+
+    assert hash_stream(stream) == hash_file(path) and stream.tell() == 0
+    from_memory, errors = validate_excel_file(stream)
+    assert errors == []
+    for sheet_name, df in validate_excel_file(path)[0].items():
+        pd.testing.assert_frame_equal(from_memory[sheet_name], df)
+
+def test_uploads_are_content_addressed_and_workspaces_unique(tmp_path):
+    """The same upload is stored once under its hash; each run gets its own scratch directory."""
+    stream = io.BytesIO(b'workbook bytes')
+    content_hash = hash_stream(stream)
+    first = store_upload(stream, content_hash, str(tmp_path / 'uploads'))
+    second = store_upload(stream, content_hash, str(tmp_path / 'uploads'))
+    assert first == second == str(tmp_path / 'uploads' / f'{content_hash}.xlsx')
+    assert os.listdir(tmp_path / 'uploads') == [f'{content_hash}.xlsx']
+
+    with RunWorkspace(str(tmp_path)) as a, RunWorkspace(str(tmp_path)) as b:
+        assert a.path != b.path
+        copy = a.materialize(stream)
+        assert open(copy, 'rb').read() == b'workbook bytes'
+    assert not os.path.exists(a.path) and not os.path.exists(b.path)